@@ -0,0 +1,34 @@
+"""Общие данные тестов: модули лежат в корне репозитория."""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Дисковые кэши тестов — во временном каталоге, а не в общем кэше сервера
+_CACHE_DIR = tempfile.mkdtemp(prefix="wb_tests_")
+os.environ["WB_PARSED_CACHE_DIR"] = os.path.join(_CACHE_DIR, "parsed")
+os.environ["WB_EXPORT_CACHE_DIR"] = os.path.join(_CACHE_DIR, "export")
+
+from wb_synthetic import generate_report, write_report  # noqa: E402
+
+
+@pytest.fixture
+def report_file(tmp_path):
+    """Пишет отчёт в xlsx во временном каталоге и возвращает путь."""
+
+    def write(report, name="report.xlsx"):
+        path = tmp_path / name
+        write_report(report, path)
+        return str(path)
+
+    return write
+
+
+@pytest.fixture(scope="session")
+def report():
+    """Небольшой синтетический отчёт с датами продажи."""
+    return generate_report(3000, seed=7)
@@ -0,0 +1,146 @@
+"""Агрегация отчёта: крайние случаи."""
+
+from fractions import Fraction
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from wb_aggregate import (
+    ARTICLE,
+    DELIVERY,
+    NONZERO_MEAN_COLUMNS,
+    PRICE,
+    article_means,
+    merge_partials,
+)
+from wb_pipeline import (
+    BACKENDS,
+    aggregate_file,
+    aggregate_frame,
+    aggregate_stream,
+    build_tables,
+)
+from wb_synthetic import generate_report
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_header_only_report(report, report_file, stream):
+    path = report_file(report.iloc[:0])
+    summary, totals, groups = build_tables(aggregate_file(path, stream=stream))
+    assert summary.empty
+    assert (totals["Общая сумма"] == 0).all()
+    assert all(table.empty for table in groups.values())
+
+
+@pytest.mark.parametrize("backend", list(BACKENDS))
+def test_header_only_report_backends(report, report_file, backend):
+    path = report_file(report.iloc[:0])
+    summary, _, _ = build_tables(aggregate_file(path, backend))
+    assert summary.empty
+
+
+# Колонки таблицы по артикулам со средними (см. wb_aggregate.base_summary)
+MEANS = {
+    "Наша цена Средняя": PRICE,
+    "Реализация ВБ Средняя": "Вайлдберриз реализовал Товар (Пр)",
+    "К перечислению Среднее": "К перечислению Продавцу за реализованный Товар",
+    "Логистика Одной Юбки Средняя": DELIVERY,
+}
+
+
+def _whole_mean(rng, n):
+    # Копейки с целой средней, у которых Series.mean() чуть меньше целого
+    while True:
+        target = int(rng.integers(100, 2000))
+        values = np.round(rng.uniform(50, 3000, n - 1), 2)
+        last = round(target * n - values.sum(), 2)
+        values = np.append(values, last)
+        if 0 < last < 10_000 and round(values.sum() * 100) == target * n * 100:
+            if pd.Series(values).mean() < target:
+                return values
+
+
+@pytest.fixture(scope="module")
+def whole_means():
+    """Отчёт, где у части артикулов средние ровно на целом рубле."""
+    df = generate_report(3000, articles=30, seed=11)
+    rng = np.random.default_rng(0)
+    for article in df[ARTICLE].unique()[:12]:
+        rows = df[ARTICLE] == article
+        for column in MEANS.values():
+            mask = rows & (df[column] != 0) if column != DELIVERY else rows
+            if mask.sum() > 2:
+                df.loc[mask, column] = _whole_mean(rng, int(mask.sum()))
+    return df
+
+
+def _exact_means(df):
+    # Точные средние копеечных сумм: целая часть, как astype(int), и рубли
+    def mean(x):
+        kopecks = [round(v * 100) for v in x if v == v]
+        return Fraction(sum(kopecks), 100 * len(kopecks)) if kopecks else 0
+
+    def nonzero(x):
+        return mean(x[x != 0])
+
+    grouped = df.astype({ARTICLE: str}).groupby(ARTICLE)
+    table = pd.DataFrame(
+        {c: grouped[c].agg(nonzero) for c in NONZERO_MEAN_COLUMNS}
+        | {DELIVERY: grouped[DELIVERY].agg(lambda x: mean(x) * 2)}
+    )
+    prices = table[PRICE]
+    table = table.map(int)
+    table.columns = list(MEANS)
+    table["Цена средняя"] = prices.map(round)
+    return table
+
+
+def _assert_exact_means(expected, partials):
+    summary, _, groups = build_tables(partials)
+    table = summary.set_index(ARTICLE)[list(MEANS)].sort_index()
+    pd.testing.assert_frame_equal(
+        table, expected[list(MEANS)], check_names=False, check_dtype=False
+    )
+    group = pd.concat(groups.values()).set_index(ARTICLE).iloc[:, 1]
+    old = expected.loc[group.index, "Цена средняя"]
+    assert (group.to_numpy() == old.to_numpy()).all()
+
+
+def test_whole_means_are_adversarial(whole_means):
+    # Прежний x[x != 0].mean() давал здесь на рубль меньше точной средней
+    grouped = whole_means.astype({ARTICLE: str}).groupby(ARTICLE)
+    old = grouped[PRICE].agg(lambda x: x[x != 0].mean()).astype(int)
+    exact = _exact_means(whole_means)["Наша цена Средняя"]
+    assert (old != exact).any()
+
+
+@pytest.mark.parametrize("backend", list(BACKENDS))
+def test_whole_means_are_exact(whole_means, backend):
+    expected = _exact_means(whole_means)
+    _assert_exact_means(expected, aggregate_frame(whole_means, backend))
+
+
+@pytest.mark.parametrize("backend", list(BACKENDS))
+def test_whole_means_are_exact_stream(whole_means, report_file, backend):
+    path = report_file(whole_means)
+    streamed = aggregate_stream(path, backend, chunk_rows=700)
+    _assert_exact_means(_exact_means(whole_means), streamed)
+
+
+def test_whole_means_are_exact_merged(whole_means):
+    parts = [whole_means.iloc[:1100], whole_means.iloc[1100:]]
+    merged = merge_partials([aggregate_frame(df) for df in parts])
+    _assert_exact_means(_exact_means(whole_means), merged)
+
+
+def test_means_snap_to_whole_roubles(whole_means):
+    # Сумма на последний знак меньше целой — средняя всё равно целая
+    articles = aggregate_frame(whole_means).articles.copy()
+    count = articles[("nonzero_count", PRICE)].to_numpy()
+    articles[("nonzero_sum", PRICE)] = np.nextafter(count * 1053.0, 0)
+    articles[("count", DELIVERY)] = 2
+    articles[("sum", DELIVERY)] = np.nextafter(101.0, 0)
+    means = article_means(articles)
+    assert (means[PRICE] == 1053.0).all()
+    assert (means[DELIVERY] == 50.5).all()
@@ -0,0 +1,44 @@
+"""Способы агрегации дают одинаковый результат (BACKENDS, потоковое чтение)."""
+
+import pandas as pd
+import pytest
+
+from wb_pipeline import (
+    BACKENDS,
+    aggregate_file,
+    aggregate_frame,
+    aggregate_stream,
+    build_tables,
+    named_tables,
+)
+from wb_synthetic import generate_report
+
+
+@pytest.fixture(scope="module")
+def frames():
+    """Отчёты с общим списком артикулов, как у Россия + СНГ."""
+    return [generate_report(4000, articles=150, seed=seed) for seed in (1, 2)]
+
+
+def _assert_same(expected, actual):
+    # Все листы итогового файла, включая группы артикулов
+    for (name, left), (_, right) in zip(named_tables(expected), named_tables(actual)):
+        pd.testing.assert_frame_equal(left, right, obj=name)
+
+
+@pytest.mark.parametrize("backend", [b for b in BACKENDS if b != "pandas"])
+def test_backends_match_pandas(frames, backend):
+    for df in frames:
+        expected = aggregate_frame(df, "pandas")
+        actual = aggregate_frame(df, backend)
+        _assert_same(build_tables(expected), build_tables(actual))
+        pd.testing.assert_frame_equal(expected.cube, actual.cube)
+
+
+@pytest.mark.parametrize("backend", list(BACKENDS))
+def test_stream_matches_full(frames, report_file, backend):
+    path = report_file(frames[0])
+    full = aggregate_file(path, backend, stream=False)
+    streamed = aggregate_stream(path, backend, chunk_rows=700)
+    _assert_same(build_tables(full), build_tables(streamed))
+    pd.testing.assert_frame_equal(full.cube, streamed.cube)
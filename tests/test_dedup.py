@@ -0,0 +1,61 @@
+"""Повторы строк в пересекающихся отчётах (wb_dedup, aggregate_unique)."""
+
+import pandas as pd
+import pytest
+
+import wb_ingest
+import wb_pipeline
+from wb_pipeline import aggregate_file, aggregate_unique, build_tables, named_tables
+
+
+@pytest.fixture
+def overlapping(report, report_file):
+    """Два отчёта, второй повторяет последнюю тысячу строк первого."""
+    first = report.iloc[:2000]
+    second = report.iloc[1000:]
+    return report_file(first, "first.xlsx"), report_file(second, "second.xlsx")
+
+
+@pytest.mark.parametrize("stream_mb", [100, 0])
+def test_overlapping_reports_match_full_report(
+    report, report_file, overlapping, monkeypatch, stream_mb
+):
+    monkeypatch.setattr(wb_pipeline, "STREAM_MB", stream_mb)
+    expected = aggregate_file(report_file(report, "full.xlsx"))
+    combined, dropped = aggregate_unique(list(overlapping), max_workers=1)
+    assert dropped.sum() == 1000
+    for (name, left), (_, right) in zip(
+        named_tables(build_tables(expected)), named_tables(build_tables(combined))
+    ):
+        pd.testing.assert_frame_equal(left, right, obj=name)
+    pd.testing.assert_frame_equal(expected.cube, combined.cube)
+
+
+def test_keep_duplicates_counts_overlap_twice(overlapping):
+    combined, dropped = aggregate_unique(list(overlapping), max_workers=1, dedup=False)
+    assert dropped.sum() == 0
+    assert combined.cube["Строк"].sum() == 4000
+
+
+def test_streamed_file_with_repeats_is_parsed_once(overlapping, monkeypatch):
+    parsed = []
+    iter_batches = wb_ingest.iter_report_batches
+
+    def counting(source, *args, **kwargs):
+        parsed.append(source)
+        return iter_batches(source, *args, **kwargs)
+
+    monkeypatch.setattr(wb_ingest, "iter_report_batches", counting)
+    monkeypatch.setattr(wb_pipeline, "STREAM_MB", 0)
+    _, dropped = aggregate_unique(list(overlapping), max_workers=1)
+    assert dropped.tolist() == [0, 1000]
+    # Второй проход по файлу с повторами читает пачки из кэша Parquet
+    assert len(parsed) == 2
+
+
+def test_cached_chunks_match_parsed(report, report_file):
+    path = report_file(report, "cached.xlsx")
+    parsed = aggregate_file(path, stream=True)
+    cached = aggregate_file(path, stream=True)
+    for expected, actual in zip(parsed, cached):
+        pd.testing.assert_frame_equal(expected, actual)
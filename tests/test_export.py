@@ -0,0 +1,51 @@
+"""Выгрузка таблиц: запись xlsx пачками строк."""
+
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+import wb_export
+
+
+def _table(rows):
+    values = np.arange(rows, dtype="float64") / 4
+    values[::7] = np.nan
+    values[1] = np.inf
+    return pd.DataFrame(
+        {
+            "Артикул": pd.Categorical([f"Юбка {i:05d}" for i in range(rows)]),
+            "Сумма": np.arange(rows),
+            "Доля": values,
+        }
+    )
+
+
+def _xlsx(tables):
+    output = BytesIO()
+    wb_export.write_xlsx(tables, output)
+    output.seek(0)
+    return pd.read_excel(output, sheet_name=None)
+
+
+def test_xlsx_is_written_in_row_chunks(monkeypatch):
+    tables = [("Первый", _table(25)), ("Второй", _table(7))]
+    expected = _xlsx(tables)
+
+    converted = []
+    cell_values = wb_export._cell_values
+
+    def recording(series):
+        converted.append(len(series))
+        return cell_values(series)
+
+    monkeypatch.setattr(wb_export, "XLSX_CHUNK_ROWS", 4)
+    monkeypatch.setattr(wb_export, "_cell_values", recording)
+    actual = _xlsx(tables)
+
+    # В значения Python переводится не больше пачки строк за раз
+    assert max(converted) == 4
+    assert list(actual) == ["Первый", "Второй"]
+    for name in expected:
+        pd.testing.assert_frame_equal(actual[name], expected[name])
+    assert len(actual["Первый"]) == 25
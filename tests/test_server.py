@@ -0,0 +1,47 @@
+"""HTTP-сервис: параметры запроса и отдача выгрузки."""
+
+import os
+
+import pytest
+
+import wb_server
+from wb_cache import FileCache
+from wb_server import ApiError, open_export, query_number
+
+
+@pytest.mark.parametrize("value", ["inf", "-inf", "nan", "1e400"])
+def test_query_number_rejects_non_finite(value):
+    with pytest.raises(ApiError, match="конечным числом") as error:
+        query_number({"cost_price": [value]}, "cost_price", 0)
+    assert error.value.status == 400
+
+
+def test_query_number():
+    with pytest.raises(ApiError, match="отрицательным"):
+        query_number({"tax_rate": ["-0.1"]}, "tax_rate", 0)
+    assert query_number({}, "tax_rate", 0.07) == 0.07
+    assert query_number({"tax_rate": ["0.06"]}, "tax_rate", 0.07) == 0.06
+
+
+def test_open_export_rewrites_evicted_file(tmp_path, monkeypatch):
+    cache = FileCache(str(tmp_path))
+    get_or_write = cache.get_or_write
+    paths = []
+
+    def evicted_once(key, write):
+        # Первую запись вытесняют сразу после неё, до открытия файла
+        path = get_or_write(key, write)
+        if not paths:
+            os.remove(path)
+        paths.append(path)
+        return path
+
+    def write(path):
+        with open(path, "wb") as f:
+            f.write(b"report")
+
+    monkeypatch.setattr(cache, "get_or_write", evicted_once)
+    monkeypatch.setattr(wb_server, "EXPORT_CACHE", cache)
+    with open_export("key", write) as f:
+        assert f.read() == b"report"
+    assert len(paths) == 2
@@ -0,0 +1,37 @@
+"""Потоковое чтение: память ограничена пачкой и числом артикулов."""
+
+import pandas as pd
+
+import wb_pipeline
+from wb_aggregate import PartialsAccumulator
+from wb_synthetic import generate_report
+
+
+def _held_rows(accumulator):
+    # Сколько строк таблиц держит накопитель во всех своих атрибутах
+    rows = 0
+    for value in vars(accumulator).values():
+        for item in value if isinstance(value, list) else [value]:
+            assert item is None or isinstance(item, pd.DataFrame)
+            rows += 0 if item is None else len(item)
+    return rows
+
+
+def test_stream_state_is_bounded_by_articles(report_file, monkeypatch):
+    held = []
+
+    class Recording(PartialsAccumulator):
+        def add(self, partials):
+            super().add(partials)
+            held.append(_held_rows(self))
+            return self
+
+    monkeypatch.setattr(wb_pipeline, "PartialsAccumulator", Recording)
+    report = generate_report(6000, articles=40, seed=5)
+    partials = wb_pipeline.aggregate_stream(report_file(report), chunk_rows=300)
+
+    assert len(held) == 20
+    # Таблицы итога и ошибки их сумм: по артикулам, оплатам и ячейкам куба,
+    # сколько бы пачек ни было прочитано
+    cells = len(partials.articles) + len(partials.payments) + len(partials.cube)
+    assert max(held) <= 2 * cells < len(report)
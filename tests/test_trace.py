@@ -0,0 +1,35 @@
+"""Замеры этапов: WB_TRACE=0 и слушатель прогресса."""
+
+import logging
+
+from wb_trace import stage, trace_run
+
+
+def _run(enabled, listener):
+    with trace_run("test", enabled=enabled, listener=listener) as trace:
+        stage("double", lambda x: x * 2, 21)
+    return trace
+
+
+def test_disabled_trace_still_notifies_listener(caplog):
+    events = []
+    logger = logging.getLogger("wb_trace")
+    logger.addHandler(caplog.handler)
+    try:
+        trace = _run(False, events.append)
+    finally:
+        logger.removeHandler(caplog.handler)
+    assert [e["stage"] for e in events] == ["double"]
+    assert not trace.records
+    assert not caplog.records
+
+
+def test_enabled_trace_logs_and_records(caplog):
+    logger = logging.getLogger("wb_trace")
+    logger.addHandler(caplog.handler)
+    try:
+        trace = _run(True, None)
+    finally:
+        logger.removeHandler(caplog.handler)
+    assert [r["stage"] for r in trace.records] == ["double"]
+    assert len(caplog.records) == 2
@@ -0,0 +1,84 @@
+"""Проверка заголовка отчёта до полного разбора (validate_report)."""
+
+import zipfile
+
+import pytest
+
+import wb_pipeline
+from wb_ingest import ArchiveMember, read_head, validate_report
+from wb_pipeline import aggregate_unique
+
+
+def test_valid_report(report, report_file):
+    assert "Артикул поставщика" in validate_report(report_file(report))
+
+
+def test_missing_columns(report, report_file):
+    path = report_file(report.drop(columns=["Тип документа", "Хранение"]))
+    with pytest.raises(ValueError, match="нет обязательных колонок") as error:
+        validate_report(path)
+    assert "«Тип документа»" in str(error.value)
+    assert "«Хранение»" in str(error.value)
+
+
+def test_wrong_column_type(report, report_file):
+    broken = report.assign(**{"Цена розничная": "нет цены"})
+    with pytest.raises(ValueError, match="Цена розничная"):
+        validate_report(report_file(broken))
+
+
+@pytest.mark.parametrize(
+    "data, message",
+    [
+        (b"hello,world\n1,2\n", "не книга Excel"),
+        (b"", "не книга Excel"),
+        (b"PK\x03\x04 truncated", "не целая книга xlsx"),
+    ],
+)
+def test_not_a_workbook(data, message):
+    with pytest.raises(ValueError, match=message):
+        validate_report(data)
+
+
+def test_truncated_workbook(report, report_file):
+    with open(report_file(report), "rb") as f:
+        data = f.read()
+    with pytest.raises(ValueError, match="не целая книга xlsx"):
+        validate_report(data[: len(data) // 2])
+
+
+@pytest.fixture
+def archive(report, report_file, tmp_path):
+    path = tmp_path / "reports.zip"
+    with zipfile.ZipFile(path, "w") as f:
+        f.write(report_file(report), "good.xlsx")
+        f.writestr("bad.xlsx", b"PK\x03\x04 truncated")
+    return str(path)
+
+
+def test_read_head_streams_archive_member(archive, report, report_file):
+    with open(report_file(report), "rb") as f:
+        expected = read_head(f.read())
+    assert read_head(ArchiveMember(archive, "good.xlsx")) == expected
+
+
+def test_archive_member_error_names_member(archive):
+    with pytest.raises(ValueError, match="bad.xlsx: Файл повреждён"):
+        aggregate_unique([archive], max_workers=1)
+
+
+def test_archive_members_unzipped_once(report, report_file, tmp_path, monkeypatch):
+    path = tmp_path / "week.zip"
+    with zipfile.ZipFile(path, "w") as f:
+        f.write(report_file(report.iloc[:1000], "a.xlsx"), "a.xlsx")
+        f.write(report_file(report.iloc[1000:], "b.xlsx"), "b.xlsx")
+    unzipped = []
+    read_member = wb_pipeline.read_member
+
+    def counting(member):
+        unzipped.append(member.name)
+        return read_member(member)
+
+    monkeypatch.setattr(wb_pipeline, "read_member", counting)
+    aggregate_unique([str(path)], max_workers=1)
+    assert sorted(unzipped) == ["a.xlsx", "b.xlsx"]
@@ -0,0 +1,564 @@
+"""Однопроходная агрегация отчёта по артикулам.
+
+Ключ «Артикул поставщика» кодируется один раз, после чего все суммы,
+суммы по возвратам, суммы и количества ненулевых значений (для средних) и
+количества видов логистики считаются через np.bincount по этим кодам.
+Результат — частичные агрегаты, которые можно складывать между файлами;
+итоговая таблица по артикулам строится из них без промежуточных merge.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+ARTICLE = "Артикул поставщика"
+DOCUMENT_TYPE = "Тип документа"
+PAYMENT_REASON = "Обоснование для оплаты"
+LOGISTICS_TYPE = "Виды логистики, штрафов и доплат"
+
+PRICE = "Цена розничная"
+WB_PRICE = "Вайлдберриз реализовал Товар (Пр)"
+TRANSFER = "К перечислению Продавцу за реализованный Товар"
+DELIVERY = "Услуги по доставке товара покупателю"
+
+# Колонки, которые суммируются по артикулу
+SUM_COLUMNS = (PRICE, WB_PRICE, TRANSFER, DELIVERY)
+# Колонки, которые дополнительно суммируются только по возвратам
+RETURN_COLUMNS = (PRICE, WB_PRICE, TRANSFER)
+# Колонки, для которых нужна средняя по ненулевым значениям
+NONZERO_MEAN_COLUMNS = (PRICE, WB_PRICE, TRANSFER)
+# Колонки всех средних по артикулу (доставка — по всем строкам, см. article_means)
+MEAN_COLUMNS = NONZERO_MEAN_COLUMNS + (DELIVERY,)
+# Насколько удвоенная средняя может отстоять от целого, чтобы считаться целой:
+# это больше ошибки округления средних до миллиона рублей и меньше шага
+# средней копеечных сумм, пока у артикула меньше десятков миллионов строк
+MEAN_SNAP = 1e-9
+# Колонки итоговой таблицы по «Обоснованию для оплаты»
+PAYMENT_COLUMNS = (
+    DELIVERY,
+    "Общая сумма штрафов",
+    "Хранение",
+    "Удержания",
+    "Платная приемка",
+)
+
+RETURN_DOCUMENT = "Возврат"
+SOFT_PATTERN = "Софт"
+UNSPECIFIED_LOGISTICS = "Не указано"
+ROWS = "Строк"
+
+# Куб: строки и суммы по артикулу, дню продажи и типу документа
+SALE_DATE = "Дата продажи"
+CUBE_COLUMNS = SUM_COLUMNS
+UNSPECIFIED_DOCUMENT = "Не указано"
+
+# Частичные агрегаты отчёта: по артикулам, по «Обоснованию для оплаты» и куб
+# по дням (None, если в отчёте нет даты продажи). Все таблицы аддитивны,
+# поэтому агрегаты разных файлов просто складываются.
+ReportPartials = namedtuple(
+    "ReportPartials", ["articles", "payments", "cube"], defaults=(None,)
+)
+
+# Себестоимость единицы товара, ₽, и ставка налога с реализации по умолчанию
+COST_PRICE = 600
+TAX_RATE = 0.07
+SOLD = "Кол-во Продаж"
+
+# Себестоимость и налог: price — цена единицы для всех артикулов, by_article —
+# Series «артикул → себестоимость единицы» (артикулы не из неё считаются по
+# price), tax_rate — доля от чистой реализации ВБ
+Costs = namedtuple(
+    "Costs", ["price", "tax_rate", "by_article"], defaults=(COST_PRICE, TAX_RATE, None)
+)
+
+
+def _encode(series):
+    # Категориальные колонки (см. wb_ingest.REPORT_SCHEMA) уже закодированы
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Коды бывают int8/int16 — расширяем, чтобы не переполнить при умножении
+        codes = series.cat.codes.to_numpy().astype(np.intp)
+        return codes, pd.Index(series.cat.categories)
+    codes, uniques = pd.factorize(series, sort=True)
+    return codes, pd.Index(uniques)
+
+
+def key_values(series):
+    """Значения ключевой колонки в порядке её кодов (как в aggregate_report)."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return pd.Index(series.cat.categories)
+    return pd.Index(pd.unique(series.dropna())).sort_values()
+
+
+def _group_sums(codes, n, columns):
+    # Денежные суммы считает groupby по уже готовым кодам: повторного
+    # хэширования ключа нет, а суммирование компенсированное, как в
+    # groupby().sum() — целые части сумм совпадают с прежними до копейки.
+    # Пропуски (NaN) в сумму не входят, так что маска задаётся через NaN.
+    key = pd.Categorical.from_codes(codes, categories=pd.RangeIndex(n))
+    frame = pd.DataFrame(dict(enumerate(columns.values())), copy=False)
+    sums = frame.groupby(key, observed=False).sum().to_numpy()
+    return dict(zip(columns, sums.T))
+
+
+def aggregate_report(df):
+    """Считает частичные агрегаты отчёта за один проход по строкам."""
+    codes, articles = _encode(df[ARTICLE])
+    n = len(articles)
+    rows = codes >= 0
+
+    def count(mask=None):
+        selected = codes[rows] if mask is None else codes[rows & mask]
+        return np.bincount(selected, minlength=n)
+
+    is_return = (df[DOCUMENT_TYPE] == RETURN_DOCUMENT).to_numpy(dtype=bool)
+
+    money = {}
+    counts = {("count", ROWS): count()}
+    for column in SUM_COLUMNS:
+        values = df[column].to_numpy(dtype="float64")
+        money[("sum", column)] = values
+        if column in RETURN_COLUMNS:
+            money[("return", column)] = np.where(is_return, values, np.nan)
+        if column in NONZERO_MEAN_COLUMNS:
+            nonzero = (values != 0) & ~np.isnan(values)
+            money[("nonzero_sum", column)] = np.where(nonzero, values, np.nan)
+            counts[("nonzero_count", column)] = count(nonzero)
+        else:
+            counts[("count", column)] = count(~np.isnan(values))
+    data = _group_sums(codes, n, money)
+    data.update(counts)
+
+    # Виды логистики: плотная матрица количеств (артикул × вид)
+    matrix, kinds = logistics_crosstab(codes, n, df[LOGISTICS_TYPE])
+    for j, kind in enumerate(kinds):
+        data[("logistics", kind)] = matrix[:, j]
+
+    partial = pd.DataFrame(data, index=pd.Index(articles, name=ARTICLE))
+    partial.columns = pd.MultiIndex.from_tuples(partial.columns)
+    # Категории без строк (например, после фильтрации) в результат не попадают
+    partial = partial[partial[("count", ROWS)] > 0]
+    if not partial.index.is_monotonic_increasing:
+        partial = partial.sort_index()
+
+    return ReportPartials(
+        partial, _aggregate_payments(df), aggregate_cube(df, codes, articles)
+    )
+
+
+def _aggregate_payments(df):
+    codes, reasons = _encode(df[PAYMENT_REASON])
+    n = len(reasons)
+    columns = {c: df[c].to_numpy(dtype="float64") for c in PAYMENT_COLUMNS}
+    payments = pd.DataFrame(
+        _group_sums(codes, n, columns), index=pd.Index(reasons, name=PAYMENT_REASON)
+    )
+    return payments[np.bincount(codes[codes >= 0], minlength=n) > 0]
+
+
+def aggregate_cube(df, codes=None, articles=None):
+    """Куб артикул × день продажи × тип документа: число строк и суммы.
+
+    Строится, если в таблице есть «Дата продажи», иначе None. Строки без
+    артикула или даты в куб не входят, тип документа без значения — «Не
+    указано». Ячейки без строк не хранятся, так что куб не больше отчёта.
+    """
+    if SALE_DATE not in df.columns:
+        return None
+    if codes is None:
+        codes, articles = _encode(df[ARTICLE])
+    day_codes, days = pd.factorize(df[SALE_DATE], sort=True)
+    type_codes, types = _encode(df[DOCUMENT_TYPE])
+    # Пропуск типа документа — отдельный код после всех типов
+    type_codes = np.where(type_codes < 0, len(types), type_codes)
+    types = types.append(pd.Index([UNSPECIFIED_DOCUMENT]))
+
+    keep = (codes >= 0) & (day_codes >= 0)
+    n_days, n_types = len(days), len(types)
+    cell = (codes[keep].astype(np.int64) * n_days + day_codes[keep]) * n_types
+    cells, inverse = np.unique(cell + type_codes[keep], return_inverse=True)
+    n = len(cells)
+    money = {c: df[c].to_numpy(dtype="float64")[keep] for c in CUBE_COLUMNS}
+    data = {ROWS: np.bincount(inverse, minlength=n)}
+    data.update(_group_sums(inverse, n, money))
+
+    article, rest = np.divmod(cells, n_days * n_types)
+    day, kind = np.divmod(rest, n_types)
+    index = pd.MultiIndex.from_arrays(
+        [articles[article], days[day], types[kind]],
+        names=[ARTICLE, SALE_DATE, DOCUMENT_TYPE],
+    )
+    cube = pd.DataFrame(data, index=index)
+    if not cube.index.is_monotonic_increasing:
+        cube = cube.sort_index()
+    return cube
+
+
+def _merge_cubes(cubes):
+    # Куб есть только тогда, когда он есть у каждого отчёта: иначе разбивка
+    # по дням молча потеряла бы часть строк
+    if any(cube is None for cube in cubes):
+        return None
+    return pd.concat(cubes).groupby(level=[0, 1, 2]).sum()
+
+
+def merge_partials(parts):
+    """Складывает частичные агрегаты нескольких отчётов."""
+    parts = list(parts)
+    if len(parts) == 1:
+        return parts[0]
+    articles = pd.concat([p.articles for p in parts]).fillna(0)
+    payments = pd.concat([p.payments for p in parts])
+    articles = articles.groupby(level=0).sum()
+    # Счётчики после выравнивания колонок (fillna) снова делаем целыми
+    counters = [
+        c for c in articles.columns if c[0] in ("count", "nonzero_count", "logistics")
+    ]
+    articles[counters] = articles[counters].astype("int64")
+    return ReportPartials(
+        articles,
+        payments.groupby(level=0).sum(),
+        _merge_cubes([p.cube for p in parts]),
+    )
+
+
+def _two_sum(total, values):
+    # Сумма и её точная ошибка округления (алгоритм TwoSum, без ветвлений)
+    result = total + values
+    shifted = result - total
+    error = (total - (result - shifted)) + (values - shifted)
+    return result, error
+
+
+class PartialsAccumulator:
+    """Накапливает частичные агрегаты по мере их поступления (пачка за пачкой).
+
+    Денежные суммы складываются с компенсацией: ошибки округления каждого
+    сложения копятся отдельно и добавляются в result(). Поэтому итог почти
+    не зависит от того, на сколько пачек разбит отчёт, и совпадает с
+    агрегатами всей таблицы так же, как суммирование в groupby().sum().
+    """
+
+    def __init__(self):
+        self._tables = None
+        self._errors = None
+
+    def add(self, partials):
+        if self._tables is None:
+            self._tables = list(partials)
+            self._errors = [_zero_errors(table) for table in partials]
+            return self
+        for i, part in enumerate(partials):
+            if self._tables[i] is None or part is None:
+                # Куба нет хотя бы у одной части — нет и в сумме (см. _merge_cubes)
+                self._tables[i] = self._errors[i] = None
+                continue
+            self._tables[i], self._errors[i] = _accumulate(
+                self._tables[i], self._errors[i], part
+            )
+        return self
+
+    def result(self):
+        """Накопленные агрегаты (None, если ничего не добавлено)."""
+        if self._tables is None:
+            return None
+        tables = []
+        for table, errors in zip(self._tables, self._errors):
+            if table is not None:
+                table = table.copy()
+                money = errors.columns
+                table[money] = table[money].to_numpy() + errors.to_numpy()
+            tables.append(table)
+        return ReportPartials(*tables)
+
+
+def _zero_errors(table):
+    if table is None:
+        return None
+    money = [c for c in table.columns if table[c].dtype.kind == "f"]
+    return pd.DataFrame(0.0, index=table.index, columns=pd.Index(money))
+
+
+def _accumulate(total, errors, part):
+    index = total.index.union(part.index)
+    columns = total.columns.append(part.columns.difference(total.columns))
+    total = total.reindex(index=index, columns=columns, fill_value=0)
+    part = part.reindex(index=index, columns=columns, fill_value=0)
+    money = [c for c in columns if total[c].dtype.kind == "f"]
+    errors = errors.reindex(index=index, columns=money, fill_value=0.0)
+    sums, error = _two_sum(total[money].to_numpy(), part[money].to_numpy())
+    counters = [c for c in columns if total[c].dtype.kind != "f"]
+    total[money] = sums
+    total[counters] = total[counters].to_numpy() + part[counters].to_numpy()
+    errors[money] = errors.to_numpy() + error
+    return total, errors
+
+
+def logistics_crosstab(codes, n, kinds):
+    """Считает виды логистики по артикулам: матрица (n артикулов × виды) и виды.
+
+    codes — коды артикулов по строкам (-1 — пустой артикул), kinds — колонка
+    «Виды логистики, штрафов и доплат». Читаются только коды этих двух колонок,
+    пустой вид считается как «Не указано».
+    """
+    kind_codes, names = _encode(kinds)
+    names = list(names)
+    rows = codes >= 0
+    # Пустой вид (код -1) по модулю попадает в последний, дополнительный столбец
+    m = len(names) + 1
+    flat = codes[rows] * m + kind_codes[rows] % m
+    matrix = np.bincount(flat, minlength=n * m).reshape(n, m)
+
+    unspecified = matrix[:, -1]
+    matrix = matrix[:, :-1]
+    if unspecified.any():
+        if UNSPECIFIED_LOGISTICS in names:
+            matrix[:, names.index(UNSPECIFIED_LOGISTICS)] += unspecified
+        else:
+            matrix = np.column_stack([matrix, unspecified])
+            names.append(UNSPECIFIED_LOGISTICS)
+    return matrix, names
+
+
+def buyout_metrics(matrix, kinds):
+    """Кол-во продаж и %Выкупа по матрице количеств видов логистики."""
+
+    def column(kind):
+        if kind in kinds:
+            return matrix[:, kinds.index(kind)]
+        return np.zeros(len(matrix), dtype="int64")
+
+    sold = column("К клиенту при продаже")
+    denominator = (
+        column("К клиенту при отмене") + sold + column("От клиента при возврате")
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = np.where(denominator == 0, 0, (sold / denominator) * 100).astype(int)
+    # Нет продаж: 0, если не было и отмен с возвратами, иначе -100
+    buyout = np.where(sold == 0, np.where(denominator == 0, 0, -100), share)
+    return sold.astype("int64"), buyout
+
+
+def article_means(articles):
+    """Средние по артикулам: цены — по ненулевым строкам, доставка — по всем.
+
+    Таблица с колонками MEAN_COLUMNS, NaN — у артикулов без таких строк.
+    Средняя — сумма из articles, делённая на число строк. Средние, которые
+    ровно на целом рубле или половине (с точностью MEAN_SNAP), приводятся к
+    нему точно: иначе ошибка округления в последнем знаке меняла бы целую
+    часть и округление до рубля в зависимости от порядка строк и пачек.
+
+    Отличие от прежнего x[x != 0].mean(): его попарная сумма иногда чуть
+    меньше точной, и средняя ровно 1053,00 ₽ выходила 1052 ₽. Теперь — 1053.
+    """
+    data = {}
+    for column in MEAN_COLUMNS:
+        kind = "nonzero_" if column in NONZERO_MEAN_COLUMNS else ""
+        total = articles[(kind + "sum", column)].to_numpy()
+        count = articles[(kind + "count", column)].to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            data[column] = np.where(count > 0, total / count, np.nan)
+    means = pd.DataFrame(data, index=articles.index)
+    # Граница и для astype(int), и для round(0) — целая удвоенная средняя
+    doubled = means * 2
+    whole = doubled.round()
+    return means.mask((doubled - whole).abs() < MEAN_SNAP, whole / 2)
+
+
+def base_summary(articles, means=None):
+    """Таблица по артикулам без колонок, зависящих от себестоимости и налога.
+
+    Их добавляет apply_costs: при другой себестоимости или ставке налога
+    базовая таблица не пересчитывается. means — article_means(articles), если
+    они уже посчитаны.
+    """
+    if means is None:
+        means = article_means(articles)
+    sums = {c: articles[("sum", c)].to_numpy() for c in SUM_COLUMNS}
+    returns = {c: articles[("return", c)].to_numpy() for c in RETURN_COLUMNS}
+
+    table = pd.DataFrame({ARTICLE: articles.index})
+
+    # Суммы по артикулу
+    table["Сумма Продаж Наша Цена"] = sums[PRICE].astype(int)
+    table["Сумма Продаж по цене ВБ"] = sums[WB_PRICE].astype(int)
+    table["Сумма Продаж Перечислени С Лог"] = sums[TRANSFER].astype(int)
+    table["Логистика"] = sums[DELIVERY].astype(int)
+    table["К Перечислению без Логистики"] = (
+        table["Сумма Продаж Перечислени С Лог"] - table["Логистика"]
+    ).astype(int)
+    table["Сумма СПП"] = (
+        table["Сумма Продаж Наша Цена"] - table["Сумма Продаж по цене ВБ"]
+    ).astype(int)
+    table["% Лог/рс"] = (
+        ((table["Логистика"] / table["Сумма Продаж Перечислени С Лог"]) * 100)
+        .replace(np.inf, 100.0)
+        .round(1)
+    )
+    table["% Лог/Наша Цена"] = (
+        ((table["Логистика"] / table["Сумма Продаж Наша Цена"]) * 100)
+        .replace(np.inf, 100.0)
+        .round(1)
+    )
+
+    # Возвраты и чистые продажи
+    table["Возвраты Наша цена"] = returns[PRICE]
+    table["Возвраты реализация ВБ"] = returns[WB_PRICE]
+    table["Возврты к перечислению"] = returns[TRANSFER]
+    table["Чистые продажи Наши"] = (
+        table["Сумма Продаж Наша Цена"] - table["Возвраты Наша цена"]
+    )
+    table["Чистая реализацич ВБ"] = (
+        table["Сумма Продаж по цене ВБ"] - table["Возвраты реализация ВБ"]
+    )
+    table["Чистое Перечисление"] = (
+        table["Сумма Продаж Перечислени С Лог"] - table["Возврты к перечислению"]
+    )
+    table["Чистое Перечисление без Логистики"] = (
+        table["Чистое Перечисление"] - table["Логистика"]
+    )
+
+    # Средние значения (цены — по ненулевым строкам), без строк — нули
+    mean = {c: means[c].fillna(0).to_numpy() for c in MEAN_COLUMNS}
+    table["Наша цена Средняя"] = mean[PRICE].astype(int)
+    table["Реализация ВБ Средняя"] = mean[WB_PRICE].astype(int)
+    table["К перечислению Среднее"] = mean[TRANSFER].astype(int)
+    table["Логистика Одной Юбки Средняя"] = (mean[DELIVERY] * 2).astype(int)
+    table["СПП Средняя"] = (
+        table["Наша цена Средняя"] - table["Реализация ВБ Средняя"]
+    ).round(1)
+    table["К Перечислению без Логистики Средняя"] = (
+        table["К перечислению Среднее"] - table["Логистика Одной Юбки Средняя"]
+    ).round(1)
+    table["% Лог/Перечисление с Лог Средний"] = (
+        (
+            (table["Логистика Одной Юбки Средняя"] / table["К перечислению Среднее"])
+            * 100
+        )
+        .replace(np.inf, 100.0)
+        .round(1)
+    )
+    table["% Лог/Наша цена Средний"] = (
+        ((table["Логистика Одной Юбки Средняя"] / table["Наша цена Средняя"]) * 100)
+        .replace(np.inf, 100.0)
+        .round(1)
+    )
+
+    # Логистика: продажи и процент выкупа
+    if "logistics" in articles.columns.get_level_values(0):
+        logistics = articles["logistics"]
+        matrix, kinds = logistics.to_numpy(), list(logistics.columns)
+    else:
+        # В пустом отчёте нет ни одного вида логистики
+        matrix, kinds = np.zeros((len(articles), 0), dtype="int64"), []
+    sold, buyout = buyout_metrics(matrix, kinds)
+    table[SOLD] = sold
+    table["%Выкупа"] = buyout
+
+    # До этого места пустые отношения (0/0) в таблице заменялись нулями
+    table = table.fillna(0)
+    table.sort_values(by="Сумма Продаж Наша Цена", ascending=False, inplace=True)
+    return table
+
+
+def cost_column(costs=Costs()):
+    """Название колонки себестоимости продаж (в нём — цена единицы)."""
+    if costs.by_article is not None:
+        return f"Себес Продаж (по артикулам, иначе {costs.price:g}р)"
+    return f"Себес Продаж ({costs.price:g}р)"
+
+
+def unit_costs(articles, costs=Costs()):
+    """Себестоимость единицы для каждого артикула из articles."""
+    prices = np.full(len(articles), float(costs.price))
+    if costs.by_article is not None:
+        listed = costs.by_article.reindex(articles).to_numpy(dtype="float64")
+        prices = np.where(np.isnan(listed), prices, listed)
+    return prices
+
+
+def apply_costs(base, costs=Costs()):
+    """Добавляет к base_summary себестоимость, маржу, налоги и прибыль."""
+    table = base.copy()
+    sold = table[SOLD]
+    cost = cost_column(costs)
+    # Себестоимость — в целых рублях, как и при цене 600 ₽
+    table[cost] = np.round(sold * unit_costs(table[ARTICLE], costs)).astype("int64")
+
+    # Расчеты
+    table["Маржа"] = (table["Чистое Перечисление без Логистики"] - table[cost]).round(1)
+    table["Налоги"] = (table["Чистая реализацич ВБ"] * costs.tax_rate).round(1)
+    table["Прибыль"] = (table["Маржа"] - table["Налоги"]).round(1)
+    table["Прибыль на 1 Юбку"] = (table["Маржа"] / sold).replace(np.inf, 0).round(1)
+    return table
+
+
+def summary_by_article(articles, costs=Costs(), means=None):
+    """Строит таблицу «Summary_Table_by_Art» из агрегатов по артикулам."""
+    return apply_costs(base_summary(articles, means), costs)
+
+
+def total_summary(summary, payments, costs=Costs()):
+    """Строит таблицу «Totall_Summary» из таблицы по артикулам и оплат."""
+    fines = payments["Общая сумма штрафов"].sum()
+    storage = payments["Хранение"].sum()
+    deductions = payments["Удержания"].sum()
+    acceptance = payments["Платная приемка"].sum()
+    profit = summary["Прибыль"].sum()
+    return pd.DataFrame(
+        {
+            "Колонка": [
+                "Логистика",
+                "Сумма СПП",
+                "Сумма Чистых продаж без Возвратов и Логистики",
+                "Кол-во Продаж, Шт",
+                "Себестоимость продаж",
+                "Прибыль без налога",
+                "Штрафы",
+                "Хранение",
+                "Удержания",
+                "Платная приемка",
+                "Итого: прибыль минус доп. удержания",
+            ],
+            "Общая сумма": [
+                summary["Логистика"].sum(),
+                summary["Сумма СПП"].sum(),
+                summary["Чистое Перечисление без Логистики"].sum(),
+                summary[SOLD].sum(),
+                summary[cost_column(costs)].sum(),
+                profit,
+                fines,
+                storage,
+                deductions,
+                acceptance,
+                profit - (fines + storage + deductions + acceptance),
+            ],
+        }
+    )
+
+
+def group_summary(articles, mask, group, means=None):
+    """Таблица группы артикулов: продажи и средняя цена по артикулам группы.
+
+    articles — агрегаты по уникальным артикулам, mask — их принадлежность
+    группе (колонка wb_groups.group_membership), means — как у base_summary.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    selected = articles[mask]
+    if means is None:
+        means = article_means(selected)
+    else:
+        means = means[mask]
+    total = f"Сумма продаж ({group})"
+    values = pd.DataFrame(
+        {
+            total: selected[("sum", PRICE)].to_numpy(),
+            f"Цена средняя ({group})": means[PRICE].to_numpy(),
+        }
+    ).round(0)
+    # Как и раньше, в целые переводим только если нет артикулов без цены
+    if not values.isna().any().any():
+        values = values.astype(int)
+    table = pd.concat([pd.DataFrame({ARTICLE: selected.index}), values], axis=1)
+    table.sort_values(by=total, ascending=False, inplace=True)
+    return table
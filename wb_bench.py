@@ -0,0 +1,327 @@
+"""Бенчмарк обработки на синтетических отчётах (см. wb_synthetic).
+
+Для каждого размера отчёта и режима (один файл, два файла: Россия + СНГ)
+замеряются этапы: чтение xlsx, сжатие типов, агрегация по артикулам, количества видов
+логистики, сложение агрегатов файлов, таблица по артикулам, общие суммы,
+«Софт» и запись Excel. Время — лучшее из --repeat прогонов; пиковая память
+этапа — отдельным прогоном под tracemalloc (он замедляет код, поэтому в
+замер времени не входит). Агрегацию считает выбранный --backend.
+
+--check-backends сверяет результаты всех способов агрегации (pandas, DuckDB):
+таблицы Summary_Table_by_Art и Totall_Summary должны совпасть полностью. На
+больших отчётах; на малых то же (и потоковое чтение) проверяют тесты
+(python -m pytest tests).
+
+Результаты пишутся строками JSON — их можно сравнивать между коммитами:
+    python wb_bench.py --rows 100000 1000000 -o bench_output.txt
+    python wb_bench.py --compare old.txt bench_output.txt
+    python wb_bench.py --rows 100000 --check-backends
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+import numpy as np
+
+import pandas as pd
+
+from wb_aggregate import (
+    ARTICLE,
+    LOGISTICS_TYPE,
+    Costs,
+    article_means,
+    logistics_crosstab,
+    merge_partials,
+    summary_by_article,
+    total_summary,
+)
+from wb_groups import DEFAULT_RULES, group_tables
+from wb_ingest import compact_report, read_report
+from wb_pipeline import BACKENDS, build_workbook, get_backend, named_tables
+from wb_synthetic import (
+    EXCEL_MAX_ROWS,
+    VERSION,
+    default_articles,
+    generate_report,
+    write_report,
+)
+from wb_trace import count_rows
+
+DATA_DIR = os.environ.get(
+    "WB_BENCH_DIR", os.path.join(tempfile.gettempdir(), "wb_bench")
+)
+MODES = {"single": 1, "two": 2}
+MB = 1024 * 1024
+
+
+class Stages:
+    """Замеры этапов одного прогона; повторные этапы (по файлам) суммируются."""
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.results = {}
+
+    def run(self, name, rows_in, function, *args):
+        if self.memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        value = function(*args)
+        seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] - before if self.memory else 0
+
+        stage = self.results.setdefault(
+            name, {"seconds": 0.0, "peak_mb": 0.0, "rows_in": 0, "rows_out": 0}
+        )
+        stage["seconds"] += seconds
+        stage["peak_mb"] = max(stage["peak_mb"], peak / MB)
+        # Для чтения число строк на входе заранее неизвестно — берём выход
+        rows_out = count_rows(value) or 0
+        stage["rows_in"] += rows_out if rows_in is None else rows_in
+        stage["rows_out"] += rows_out
+        return value
+
+
+def _logistics(df):
+    column = df[ARTICLE]
+    codes = column.cat.codes.to_numpy().astype(np.intp)
+    return logistics_crosstab(codes, len(column.cat.categories), df[LOGISTICS_TYPE])[0]
+
+
+def run_once(inputs, stages, backend="pandas"):
+    """Один прогон обработки; inputs — байты xlsx или готовые таблицы отчётов."""
+    aggregate = get_backend(backend)
+    parts = []
+    for source in inputs:
+        if isinstance(source, bytes):
+            df = stages.run("read", None, read_report, BytesIO(source))
+        else:
+            df = source
+        df = stages.run("compact", len(df), compact_report, df)
+        parts.append(stages.run("aggregate", len(df), aggregate, df))
+        # Логистика уже входит в агрегацию; отдельно — чтобы видеть её долю
+        stages.run("logistics", len(df), _logistics, df)
+    if len(parts) > 1:
+        partials = stages.run(
+            "merge", sum(len(p.articles) for p in parts), merge_partials, parts
+        )
+    else:
+        partials = parts[0]
+    articles = len(partials.articles)
+    means = stages.run("means", articles, article_means, partials.articles)
+    summary = stages.run(
+        "summary", articles, summary_by_article, partials.articles, Costs(), means
+    )
+    totals = stages.run("totals", articles, total_summary, summary, partials.payments)
+    groups = stages.run(
+        "groups", articles, group_tables, partials.articles, DEFAULT_RULES, (), means
+    )
+    tables = (summary, totals, groups)
+    rows = sum(len(t) for _, t in named_tables(tables))
+    stages.run("write", rows, build_workbook, tables)
+    return stages.results
+
+
+def prepare_inputs(rows, files, seed=0, data_dir=DATA_DIR):
+    """Отчёты для прогона: rows строк на files файлов с общим списком артикулов.
+
+    Отчёты, которые помещаются на лист Excel, записываются в xlsx (и хранятся
+    в data_dir между запусками); более крупные отдаются готовыми таблицами —
+    для них этап чтения не замеряется.
+    """
+    articles = default_articles(rows)
+    inputs = []
+    for i in range(files):
+        file_rows = rows // files
+        file_seed = seed + i
+        if file_rows > EXCEL_MAX_ROWS:
+            inputs.append(
+                generate_report(file_rows, articles, file_seed, extra_columns=False)
+            )
+            continue
+        path = os.path.join(
+            data_dir, f"report_v{VERSION}_{file_rows}_{articles}_{file_seed}.xlsx"
+        )
+        if not os.path.exists(path):
+            os.makedirs(data_dir, exist_ok=True)
+            temporary = path + ".tmp"
+            write_report(generate_report(file_rows, articles, file_seed), temporary)
+            os.replace(temporary, path)
+        with open(path, "rb") as f:
+            inputs.append(f.read())
+    return inputs
+
+
+def benchmark(
+    rows, mode, repeat=3, memory=True, seed=0, data_dir=DATA_DIR, backend="pandas"
+):
+    """Замеры этапов для отчёта из rows строк в режиме mode (single / two)."""
+    inputs = prepare_inputs(rows, MODES[mode], seed, data_dir)
+    runs = [run_once(inputs, Stages(), backend) for _ in range(repeat)]
+    results = {
+        name: dict(stage, seconds=min(run[name]["seconds"] for run in runs))
+        for name, stage in runs[0].items()
+    }
+    if memory:
+        tracemalloc.start()
+        try:
+            for name, stage in run_once(inputs, Stages(memory=True), backend).items():
+                results[name]["peak_mb"] = stage["peak_mb"]
+        finally:
+            tracemalloc.stop()
+    return results
+
+
+def check_backends(inputs):
+    """Сверяет итоговые таблицы всех способов агрегации на одних и тех же отчётах.
+
+    Возвращает время агрегации по способам; при расхождении — AssertionError.
+    """
+    frames = [
+        compact_report(read_report(BytesIO(s)) if isinstance(s, bytes) else s)
+        for s in inputs
+    ]
+    tables, seconds = {}, {}
+    for name, aggregate in BACKENDS.items():
+        started = time.perf_counter()
+        parts = [aggregate(df) for df in frames]
+        seconds[name] = time.perf_counter() - started
+        partials = merge_partials(parts)
+        summary = summary_by_article(partials.articles)
+        tables[name] = (summary, total_summary(summary, partials.payments))
+        if partials.cube is not None:
+            tables[name] += (partials.cube,)
+    reference, *others = BACKENDS
+    for name in others:
+        for expected, actual in zip(tables[reference], tables[name]):
+            pd.testing.assert_frame_equal(expected, actual)
+    return seconds
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _load(path):
+    with open(path, encoding="utf-8") as f:
+        return {
+            (r["rows"], r["mode"], r["stage"]): r for r in map(json.loads, f) if r
+        }
+
+
+def compare(old_path, new_path):
+    """Печатает изменение времени и памяти этапов между двумя файлами замеров."""
+    old, new = _load(old_path), _load(new_path)
+    print(f"{'строк':>9} {'режим':<6} {'этап':<10} {'было, с':>9} {'стало, с':>9}"
+          f" {'x':>6} {'память, МБ':>16}")
+    for key in sorted(old.keys() & new.keys()):
+        a, b = old[key], new[key]
+        ratio = a["seconds"] / b["seconds"] if b["seconds"] else float("inf")
+        print(
+            f"{key[0]:>9} {key[1]:<6} {key[2]:<10} {a['seconds']:>9.3f}"
+            f" {b['seconds']:>9.3f} {ratio:>6.2f}"
+            f" {a['peak_mb']:>7.1f} -> {b['peak_mb']:<7.1f}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Бенчмарк этапов обработки на синтетических отчётах Wildberries."
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=[100_000, 1_000_000],
+        help="размеры отчётов в строках (например, 100000 1000000 10000000)",
+    )
+    parser.add_argument(
+        "--mode", choices=list(MODES), nargs="+", default=list(MODES)
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="прогонов на замер")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--no-memory", action="store_true", help="не замерять память (быстрее)"
+    )
+    parser.add_argument("--data-dir", default=DATA_DIR, help="где хранить отчёты")
+    parser.add_argument(
+        "-o", "--output", default="bench_output.txt", help="файл строк JSON"
+    )
+    parser.add_argument(
+        "--backend", choices=list(BACKENDS), default="pandas", help="чем агрегировать"
+    )
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("OLD", "NEW"), help="сравнить два файла"
+    )
+    parser.add_argument(
+        "--check-backends",
+        action="store_true",
+        help="сверить результаты всех способов агрегации вместо замеров",
+    )
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    if args.check_backends:
+        for rows in args.rows:
+            for mode in args.mode:
+                inputs = prepare_inputs(rows, MODES[mode], args.seed, args.data_dir)
+                seconds = check_backends(inputs)
+                timings = ", ".join(f"{n} {s:.3f} с" for n, s in seconds.items())
+                print(f"{rows:>9} {mode:<6} таблицы совпадают; агрегация: {timings}")
+        return 0
+
+    commit = _commit()
+    with open(args.output, "w", encoding="utf-8") as output:
+        for rows in args.rows:
+            for mode in args.mode:
+                results = benchmark(
+                    rows,
+                    mode,
+                    args.repeat,
+                    not args.no_memory,
+                    args.seed,
+                    args.data_dir,
+                    args.backend,
+                )
+                total = sum(stage["seconds"] for stage in results.values())
+                for name, stage in results.items():
+                    record = dict(
+                        commit=commit,
+                        backend=args.backend,
+                        rows=rows,
+                        mode=mode,
+                        stage=name,
+                    )
+                    record.update(stage)
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    print(
+                        f"{rows:>9} {mode:<6} {name:<10} {stage['seconds']:>8.3f} с"
+                        f" {stage['peak_mb']:>8.1f} МБ"
+                        f" {stage['rows_in']:>9} -> {stage['rows_out']}",
+                        flush=True,
+                    )
+                print(f"{rows:>9} {mode:<6} {'итого':<10} {total:>8.3f} с", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""Кэши по хэшу содержимого загруженных файлов.
+
+Streamlit перезапускает скрипт при любом действии пользователя (скачивание,
+переключение режима), поэтому одинаковые загрузки не должны обрабатываться
+заново. ResultCache живёт в процессе сервера и общий для всех сессий:
+RESULT_CACHE хранит результаты обработки файлов, а DERIVED_CACHE — то, что
+из них быстро пересчитывается (таблицы с себестоимостью, замеры выгрузок),
+чтобы перебор цены в одной сессии не вытеснял результаты других;
+FrameCache хранит разобранные отчёты на диске (Parquet) между сессиями и
+перезапусками сервера, а FileCache — готовые выгрузки, которые отдаются
+с диска, а не держатся в памяти.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Ограничения кэша можно задать через переменные окружения
+DEFAULT_MAX_ENTRIES = int(os.environ.get("WB_CACHE_MAX_ENTRIES", "16"))
+DEFAULT_MAX_MB = float(os.environ.get("WB_CACHE_MAX_MB", "512"))
+DERIVED_MAX_ENTRIES = int(os.environ.get("WB_DERIVED_CACHE_ENTRIES", "32"))
+DERIVED_MAX_MB = float(os.environ.get("WB_DERIVED_CACHE_MB", "128"))
+PARSED_CACHE_DIR = os.environ.get(
+    "WB_PARSED_CACHE_DIR", os.path.join(tempfile.gettempdir(), "wb_parsed_cache")
+)
+PARSED_CACHE_MAX_MB = float(os.environ.get("WB_PARSED_CACHE_MB", "2048"))
+EXPORT_CACHE_DIR = os.environ.get(
+    "WB_EXPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "wb_export_cache")
+)
+EXPORT_CACHE_MAX_MB = float(os.environ.get("WB_EXPORT_CACHE_MB", "1024"))
+
+
+def content_hash(*parts):
+    """Хэш содержимого: байты файлов (или mmap) и строковые параметры (режим)."""
+    digest = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        # Длина перед данными, чтобы ("ab", "c") и ("a", "bc") не совпадали
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def estimate_size(value):
+    """Примерный размер результата в байтах: таблицы pandas и байтовые строки."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if hasattr(value, "memory_usage"):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_size(v) for v in value)
+    if isinstance(value, dict):
+        return sum(estimate_size(v) for v in value.values())
+    return 0
+
+
+class ResultCache:
+    """LRU-кэш с ограничением по числу записей и суммарному размеру."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_mb=DEFAULT_MAX_MB):
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def size_bytes(self):
+        return self._size
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            # Результат больше всего кэша не сохраняем, чтобы не вытеснить остальное
+            if size > self.max_bytes:
+                return value
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._size > self.max_bytes
+            ):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+        return value
+
+    def get_or_compute(self, key, compute):
+        """Возвращает закэшированный результат или вычисляет и сохраняет его."""
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+# Общий кэш процесса: модуль импортируется один раз и переживает перезапуски скрипта
+RESULT_CACHE = ResultCache()
+# Производные результаты: при вытеснении пересчитываются из RESULT_CACHE за
+# миллисекунды, поэтому держатся отдельно и не вытесняют обработанные файлы
+DERIVED_CACHE = ResultCache(DERIVED_MAX_ENTRIES, DERIVED_MAX_MB)
+
+
+class FileCache:
+    """Дисковый LRU-кэш файлов с ограничением суммарного размера.
+
+    Запись идёт во временный файл с последующим os.replace, поэтому несколько
+    сессий (и процессов) могут пользоваться одним каталогом: читатель видит
+    либо целый файл, либо его отсутствие. Время последнего чтения хранится в
+    mtime файла — по нему вытесняются самые давние записи.
+    """
+
+    SUFFIX = ""
+
+    def __init__(self, directory=EXPORT_CACHE_DIR, max_mb=EXPORT_CACHE_MAX_MB):
+        self.directory = directory
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.directory) and self.max_bytes > 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def get(self, key):
+        """Путь к файлу записи key или None."""
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def _write(self, key, write):
+        # write(path) пишет файл во временный путь; возвращает путь записи
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        path = self._path(key)
+        try:
+            write(temporary)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        # Только что записанный файл не вытесняем, даже если он больше лимита
+        self.evict(keep=path)
+        return path
+
+    def get_or_write(self, key, write):
+        """Путь к файлу записи key; если его нет — файл пишет write(path)."""
+        return self.get(key) or self._write(key, write)
+
+    def evict(self, keep=None):
+        """Удаляет самые давно использованные файлы, пока кэш больше лимита."""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                # Временные файлы — чужие записи, которые ещё не закончены
+                if entry.name.endswith(self.SUFFIX) and not entry.name.endswith(".tmp"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+class FrameCache(FileCache):
+    """Дисковый LRU-кэш таблиц в Parquet (см. FileCache)."""
+
+    SUFFIX = ".parquet"
+
+    def __init__(self, directory=PARSED_CACHE_DIR, max_mb=PARSED_CACHE_MAX_MB):
+        super().__init__(directory, max_mb)
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            frame = pd.read_parquet(path)
+            os.utime(path)
+        except (FileNotFoundError, OSError, ValueError):
+            # Нет файла, его только что вытеснили или он повреждён — это промах
+            return None
+        return frame
+
+    def put(self, key, frame):
+        if not self.enabled:
+            return frame
+        self._write(key, frame.to_parquet)
+        return frame
+
+
+# Кэш разобранных отчётов: повторная загрузка тех же байтов читается из Parquet
+PARSED_CACHE = FrameCache()
+
+# Готовые выгрузки (xlsx, csv, ...) на диске: отдаются файлом, а не из памяти
+EXPORT_CACHE = FileCache()
@@ -0,0 +1,297 @@
+"""Пакетная обработка отчётов Wildberries из командной строки (без Streamlit).
+
+Примеры:
+    python wb_cli.py reports/                       # по файлу результата на отчёт
+    python wb_cli.py "reports/2024-*.xlsx" -o out/  # маска файлов
+    python wb_cli.py reports/ --combined itog.xlsx  # один общий отчёт
+    python wb_cli.py reports/ --cost-price 550 --costs sebes.xlsx
+    python wb_cli.py week12.zip                     # архив: один общий отчёт
+    python wb_cli.py reports/ --groups gruppy.xlsx  # свои группы артикулов
+
+В общем отчёте (--combined или архив) строки, которые уже были в предыдущих
+файлах, не учитываются (см. wb_dedup); --keep-duplicates отключает это.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import repeat
+
+from wb_aggregate import COST_PRICE, TAX_RATE, Costs, merge_partials
+from wb_dedup import DEDUP
+from wb_groups import DEFAULT_RULES, GROUP, PATTERN, read_group_rules
+from wb_ingest import COST, archive_members, expand_archives, read_article_costs
+from wb_pipeline import (
+    BACKEND,
+    BACKENDS,
+    MAX_WORKERS,
+    aggregate_file,
+    aggregate_keyed,
+    build_tables,
+    build_workbook,
+    drop_duplicates,
+)
+
+REPORT_EXTENSIONS = (".xlsx", ".xls", ".zip")
+
+
+def find_reports(patterns):
+    """Раскрывает каталоги и маски в отсортированный список файлов отчётов."""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            candidates = glob.glob(pattern)
+        paths.extend(
+            p
+            for p in candidates
+            if os.path.isfile(p)
+            and p.lower().endswith(REPORT_EXTENSIONS)
+            # Временные файлы открытого в Excel документа
+            and not os.path.basename(p).startswith("~$")
+        )
+    return sorted(set(paths))
+
+
+def _write_workbook(tables, path):
+    with open(path, "wb") as f:
+        f.write(build_workbook(tables))
+
+
+def aggregate_timed(path, backend=BACKEND, keyed=False):
+    """Агрегирует один отчёт и возвращает агрегаты со временем разбора.
+
+    keyed=True — вместо агрегатов пара «агрегаты, ключи строк» для поиска
+    повторов (wb_pipeline.aggregate_keyed).
+    """
+    started = time.perf_counter()
+    if keyed:
+        result = aggregate_keyed(path, backend)
+    else:
+        result = aggregate_file(path, backend)
+    return result, time.perf_counter() - started
+
+
+def _print_duplicates(dropped):
+    for label, count in dropped[dropped > 0].items():
+        print(f"{label}: отброшено повторов строк {count}", flush=True)
+
+
+def combine(pool, sources, results, backend=BACKEND, dedup=DEDUP):
+    """Складывает агрегаты файлов sources (results — из aggregate_timed).
+
+    С dedup результаты должны быть парами aggregate_keyed: строки, которые
+    уже были в предыдущих файлах, отбрасываются, а их число печатается.
+    """
+    if not dedup:
+        return merge_partials(results)
+    parts, dropped = drop_duplicates(sources, results, backend, pool)
+    _print_duplicates(dropped)
+    return merge_partials(parts)
+
+
+def process_file(path, output_dir, backend=BACKEND, costs=Costs(), rules=None):
+    """Обрабатывает один отчёт и записывает Excel-файл с результатом в output_dir."""
+    partials, read_seconds = aggregate_timed(path, backend)
+    started = time.perf_counter()
+    stem = os.path.splitext(os.path.basename(path))[0]
+    output = os.path.join(output_dir, f"{stem}_summary.xlsx")
+    _write_workbook(build_tables(partials, costs, rules), output)
+    return output, read_seconds, time.perf_counter() - started
+
+
+def process_archive(
+    pool, path, output_dir, backend=BACKEND, costs=Costs(), dedup=DEDUP, rules=None
+):
+    """Обрабатывает zip-архив отчётов и записывает по нему один общий отчёт.
+
+    Файлы архива разбираются параллельно в pool и складываются, как Россия и
+    СНГ в режиме двух файлов (с dedup — без повторов строк, см. combine).
+    """
+    started = time.perf_counter()
+    members = expand_archives([path])
+    results = pool.map(aggregate_timed, members, repeat(backend), repeat(dedup))
+    partials = combine(pool, members, [r for r, _ in results], backend, dedup)
+    read_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    stem = os.path.splitext(os.path.basename(path))[0]
+    output = os.path.join(output_dir, f"{stem}_summary.xlsx")
+    _write_workbook(build_tables(partials, costs, rules), output)
+    return output, read_seconds, time.perf_counter() - started
+
+
+def _print_result(path, output, read_seconds, write_seconds):
+    print(
+        f"{path}: разбор {read_seconds:.2f} с, запись {write_seconds:.2f} с"
+        f" -> {output}",
+        flush=True,
+    )
+
+
+def _run(pool, function, paths, *args):
+    # Ошибка в одном файле не останавливает обработку остальных
+    futures = {pool.submit(function, path, *args): path for path in paths}
+    for future in as_completed(futures):
+        path = futures[future]
+        try:
+            yield path, future.result()
+        except Exception as e:
+            print(f"{path}: ошибка: {e}", file=sys.stderr, flush=True)
+            yield path, None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Обработка детализированных отчётов Wildberries по артикулам."
+    )
+    parser.add_argument(
+        "inputs", nargs="+", help="каталоги, файлы или маски файлов отчётов"
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        default=".",
+        help="куда писать результаты по каждому файлу (по умолчанию — текущий каталог)",
+    )
+    parser.add_argument(
+        "--combined",
+        metavar="FILE",
+        help="вместо отчёта на каждый файл записать один общий отчёт",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=MAX_WORKERS,
+        help=f"число процессов (по умолчанию {MAX_WORKERS})",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=list(BACKENDS),
+        default=BACKEND,
+        help=f"чем считать агрегаты (по умолчанию {BACKEND})",
+    )
+    parser.add_argument(
+        "--cost-price",
+        type=float,
+        default=COST_PRICE,
+        help=f"себестоимость единицы товара, ₽ (по умолчанию {COST_PRICE})",
+    )
+    parser.add_argument(
+        "--tax-rate",
+        type=float,
+        default=TAX_RATE,
+        help=f"ставка налога с реализации ВБ, доля (по умолчанию {TAX_RATE})",
+    )
+    parser.add_argument(
+        "--costs",
+        metavar="FILE",
+        help="себестоимость по артикулам: xlsx с колонками «Артикул поставщика» "
+        f"и «{COST}» (остальные артикулы — по --cost-price)",
+    )
+    parser.add_argument(
+        "--groups",
+        metavar="FILE",
+        help=f"группы артикулов: xlsx с колонками «{GROUP}» и «{PATTERN}» "
+        "(регулярное выражение); по листу на группу в дополнение к «Софт»",
+    )
+    parser.add_argument(
+        "--keep-duplicates",
+        action="store_true",
+        help="в общем отчёте учитывать и строки, которые повторяются в файлах",
+    )
+    args = parser.parse_args(argv)
+    dedup = DEDUP and not args.keep_duplicates
+
+    paths = find_reports(args.inputs)
+    if not paths:
+        parser.error("не найдено ни одного файла отчёта .xlsx/.xls/.zip")
+    by_article = read_article_costs(args.costs) if args.costs else None
+    costs = Costs(args.cost_price, args.tax_rate, by_article)
+    rules = None
+    if args.groups:
+        try:
+            rules = DEFAULT_RULES + read_group_rules(args.groups)
+        except ValueError as e:
+            parser.error(f"{args.groups}: {e}")
+
+    started = time.perf_counter()
+    archives, broken = [], []
+    for path in paths:
+        try:
+            if archive_members(path) is not None:
+                archives.append(path)
+        except ValueError as e:
+            # Архив без отчётов
+            print(f"{path}: ошибка: {e}", file=sys.stderr, flush=True)
+            broken.append(path)
+    failed = len(broken)
+    # Процессов — по числу отчётов, считая файлы внутри архивов
+    reports = expand_archives(p for p in paths if p not in broken)
+    workers = max(1, min(args.workers, len(reports)))
+    with ProcessPoolExecutor(workers) as pool:
+        if args.combined:
+            # Файлы архивов разбираются наравне с остальными отчётами
+            results = {}
+            for path, result in _run(
+                pool, aggregate_timed, reports, args.backend, dedup
+            ):
+                if result is None:
+                    failed += 1
+                    continue
+                results[path], seconds = result
+                print(f"{path}: разбор {seconds:.2f} с", flush=True)
+            if failed:
+                print("Общий отчёт не записан: не все файлы обработаны", file=sys.stderr)
+                return 1
+            # Повтором считается строка из файла, который идёт позже по списку
+            partials = combine(
+                pool, reports, [results[p] for p in reports], args.backend, dedup
+            )
+            write_started = time.perf_counter()
+            _write_workbook(build_tables(partials, costs, rules), args.combined)
+            print(
+                f"{args.combined}: запись {time.perf_counter() - write_started:.2f} с",
+                flush=True,
+            )
+        else:
+            os.makedirs(args.output_dir, exist_ok=True)
+            files = [p for p in paths if p not in archives and p not in broken]
+            for path, result in _run(
+                pool,
+                process_file,
+                files,
+                args.output_dir,
+                args.backend,
+                costs,
+                rules,
+            ):
+                if result is None:
+                    failed += 1
+                    continue
+                _print_result(path, *result)
+            # Архив — один общий отчёт; его файлы разбираются в том же пуле
+            for path in archives:
+                try:
+                    result = process_archive(
+                        pool, path, args.output_dir, args.backend, costs, dedup, rules
+                    )
+                except Exception as e:
+                    print(f"{path}: ошибка: {e}", file=sys.stderr, flush=True)
+                    failed += 1
+                    continue
+                _print_result(path, *result)
+
+    print(
+        f"Готово: файлов {len(paths) - failed} из {len(paths)}, процессов {workers}, "
+        f"всего {time.perf_counter() - started:.2f} с"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
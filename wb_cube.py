@@ -0,0 +1,134 @@
+"""Разбивка по периодам: срезы куба артикул × день продажи × тип документа.
+
+Куб (wb_aggregate.aggregate_cube) считается один раз при обработке отчёта.
+Фильтры и детализация в интерфейсе режут готовый куб — сотни тысяч ячеек
+вместо миллионов строк отчёта: оси заранее разложены в коды, а срез — это
+маска по кодам и np.bincount, так что ответ занимает миллисекунды. Группы
+артикулов (wb_groups) проверяются один раз по уникальным артикулам куба, а
+ячейки получают принадлежность по кодам артикулов.
+"""
+
+import numpy as np
+import pandas as pd
+
+from wb_aggregate import ARTICLE, CUBE_COLUMNS, DOCUMENT_TYPE, ROWS
+from wb_groups import default_rules, group_membership
+
+# Показатели куба и периоды разбивки
+MEASURES = (ROWS, *CUBE_COLUMNS)
+PERIODS = {"D": "День", "W": "Неделя"}
+PERIOD = "Период"
+
+
+class ReportCube:
+    """Куб с разложенными по кодам осями для быстрых срезов."""
+
+    def __init__(self, cube, rules=()):
+        self.cube = cube
+        index = cube.index
+        self.articles, days, self.document_types = index.levels
+        self._articles, self._days, self._types = (
+            np.asarray(codes, dtype=np.intp) for codes in index.codes
+        )
+        membership = group_membership(self.articles, rules)
+        self.groups = list(membership.columns)
+        self._groups = membership.to_numpy()
+        self._values = {m: cube[m].to_numpy(dtype="float64") for m in MEASURES}
+        # Неделя обозначается своим понедельником
+        weeks = days - pd.to_timedelta(days.dayofweek, unit="D")
+        week_codes, weeks = pd.factorize(weeks, sort=True)
+        self._periods = {
+            "D": (np.arange(len(days)), days),
+            "W": (week_codes, pd.DatetimeIndex(weeks)),
+        }
+
+    def __len__(self):
+        return len(self.cube)
+
+    def memory_usage(self, deep=True):
+        """Примерный размер в байтах (для ограничения кэша результатов)."""
+        codes = self._articles.nbytes + self._days.nbytes + self._types.nbytes
+        codes += self._groups.nbytes
+        return int(self.cube.memory_usage(deep=deep).sum()) + codes
+
+    def _mask(self, articles=None, document_types=None, groups=None):
+        mask = np.ones(len(self.cube), dtype=bool)
+        if articles:
+            codes = self.articles.get_indexer(list(articles))
+            mask &= np.isin(self._articles, codes[codes >= 0])
+        if groups:
+            columns = [self.groups.index(g) for g in groups if g in self.groups]
+            # Принадлежность уникальных артикулов -> ячейки по кодам артикулов
+            mask &= self._groups[:, columns].any(axis=1)[self._articles]
+        if document_types:
+            codes = self.document_types.get_indexer(list(document_types))
+            mask &= np.isin(self._types, codes[codes >= 0])
+        return mask
+
+    def _totals(self, codes, n, measure, mask):
+        totals = np.bincount(codes, weights=self._values[measure][mask], minlength=n)
+        return totals.astype("int64") if measure == ROWS else totals
+
+    def by_period(
+        self, measure=ROWS, period="D", articles=None, document_types=None, groups=None
+    ):
+        """Таблица период × тип документа: measure по выбранным артикулам и типам.
+
+        Пустые фильтры — все артикулы и все типы документов; groups — только
+        артикулы этих групп. Периоды и типы без строк в таблицу не попадают.
+        """
+        mask = self._mask(articles, document_types, groups)
+        period_codes, labels = self._periods[period]
+        periods = period_codes[self._days[mask]]
+        types = self._types[mask]
+        n_types = len(self.document_types)
+        totals = self._totals(
+            periods * n_types + types, len(labels) * n_types, measure, mask
+        ).reshape(len(labels), n_types)
+        present = np.bincount(periods * n_types + types, minlength=totals.size)
+        present = present.reshape(len(labels), n_types) > 0
+        table = pd.DataFrame(
+            totals,
+            index=pd.Index(labels, name=PERIOD),
+            columns=pd.Index(self.document_types, name=DOCUMENT_TYPE),
+        )
+        return table.loc[present.any(axis=1), present.any(axis=0)]
+
+    def by_article(
+        self,
+        measure=ROWS,
+        articles=None,
+        document_types=None,
+        start=None,
+        end=None,
+        groups=None,
+    ):
+        """measure по артикулам (по убыванию) за дни [start, end] включительно."""
+        mask = self._mask(articles, document_types, groups)
+        if start is not None or end is not None:
+            inside = np.ones(len(self.days), dtype=bool)
+            if start is not None:
+                inside &= self.days >= pd.Timestamp(start)
+            if end is not None:
+                inside &= self.days <= pd.Timestamp(end)
+            mask &= inside[self._days]
+        codes = self._articles[mask]
+        totals = self._totals(codes, len(self.articles), measure, mask)
+        used = np.bincount(codes, minlength=len(self.articles)) > 0
+        result = pd.Series(totals, index=pd.Index(self.articles, name=ARTICLE))
+        return result[used].sort_values(ascending=False).rename(measure)
+
+    @property
+    def days(self):
+        """Дни продажи, которые есть в кубе (по возрастанию)."""
+        return self._periods["D"][1]
+
+
+def build_cube(cube, rules=None):
+    """ReportCube из куба частичных агрегатов (None, если куба нет).
+
+    rules — правила групп артикулов (по умолчанию wb_groups.default_rules()).
+    """
+    if cube is None:
+        return None
+    return ReportCube(cube, default_rules() if rules is None else rules)
@@ -0,0 +1,85 @@
+"""Поиск строк, которые повторяются в нескольких отчётах.
+
+Отчёты за пересекающиеся недели (или один файл, загруженный дважды) содержат
+одни и те же строки, и при сложении агрегатов они посчитались бы дважды.
+Строку определяют колонки IDENTITY_COLUMNS: Srid (номер операции), баркод,
+тип документа, обоснование для оплаты, вид логистики и дата продажи. Ключ
+каждой строки — 64-битный хэш этих колонок (row_keys), посчитанный векторно
+по колонкам: широкая таблица целиком, как в drop_duplicates, не сравнивается.
+Повторы ищутся одной хэш-таблицей по ключам всех файлов (find_duplicates),
+то есть за линейное время.
+
+Повтор — строка, ключ которой уже был в одном из предыдущих файлов. Строки
+одного отчёта между собой не сравниваются: их выдал Wildberries, и обработка
+всегда считала их все. Строки без Srid (хранение, удержания) не отбрасываются
+никогда: отличить повтор от другой операции с тем же баркодом и датой нечем.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from wb_aggregate import DOCUMENT_TYPE, LOGISTICS_TYPE, PAYMENT_REASON, SALE_DATE
+
+SRID = "Srid"
+BARCODE = "Баркод"
+IDENTITY_COLUMNS = (
+    SRID,
+    BARCODE,
+    DOCUMENT_TYPE,
+    PAYMENT_REASON,
+    LOGISTICS_TYPE,
+    SALE_DATE,
+)
+
+# Повторы ищутся по умолчанию; WB_DEDUP=0 отключает поиск
+DEDUP = os.environ.get("WB_DEDUP", "1") != "0"
+# Подпись числа отброшенных строк в отчётах о повторах
+DUPLICATES = "Отброшено повторов"
+
+
+def row_keys(df):
+    """Ключи строк таблицы отчёта (uint64); 0 — строка без Srid.
+
+    None, если в таблице нет колонки Srid: такой отчёт не с чем сравнивать.
+    Категориальные колонки хэшируются по значениям, а не по кодам, так что
+    ключи разных файлов и пачек сравнимы.
+    """
+    if SRID not in df.columns:
+        return None
+    columns = [c for c in IDENTITY_COLUMNS if c in df.columns]
+    keys = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    # Srid уже хэш (wb_ingest.HASH), пустой — 0
+    return np.where(df[SRID].to_numpy() == 0, np.uint64(0), keys)
+
+
+def find_duplicates(keys):
+    """Маски повторов по ключам строк файлов (списки row_keys в порядке файлов).
+
+    Для каждого файла — булев массив по его строкам («строка уже была в
+    предыдущих файлах») или None, если повторов в файле нет.
+    """
+    present = [None if k is None else np.flatnonzero(k) for k in keys]
+    known = [k[p] for k, p in zip(keys, present) if p is not None]
+    if len(known) < 2:
+        return [None] * len(keys)
+    # factorize нумерует ключи в порядке первого появления, поэтому ключ уже
+    # встречался в предыдущих файлах, если его код меньше числа их ключей
+    codes, _ = pd.factorize(np.concatenate(known))
+    masks, seen, start = [], 0, 0
+    for k, rows in zip(keys, present):
+        if rows is None or not len(rows):
+            masks.append(None)
+            continue
+        file_codes = codes[start : start + len(rows)]
+        start += len(rows)
+        repeated = file_codes < seen
+        seen = max(seen, int(file_codes.max()) + 1)
+        if repeated.any():
+            mask = np.zeros(len(k), dtype=bool)
+            mask[rows[repeated]] = True
+            masks.append(mask)
+        else:
+            masks.append(None)
+    return masks
@@ -0,0 +1,201 @@
+"""Агрегация отчёта во встроенной DuckDB.
+
+Считает те же частичные агрегаты, что и wb_aggregate.aggregate_report
+(суммы по артикулам, суммы по возвратам, ненулевые значения для средних,
+количества видов логистики, суммы по «Обоснованию для оплаты» и куб по
+дням продажи), но
+SQL-запросами: DuckDB сканирует таблицу в несколько потоков и при нехватке
+памяти выгружает промежуточные данные на диск. Суммы считаются fsum (с
+компенсацией ошибок округления, как groupby.sum в pandas).
+
+DuckDB — необязательная зависимость и импортируется при первом вызове.
+"""
+
+import os
+import tempfile
+
+import pandas as pd
+
+from wb_aggregate import (
+    ARTICLE,
+    CUBE_COLUMNS,
+    DOCUMENT_TYPE,
+    LOGISTICS_TYPE,
+    NONZERO_MEAN_COLUMNS,
+    PAYMENT_COLUMNS,
+    PAYMENT_REASON,
+    RETURN_COLUMNS,
+    RETURN_DOCUMENT,
+    ROWS,
+    SALE_DATE,
+    SUM_COLUMNS,
+    UNSPECIFIED_DOCUMENT,
+    UNSPECIFIED_LOGISTICS,
+    ReportPartials,
+    key_values,
+)
+
+# Потоки и память DuckDB (по умолчанию — все ядра и 80% памяти)
+THREADS = int(os.environ.get("WB_DUCKDB_THREADS", "0"))
+MEMORY_LIMIT = os.environ.get("WB_DUCKDB_MEMORY", "")
+# Куда выгружать промежуточные данные, когда они не помещаются в память
+TEMP_DIR = os.environ.get(
+    "WB_DUCKDB_TEMP_DIR", os.path.join(tempfile.gettempdir(), "wb_duckdb")
+)
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _literal(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+def connect():
+    """Соединение с DuckDB в памяти с настройками потоков и выгрузки на диск."""
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError(
+            "Для агрегации в DuckDB установите пакет duckdb: pip install duckdb"
+        ) from None
+
+    connection = duckdb.connect()
+    if THREADS:
+        connection.execute(f"SET threads = {THREADS}")
+    if MEMORY_LIMIT:
+        connection.execute(f"SET memory_limit = {_literal(MEMORY_LIMIT)}")
+    connection.execute(f"SET temp_directory = {_literal(TEMP_DIR)}")
+    return connection
+
+
+def _article_columns():
+    # Те же колонки и в том же порядке, что у aggregate_report
+    money, counts = [], [(("count", ROWS), "count(*)")]
+    is_return = f"{_quote(DOCUMENT_TYPE)} = {_literal(RETURN_DOCUMENT)}"
+    for column in SUM_COLUMNS:
+        value = f"CAST({_quote(column)} AS DOUBLE)"
+        money.append((("sum", column), f"fsum({value})"))
+        if column in RETURN_COLUMNS:
+            returns = f"fsum({value}) FILTER (WHERE {is_return})"
+            money.append((("return", column), returns))
+        if column in NONZERO_MEAN_COLUMNS:
+            # NaN из pandas приходит в DuckDB как NULL, а NULL <> 0 — не истина
+            nonzero = f"FILTER (WHERE {value} <> 0)"
+            money.append((("nonzero_sum", column), f"fsum({value}) {nonzero}"))
+            counts.append((("nonzero_count", column), f"count(*) {nonzero}"))
+        else:
+            counts.append((("count", column), f"count({value})"))
+    return money, counts
+
+
+def _aggregate_articles(connection, df):
+    money, counts = _article_columns()
+    selected = money + counts
+    query = (
+        f"SELECT CAST({_quote(ARTICLE)} AS VARCHAR) AS article, "
+        + ", ".join(f"{sql} AS c{i}" for i, (_, sql) in enumerate(selected))
+        + f" FROM report WHERE {_quote(ARTICLE)} IS NOT NULL GROUP BY ALL"
+    )
+    result = connection.execute(query).df().set_index("article")
+
+    data = {}
+    for i, (key, _) in enumerate(money):
+        # Сумма по пустому множеству в SQL — NULL, в pandas — 0
+        data[key] = result[f"c{i}"].fillna(0.0).to_numpy(dtype="float64")
+    for i, (key, _) in enumerate(counts, start=len(money)):
+        data[key] = result[f"c{i}"].to_numpy(dtype="int64")
+    articles = pd.Index(result.index, name=ARTICLE)
+
+    # Виды логистики: количества по парам (артикул, вид), затем матрица
+    names = list(key_values(df[LOGISTICS_TYPE]))
+    pairs = connection.execute(
+        f"SELECT CAST({_quote(ARTICLE)} AS VARCHAR) AS article, "
+        f"CAST({_quote(LOGISTICS_TYPE)} AS VARCHAR) AS kind, count(*) AS n "
+        f"FROM report WHERE {_quote(ARTICLE)} IS NOT NULL GROUP BY ALL"
+    ).df()
+    if pairs["kind"].isna().any() and UNSPECIFIED_LOGISTICS not in names:
+        names.append(UNSPECIFIED_LOGISTICS)
+    pairs["kind"] = pairs["kind"].fillna(UNSPECIFIED_LOGISTICS)
+    matrix = (
+        pairs.groupby(["article", "kind"])["n"]
+        .sum()
+        .unstack(fill_value=0)
+        .reindex(index=articles, columns=names, fill_value=0)
+    )
+    for kind in names:
+        data[("logistics", kind)] = matrix[kind].to_numpy(dtype="int64")
+
+    partial = pd.DataFrame(data, index=articles)
+    partial.columns = pd.MultiIndex.from_tuples(partial.columns)
+    return partial.sort_index()
+
+
+def _aggregate_payments(connection, df):
+    query = (
+        f"SELECT CAST({_quote(PAYMENT_REASON)} AS VARCHAR) AS reason, "
+        + ", ".join(
+            f"coalesce(fsum(CAST({_quote(c)} AS DOUBLE)), 0) AS c{i}"
+            for i, c in enumerate(PAYMENT_COLUMNS)
+        )
+        + f" FROM report WHERE {_quote(PAYMENT_REASON)} IS NOT NULL GROUP BY ALL"
+    )
+    result = connection.execute(query).df().set_index("reason")
+    result.columns = list(PAYMENT_COLUMNS)
+    # Порядок строк — как у кодов категорий в aggregate_report
+    order = key_values(df[PAYMENT_REASON])
+    payments = result.reindex(order[order.isin(result.index)])
+    payments.index.name = PAYMENT_REASON
+    return payments.astype("float64")
+
+
+def _aggregate_cube(connection, df):
+    if SALE_DATE not in df.columns:
+        return None
+    kind = f"CAST({_quote(DOCUMENT_TYPE)} AS VARCHAR)"
+    query = (
+        f"SELECT CAST({_quote(ARTICLE)} AS VARCHAR) AS article, "
+        f"{_quote(SALE_DATE)} AS day, "
+        f"coalesce({kind}, {_literal(UNSPECIFIED_DOCUMENT)}) AS kind, "
+        "count(*) AS n, "
+        + ", ".join(
+            f"fsum(CAST({_quote(c)} AS DOUBLE)) AS c{i}"
+            for i, c in enumerate(CUBE_COLUMNS)
+        )
+        + f" FROM report WHERE {_quote(ARTICLE)} IS NOT NULL"
+        f" AND {_quote(SALE_DATE)} IS NOT NULL GROUP BY ALL"
+    )
+    result = connection.execute(query).df()
+    data = {ROWS: result["n"].to_numpy(dtype="int64")}
+    for i, column in enumerate(CUBE_COLUMNS):
+        data[column] = result[f"c{i}"].fillna(0.0).to_numpy(dtype="float64")
+    index = pd.MultiIndex.from_arrays(
+        [
+            pd.Index(result["article"].astype(str)),
+            pd.Index(result["day"].astype(df[SALE_DATE].dtype)),
+            pd.Index(result["kind"].astype(str)),
+        ],
+        names=[ARTICLE, SALE_DATE, DOCUMENT_TYPE],
+    )
+    return pd.DataFrame(data, index=index).sort_index()
+
+
+def aggregate_report_duckdb(df, connection=None):
+    """Частичные агрегаты отчёта, посчитанные в DuckDB (см. aggregate_report)."""
+    own = connection is None
+    if own:
+        connection = connect()
+    try:
+        connection.register("report", df)
+        try:
+            return ReportPartials(
+                _aggregate_articles(connection, df),
+                _aggregate_payments(connection, df),
+                _aggregate_cube(connection, df),
+            )
+        finally:
+            connection.unregister("report")
+    finally:
+        if own:
+            connection.close()
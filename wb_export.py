@@ -0,0 +1,131 @@
+"""Выгрузка итоговых таблиц: Excel (потоковая запись), CSV, Parquet и JSON.
+
+Форматы регистрируются в EXPORT_FORMATS; каждый формат — функция, которая
+получает пары (имя листа, таблица) и пишет файл в переданный поток.
+"""
+
+import json
+import zipfile
+from collections import namedtuple
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+ExportFormat = namedtuple("ExportFormat", ["label", "writer", "extension", "mime"])
+
+EXPORT_FORMATS = {}
+
+# Сколько строк таблицы переводится в значения Python за раз при записи xlsx:
+# в памяти — только эта пачка, а не вся таблица
+XLSX_CHUNK_ROWS = 10_000
+
+
+def register_format(name, label, extension, mime):
+    """Декоратор: регистрирует функцию записи таблиц в формате name."""
+
+    def decorator(writer):
+        EXPORT_FORMATS[name] = ExportFormat(label, writer, extension, mime)
+        return writer
+
+    return decorator
+
+
+def _cell_values(series):
+    # Значения в обычных типах Python; пропуски — пустые ячейки, а
+    # бесконечности — строки "inf"/"-inf", как при записи через pandas
+    if series.dtype.kind == "f":
+        values = series.to_numpy()
+        cells = values.astype(object)
+        cells[np.isnan(values)] = None
+        cells[np.isposinf(values)] = "inf"
+        cells[np.isneginf(values)] = "-inf"
+        return cells.tolist()
+    if series.dtype.kind in "iub":
+        return series.tolist()
+    return [None if pd.isna(v) else v for v in series.astype(object).tolist()]
+
+
+def _write_xlsx_openpyxl(named_tables, output):
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        for sheet_name, table in named_tables:
+            table.to_excel(writer, sheet_name=sheet_name, index=False)
+
+
+@register_format(
+    "xlsx",
+    "Excel (.xlsx)",
+    "xlsx",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+)
+def write_xlsx(named_tables, output):
+    """Пишет листы построчно через xlsxwriter в режиме constant_memory."""
+    try:
+        import xlsxwriter
+    except ImportError:
+        # Без xlsxwriter — прежняя запись через openpyxl
+        return _write_xlsx_openpyxl(named_tables, output)
+
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+    header = workbook.add_format({"bold": True, "border": 1, "align": "center"})
+    for sheet_name, table in named_tables:
+        sheet = workbook.add_worksheet(sheet_name)
+        sheet.write_row(0, 0, [str(c) for c in table.columns], header)
+        for start in range(0, len(table), XLSX_CHUNK_ROWS):
+            chunk = table.iloc[start : start + XLSX_CHUNK_ROWS]
+            columns = [_cell_values(chunk[c]) for c in chunk.columns]
+            for row, values in enumerate(zip(*columns), start=start + 1):
+                sheet.write_row(row, 0, values)
+    workbook.close()
+
+
+@register_format("csv", "CSV (zip)", "zip", "application/zip")
+def write_csv(named_tables, output):
+    """Пишет ZIP-архив с CSV на каждую таблицу (UTF-8 с BOM — для Excel)."""
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+        for sheet_name, table in named_tables:
+            archive.writestr(
+                f"{sheet_name}.csv",
+                table.to_csv(index=False).encode("utf-8-sig"),
+            )
+
+
+@register_format("parquet", "Parquet (zip)", "zip", "application/zip")
+def write_parquet(named_tables, output):
+    """Пишет ZIP-архив с Parquet-файлом на каждую таблицу."""
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as archive:
+        for sheet_name, table in named_tables:
+            buffer = BytesIO()
+            # Категориальный артикул сохраняем строкой — так проще читать другим
+            table.astype(
+                {c: str for c in table.columns if table[c].dtype == "category"}
+            ).to_parquet(buffer, index=False)
+            archive.writestr(f"{sheet_name}.parquet", buffer.getvalue())
+
+
+@register_format("json", "JSON", "json", "application/json")
+def write_json(named_tables, output):
+    """Пишет объект JSON {имя листа: [строки таблицы]} в UTF-8."""
+    output.write(b"{")
+    for i, (sheet_name, table) in enumerate(named_tables):
+        if i:
+            output.write(b",")
+        output.write(json.dumps(sheet_name, ensure_ascii=False).encode("utf-8"))
+        output.write(b":")
+        output.write(
+            table.to_json(orient="records", force_ascii=False).encode("utf-8")
+        )
+    output.write(b"}")
+
+
+def export_tables(named_tables, fmt="xlsx"):
+    """Возвращает байты файла с таблицами в формате fmt (см. EXPORT_FORMATS)."""
+    output = BytesIO()
+    EXPORT_FORMATS[fmt].writer(list(named_tables), output)
+    return output.getvalue()
+
+
+def export_file(named_tables, fmt, path):
+    """Пишет файл с таблицами в формате fmt сразу на диск, без копии в памяти."""
+    with open(path, "wb") as output:
+        EXPORT_FORMATS[fmt].writer(list(named_tables), output)
@@ -0,0 +1,139 @@
+"""Группы артикулов по правилам: коллекции, ткани, размеры и т. п.
+
+Правило — пара «группа, шаблон»: артикул входит в группу, если в его названии
+есть совпадение с регулярным выражением шаблона (без учёта регистра).
+Несколько правил одной группы объединяются через «или». Встроенное правило
+одно — «Софт» (прежняя таблица «Soft_Summary»); свои правила читаются из
+таблицы xlsx/xls с колонками «Группа» и «Шаблон» (read_group_rules) — файла
+из переменной окружения WB_GROUPS или параметра --groups в wb_cli.
+
+Шаблоны компилируются один раз, по одному выражению на группу, и проверяются
+только на уникальных артикулах, а не на строках отчёта: результат —
+булева матрица «артикул × группа» (group_membership). Для строк или ячеек
+куба принадлежность берётся по кодам артикулов — membership[codes], — так
+что и десятки правил почти ничего не стоят.
+"""
+
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from wb_aggregate import SOFT_PATTERN, group_summary
+from wb_ingest import CATEGORY, read_report
+
+GROUP = "Группа"
+PATTERN = "Шаблон"
+GROUPS_SCHEMA = {GROUP: CATEGORY, PATTERN: CATEGORY}
+
+GroupRule = namedtuple("GroupRule", ["group", "pattern"])
+
+SOFT = "Софт"
+DEFAULT_RULES = (GroupRule(SOFT, SOFT_PATTERN),)
+
+# Листы итогового файла: у «Софт» — прежнее имя, у остальных — «<группа>_Summary»
+GROUP_SHEETS = {SOFT: "Soft_Summary"}
+SHEET_SUFFIX = "_Summary"
+# Ограничения Excel на имя листа
+MAX_SHEET_NAME = 31
+_SHEET_FORBIDDEN = re.compile(r"[\[\]:*?/\\]")
+
+# Файл своих правил для интерфейса и сервиса (дополняют встроенные)
+GROUPS_FILE = os.environ.get("WB_GROUPS", "")
+
+
+def read_group_rules(source):
+    """Правила групп из таблицы xlsx/xls с колонками «Группа» и «Шаблон».
+
+    Строки без группы или шаблона пропускаются. Неверное регулярное
+    выражение — ValueError с названием группы.
+    """
+    df = read_report(source, GROUPS_SCHEMA).dropna()
+    rules = tuple(
+        GroupRule(str(group).strip(), str(pattern))
+        for group, pattern in zip(df[GROUP], df[PATTERN])
+    )
+    compile_rules(rules)
+    return rules
+
+
+@lru_cache(maxsize=None)
+def default_rules(path=GROUPS_FILE):
+    """Встроенные правила и правила из файла path (если он задан)."""
+    if not path:
+        return DEFAULT_RULES
+    return DEFAULT_RULES + read_group_rules(path)
+
+
+def compile_rules(rules):
+    """Словарь {группа: скомпилированное выражение} в порядке первого правила.
+
+    Шаблоны одной группы объединяются в одно выражение, так что каждая
+    группа проверяется одним проходом по артикулам.
+    """
+    patterns = {}
+    for rule in rules:
+        try:
+            re.compile(rule.pattern)
+        except re.error as e:
+            raise ValueError(
+                f"Неверный шаблон «{rule.pattern}» группы «{rule.group}»: {e}"
+            ) from None
+        patterns.setdefault(rule.group, []).append(f"(?:{rule.pattern})")
+    return {
+        group: re.compile("|".join(parts), re.IGNORECASE)
+        for group, parts in patterns.items()
+    }
+
+
+def group_membership(articles, rules=DEFAULT_RULES):
+    """Матрица «артикул × группа» для уникальных артикулов articles.
+
+    Возвращает DataFrame из bool с колонками-группами в порядке правил и
+    индексом articles. Пропуск вместо артикула не входит ни в одну группу.
+    """
+    articles = pd.Index(articles)
+    compiled = compile_rules(rules)
+    present = np.asarray(articles.notna())
+    # Названия — строки Python один раз на все группы
+    names = [str(name) for name in articles[present]]
+    matrix = np.zeros((len(articles), len(compiled)), dtype=bool)
+    for j, regex in enumerate(compiled.values()):
+        search = regex.search
+        matrix[present, j] = [search(name) is not None for name in names]
+    return pd.DataFrame(matrix, index=articles, columns=list(compiled))
+
+
+def sheet_name(group, used=()):
+    """Имя листа итогового файла для группы: до 31 символа и не из used."""
+    if group in GROUP_SHEETS:
+        name = GROUP_SHEETS[group]
+    else:
+        name = _SHEET_FORBIDDEN.sub("_", group).strip("'")
+        name = name[: MAX_SHEET_NAME - len(SHEET_SUFFIX)] + SHEET_SUFFIX
+    # Имена листов в Excel не различают регистр
+    taken = {u.lower() for u in used}
+    unique, number = name, 1
+    while unique.lower() in taken:
+        number += 1
+        unique = f"{name[: MAX_SHEET_NAME - len(str(number)) - 1]}_{number}"
+    return unique
+
+
+def group_tables(articles, rules=DEFAULT_RULES, reserved=(), means=None):
+    """Таблицы групп {имя листа: таблица} по агрегатам уникальных артикулов.
+
+    reserved — имена листов, которые уже заняты другими таблицами файла,
+    means — средние по артикулам (wb_aggregate.article_means).
+    """
+    membership = group_membership(articles.index, rules)
+    tables, used = {}, list(reserved)
+    for group in membership.columns:
+        name = sheet_name(group, used)
+        used.append(name)
+        mask = membership[group].to_numpy()
+        tables[name] = group_summary(articles, mask, group, means)
+    return tables
@@ -0,0 +1,815 @@
+"""Чтение детализированных отчётов Wildberries.
+
+Из ~80 колонок отчёта обработке нужен десяток, поэтому лист читается
+потоково (openpyxl read-only), из каждой строки берутся только колонки
+схемы, а типизированный DataFrame собирается из пачек строк. После чтения
+compact_report сужает типы колонок без потери точности.
+
+Перед полным разбором validate_report проверяет заголовок и первые строки:
+у xlsx они берутся прямо из XML листа, без загрузки всей книги, так что
+файл не того отчёта отклоняется за миллисекунды.
+
+Отчёты можно передавать и zip-архивами (так их выдаёт Wildberries):
+expand_archives заменяет архив его файлами, которые распаковываются в
+память, без записи на диск.
+
+Файлы на диске читаются через mmap: данные берутся из страничного кэша ОС и
+не копируются в память процесса. Большие загрузки spool_upload сбрасывает
+во временный файл, чтобы в процессы пула передавался путь, а не байты.
+"""
+
+import mmap
+import os
+import posixpath
+import tempfile
+import zipfile
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager
+from io import BytesIO
+from operator import itemgetter
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_string_dtype, union_categoricals
+
+from wb_cache import PARSED_CACHE, content_hash
+
+# Схема: колонки отчёта, на которые опирается обработка, и их типы
+CATEGORY = "category"
+FLOAT = "float64"
+DATE = "datetime64[ns]"
+# Идентификатор строки хранится 64-битным хэшем значения (0 — пустая ячейка):
+# он нужен только для сравнения строк (см. wb_dedup), а не как текст
+HASH = "uint64"
+
+REPORT_SCHEMA = {
+    "Артикул поставщика": CATEGORY,
+    "Тип документа": CATEGORY,
+    "Обоснование для оплаты": CATEGORY,
+    "Виды логистики, штрафов и доплат": CATEGORY,
+    "Цена розничная": FLOAT,
+    "Вайлдберриз реализовал Товар (Пр)": FLOAT,
+    "К перечислению Продавцу за реализованный Товар": FLOAT,
+    "Услуги по доставке товара покупателю": FLOAT,
+    "Общая сумма штрафов": FLOAT,
+    "Хранение": FLOAT,
+    "Удержания": FLOAT,
+    "Платная приемка": FLOAT,
+    "Дата продажи": DATE,
+    "Srid": HASH,
+    "Баркод": CATEGORY,
+}
+
+# Колонки схемы, без которых отчёт всё равно обрабатывается: без даты
+# продажи нет только разбивки по периодам (wb_cube), без Srid и баркода —
+# поиска повторов между файлами (wb_dedup)
+OPTIONAL_COLUMNS = frozenset({"Дата продажи", "Srid", "Баркод"})
+
+# Таблица себестоимости по артикулам (см. read_article_costs)
+COST = "Себестоимость"
+COSTS_SCHEMA = {"Артикул поставщика": CATEGORY, COST: FLOAT}
+
+# Сколько строк листа копится перед преобразованием в колонки
+BATCH_SIZE = 50_000
+
+# Сколько первых строк данных проверяет validate_report
+SAMPLE_ROWS = 20
+# Пространства имён XML книги xlsx
+_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_RELATIONSHIP = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PACKAGE = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# Файлы отчётов внутри zip-архива; остальные файлы архива пропускаются
+REPORT_EXTENSIONS = (".xlsx", ".xls")
+# Этот файл есть в каждом xlsx: так xlsx отличается от архива с отчётами
+_XLSX_MARKER = "[Content_Types].xml"
+
+# Загрузки от WB_SPOOL_MB мегабайт сбрасываются во временный файл в WB_SPOOL_DIR
+SPOOL_MB = float(os.environ.get("WB_SPOOL_MB", "16"))
+SPOOL_DIR = os.environ.get(
+    "WB_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "wb_spool")
+)
+
+
+def _is_xlsx(source):
+    # xlsx — это zip-архив; старый .xls openpyxl не читает
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source[:2]) == b"PK"
+    if hasattr(source, "read"):
+        position = source.tell()
+        magic = source.read(2)
+        source.seek(position)
+        return magic == b"PK"
+    with open(source, "rb") as f:
+        return f.read(2) == b"PK"
+
+
+def _to_key(value):
+    return None if pd.isna(value) else str(value)
+
+
+def _to_category(values):
+    # Ключи приводим к строкам: числовой артикул не должен ломать сортировку
+    return pd.Categorical(
+        [v if v is None or isinstance(v, str) else _to_key(v) for v in values]
+    )
+
+
+def _to_float(values):
+    try:
+        return np.array(values, dtype=FLOAT)
+    except (TypeError, ValueError):
+        # В ячейке оказался текст — как и Excel, считаем его пустым
+        return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(
+            dtype=FLOAT
+        )
+
+
+def _to_date(values):
+    # Дата бывает ячейкой Excel (datetime) или строкой «2024-01-31» либо
+    # «31.01.2024»; время продажи отбрасываем — куб считается по дням
+    values = pd.Series(values, dtype=object)
+    dates = pd.to_datetime(values, errors="coerce", format="ISO8601")
+    retry = dates.isna() & values.notna()
+    if retry.any():
+        dates[retry] = pd.to_datetime(
+            values[retry].astype(str), errors="coerce", dayfirst=True, format="mixed"
+        )
+    return dates.dt.normalize().to_numpy(dtype=DATE)
+
+
+def _to_hash(values):
+    # Значения хэшируются как строки (число 123 и текст «123» совпадают)
+    values = np.asarray(values, dtype=object)
+    hashes = pd.util.hash_array(values, categorize=False)
+    hashes[pd.isna(values)] = 0
+    return hashes
+
+
+def _convert(values, dtype):
+    if dtype == CATEGORY:
+        return _to_category(values)
+    if dtype == DATE:
+        return _to_date(values)
+    if dtype == HASH:
+        return _to_hash(values)
+    return _to_float(values)
+
+
+def _batch_to_frame(batch, columns, schema):
+    data = {}
+    # Пустой лист: zip(*[]) ничего не даёт, а колонки всё равно нужны типизированными
+    for name, values in zip(columns, list(zip(*batch)) or [()] * len(columns)):
+        data[name] = _convert(values, schema[name])
+    return pd.DataFrame(data, columns=columns)
+
+
+def _missing_columns_error(missing):
+    return ValueError(
+        "В отчёте нет обязательных колонок: " + ", ".join(f"«{c}»" for c in missing)
+    )
+
+
+def schema_columns(schema, available):
+    """Колонки схемы, которые есть среди available; без обязательной — ошибка."""
+    available = set(available)
+    missing = [c for c in schema if c not in available and c not in OPTIONAL_COLUMNS]
+    if missing:
+        raise _missing_columns_error(missing)
+    return [c for c in schema if c in available]
+
+
+def has_schema(df, schema=REPORT_SCHEMA):
+    """Колонки таблицы — колонки схемы (без части необязательных) в её порядке."""
+    try:
+        return list(df.columns) == schema_columns(schema, df.columns)
+    except ValueError:
+        return False
+
+
+def iter_report_batches(source, schema=REPORT_SCHEMA, batch_size=BATCH_SIZE):
+    """Потоково читает первый лист xlsx и отдаёт типизированные пачки строк."""
+    # openpyxl импортируется при первом чтении: библиотека без него грузится быстрее
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        # Размеры листа в отчётах WB бывают записаны неверно
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, ())
+
+        positions = {}
+        for i, name in enumerate(header):
+            if isinstance(name, str) and name not in positions:
+                positions[name] = i
+        columns = schema_columns(schema, positions)
+        indices = [positions[c] for c in columns]
+        width = max(indices) + 1
+        pick = itemgetter(*indices)
+        padding = (None,) * width
+
+        batch = []
+        for row in rows:
+            if len(row) < width:
+                row = row + padding
+            batch.append(pick(row))
+            if len(batch) >= batch_size:
+                yield _batch_to_frame(batch, columns, schema)
+                batch = []
+        if batch:
+            yield _batch_to_frame(batch, columns, schema)
+    finally:
+        workbook.close()
+
+
+def apply_schema(df, schema=REPORT_SCHEMA):
+    """Оставляет колонки схемы и приводит их к объявленным типам."""
+    columns = schema_columns(schema, df.columns)
+    data = {}
+    for name in columns:
+        dtype = schema[name]
+        if dtype == CATEGORY:
+            data[name] = _to_category(df[name].astype(object))
+        elif dtype == DATE:
+            data[name] = _to_date(df[name])
+        elif dtype == HASH:
+            data[name] = _to_hash(df[name])
+        else:
+            data[name] = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=dtype)
+    return pd.DataFrame(data, columns=columns)
+
+
+# По стольким первым значениям колонки быстро отсекаются неподходящие типы
+_SAMPLE = 1024
+# Знаковые типы: беззнаковые опасны при вычитаниях в итоговых таблицах
+_INTEGER_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+def _is_integral(values):
+    return np.array_equal(values, np.trunc(values))
+
+
+def _is_float32(values):
+    return np.array_equal(values.astype(np.float32), values, equal_nan=True)
+
+
+def _downcast_float(values):
+    sample = values[:_SAMPLE]
+    if _is_integral(sample) and _is_integral(values):
+        # Суммы в целых рублях (без пропусков) — в самый узкий целый тип
+        if not len(values):
+            return values
+        low, high = values.min(), values.max()
+        for dtype in _INTEGER_TYPES:
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                return values.astype(dtype)
+    if _is_float32(sample) and _is_float32(values):
+        return values.astype(np.float32)
+    # Копейки в float32 не помещаются точно — оставляем float64
+    return values
+
+
+def compact_report(df, max_category_share=0.5):
+    """Сужает типы колонок отчёта без потери точности.
+
+    Строковые колонки, где различных значений не больше max_category_share от
+    числа строк, становятся категориальными. Дробные колонки переводятся в
+    целый тип, если все значения целые, или во float32, если обратное
+    преобразование во float64 даёт те же числа; иначе остаются float64.
+    Агрегация всё равно считает суммы во float64 — результат не меняется.
+    """
+    # Меняются только сужаемые колонки, остальные не копируются
+    compact = df.copy(deep=False)
+    for name in df.columns:
+        column = df[name]
+        if column.dtype.kind == "f":
+            values = column.to_numpy()
+            narrow = _downcast_float(values)
+            if narrow is not values:
+                compact[name] = narrow
+        elif column.dtype.kind == "i":
+            # Беззнаковые колонки — хэши (HASH): сужать в них нечего
+            narrow = pd.to_numeric(column, downcast="integer")
+            if narrow.dtype != column.dtype:
+                compact[name] = narrow
+        elif (
+            not isinstance(column.dtype, pd.CategoricalDtype)
+            and is_string_dtype(column.dtype)
+            and column.nunique() <= len(column) * max_category_share
+        ):
+            compact[name] = _to_category(column.astype(object))
+    return compact
+
+
+def concat_reports(frames, schema=REPORT_SCHEMA):
+    """Склеивает отчёты, сохраняя категориальные колонки (объединяет категории)."""
+    frames = list(frames)
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    columns = {}
+    for name in frames[0].columns:
+        if schema.get(name) == CATEGORY:
+            columns[name] = pd.Categorical(
+                union_categoricals([f[name] for f in frames], sort_categories=True)
+            )
+        else:
+            columns[name] = np.concatenate([f[name].to_numpy() for f in frames])
+    return pd.DataFrame(columns, columns=frames[0].columns)
+
+
+def read_report(source, schema=REPORT_SCHEMA, batch_size=BATCH_SIZE):
+    """Читает отчёт WB в типизированный DataFrame только с колонками схемы."""
+    if not _is_xlsx(source):
+        # .xls и прочие форматы — через pandas, но тоже только нужные колонки
+        df = pd.read_excel(source, usecols=lambda c: c in schema)
+        return apply_schema(df, schema)
+
+    batches = list(iter_report_batches(source, schema, batch_size))
+    if not batches:
+        return _batch_to_frame([], list(schema), schema)
+    return concat_reports(batches, schema)
+
+
+def _part_path(archive, rels_path, rel_id=None, rel_type=None):
+    # Путь части книги по связи из файла .rels (по Id или по типу связи)
+    rels = ElementTree.fromstring(archive.read(rels_path))
+    for rel in rels.iter(f"{_PACKAGE}Relationship"):
+        if rel.get("Id") == rel_id or rel.get("Type", "").endswith(f"/{rel_type}"):
+            target = rel.get("Target")
+            if target.startswith("/"):
+                return target[1:]
+            base = posixpath.dirname(posixpath.dirname(rels_path))
+            return posixpath.normpath(posixpath.join(base, target))
+    return None
+
+
+def _column_index(reference):
+    # «AB12» -> 27
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord("A") + 1
+    return index - 1
+
+
+class _SharedString(int):
+    """Индекс строки в общей таблице строк книги."""
+
+
+def _cell_value(cell):
+    # Общие строки (t="s") остаются индексами: их разрешает _shared_strings
+    kind = cell.get("t", "n")
+    if kind == "inlineStr":
+        return "".join(t.text or "" for t in cell.iter(f"{_MAIN}t"))
+    value = cell.findtext(f"{_MAIN}v")
+    if value is None or kind == "e":
+        return None
+    if kind == "s":
+        return _SharedString(int(value))
+    if kind in ("str", "d"):
+        return value
+    if kind == "b":
+        return value == "1"
+    return float(value)
+
+
+def _shared_strings(archive, path, needed):
+    # Общая таблица читается только до последней нужной строки
+    strings = {}
+    if not needed or path is None:
+        return strings
+    last = max(needed)
+    index = 0
+    with archive.open(path) as f:
+        for _, element in ElementTree.iterparse(f):
+            if element.tag != f"{_MAIN}si":
+                continue
+            if index in needed:
+                text = element.findtext(f"{_MAIN}t")
+                if text is None:
+                    # Форматированный текст: куски в <r><t>, без фонетики <rPh>
+                    text = "".join(
+                        r.findtext(f"{_MAIN}t") or "" for r in element.iter(f"{_MAIN}r")
+                    )
+                strings[index] = text
+            element.clear()
+            if index >= last:
+                break
+            index += 1
+    return strings
+
+
+def _xlsx_head(source, rows):
+    with zipfile.ZipFile(source) as archive:
+        workbook = _part_path(archive, "_rels/.rels", rel_type="officeDocument")
+        if workbook is None:
+            raise ValueError("в архиве нет книги Excel")
+        rels = posixpath.join(
+            posixpath.dirname(workbook), "_rels", posixpath.basename(workbook) + ".rels"
+        )
+        # Первый лист книги — как workbook.worksheets[0] в openpyxl
+        sheet = ElementTree.fromstring(archive.read(workbook)).find(
+            f"{_MAIN}sheets/{_MAIN}sheet"
+        )
+        if sheet is None:
+            raise ValueError("в книге нет листов")
+        sheet_path = _part_path(archive, rels, rel_id=sheet.get(f"{_RELATIONSHIP}id"))
+        strings_path = _part_path(archive, rels, rel_type="sharedStrings")
+
+        head = []
+        with archive.open(sheet_path) as f:
+            for _, element in ElementTree.iterparse(f):
+                if element.tag != f"{_MAIN}row":
+                    continue
+                # Пропущенные в XML пустые строки — пустые и здесь, как в openpyxl
+                number = int(element.get("r") or len(head) + 1)
+                head.extend([] for _ in range(number - 1 - len(head)))
+                values = {}
+                for position, cell in enumerate(element.iter(f"{_MAIN}c")):
+                    reference = cell.get("r")
+                    column = _column_index(reference) if reference else position
+                    values[column] = _cell_value(cell)
+                width = max(values, default=-1) + 1
+                head.append([values.get(i) for i in range(width)])
+                element.clear()
+                if len(head) > rows:
+                    break
+        needed = {v for row in head for v in row if isinstance(v, _SharedString)}
+        strings = _shared_strings(archive, strings_path, needed)
+    return [
+        [strings.get(v) if isinstance(v, _SharedString) else v for v in row]
+        for row in head
+    ]
+
+
+def read_head(source, rows=SAMPLE_ROWS):
+    """Строка заголовка и первые rows строк первого листа отчёта (списки значений).
+
+    У xlsx читается только начало XML листа и нужные строки общей таблицы
+    строк; даты остаются числами Excel. Старый .xls — через pd.read_excel.
+    Отчёт из архива (ArchiveMember) читается потоком, без распаковки в память.
+    Не книга Excel или обрезанный файл — ValueError.
+    """
+    with ExitStack() as stack:
+        if isinstance(source, ArchiveMember):
+            archive = stack.enter_context(zipfile.ZipFile(source.archive))
+            source = stack.enter_context(archive.open(source.name))
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = BytesIO(source)
+        # Чужой файловый объект возвращаем на прежнюю позицию
+        position = source.tell() if hasattr(source, "read") else None
+        try:
+            head = _read_head(source, rows)
+        finally:
+            if position is not None:
+                source.seek(position)
+    return (head[0], head[1:]) if head else ([], [])
+
+
+def _read_head(source, rows):
+    if _is_xlsx(source):
+        try:
+            return _xlsx_head(source, rows)
+        except (KeyError, ElementTree.ParseError) as e:
+            raise ValueError(f"Не удалось прочитать лист xlsx: {e}") from None
+        except zipfile.BadZipFile:
+            raise ValueError(
+                "Файл повреждён или обрезан: это не целая книга xlsx"
+            ) from None
+    try:
+        df = pd.read_excel(source, header=None, nrows=rows + 1)
+    except ValueError:
+        # pandas не узнал формат: не .xlsx и не .xls
+        raise ValueError(
+            "Файл не похож на отчёт: это не книга Excel (.xlsx или .xls)"
+        ) from None
+    return df.astype(object).where(df.notna(), None).values.tolist()
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+
+
+def _sample_errors(name, dtype, values):
+    # Описание ошибки, если ни одно непустое значение не подходит под тип
+    values = [v for v in values if v is not None and v != ""]
+    if not values or dtype not in (FLOAT, DATE):
+        return None
+    if dtype == FLOAT:
+        converted = _to_float(values)
+        valid = ~np.isnan(converted)
+        expected = "числа"
+    else:
+        # Дата в xlsx — число (дни Excel) или строка
+        converted = _to_date([v if not _is_number(v) else None for v in values])
+        valid = ~np.isnat(converted)
+        valid |= np.array([_is_number(v) for v in values])
+        expected = "даты"
+    if valid.any():
+        return None
+    shown = ", ".join(f"«{v}»" for v in values[:3])
+    return f"в колонке «{name}» ожидаются {expected}, а в первых строках — {shown}"
+
+
+def validate_report(source, schema=REPORT_SCHEMA, sample_rows=SAMPLE_ROWS):
+    """Проверяет заголовок и первые строки отчёта до полного разбора.
+
+    Читаются только строка заголовка и sample_rows строк данных (read_head),
+    так что не тот файл отклоняется за миллисекунды, а не после разбора всей
+    книги. ValueError — если нет обязательных колонок схемы (перечисляются
+    все) или в числовой колонке либо колонке даты ни одно из первых непустых
+    значений не подходит под тип. Возвращает колонки схемы, которые есть в
+    отчёте.
+    """
+    header, rows = read_head(source, sample_rows)
+    positions = {}
+    for i, name in enumerate(header):
+        if isinstance(name, str) and name not in positions:
+            positions[name] = i
+    columns = schema_columns(schema, positions)
+    errors = []
+    for name in columns:
+        i = positions[name]
+        values = [row[i] if i < len(row) else None for row in rows]
+        error = _sample_errors(name, schema[name], values)
+        if error:
+            errors.append(error)
+    if errors:
+        raise ValueError("Файл не похож на отчёт: " + "; ".join(errors))
+    return columns
+
+
+class ArchiveMember(namedtuple("ArchiveMember", ["archive", "name"])):
+    """Отчёт name внутри zip-архива на диске (archive — путь к архиву).
+
+    В пул процессов уходит только путь и имя: файл распаковывается в памяти
+    того процесса, который его разбирает (см. read_member).
+    """
+
+    __slots__ = ()
+
+    def __str__(self):
+        return f"{self.archive}:{self.name}"
+
+
+def _zip_names(source):
+    # Имена файлов zip-архива или None, если source — не zip
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = BytesIO(source)
+    elif isinstance(source, (str, os.PathLike)):
+        if not os.path.isfile(source):
+            return None
+        with open(source, "rb") as f:
+            return _zip_names(f)
+    elif not hasattr(source, "read"):
+        # Например, ArchiveMember: отчёт, уже взятый из архива
+        return None
+    position = source.tell()
+    try:
+        if not zipfile.is_zipfile(source):
+            return None
+        with zipfile.ZipFile(source) as archive:
+            return archive.namelist()
+    finally:
+        source.seek(position)
+
+
+def _is_report_name(name):
+    base = name.rsplit("/", 1)[-1]
+    return (
+        name.lower().endswith(REPORT_EXTENSIONS)
+        # Временные файлы Excel и служебный каталог архиватора macOS
+        and not base.startswith("~$")
+        and not name.startswith("__MACOSX/")
+    )
+
+
+def archive_members(source):
+    """Имена отчётов (.xlsx/.xls) в zip-архиве или None, если это не архив отчётов.
+
+    xlsx тоже zip-архив, но архивом отчётов не считается.
+    """
+    names = _zip_names(source)
+    if names is None or _XLSX_MARKER in names:
+        return None
+    members = sorted(n for n in names if _is_report_name(n))
+    if not members:
+        raise ValueError("В zip-архиве нет файлов отчётов .xlsx/.xls")
+    return members
+
+
+def read_member(member):
+    """Распаковывает отчёт из архива в память и возвращает его байты."""
+    with zipfile.ZipFile(member.archive) as archive:
+        return archive.read(member.name)
+
+
+def _unzip(source, members):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = BytesIO(source)
+    with zipfile.ZipFile(source) as archive:
+        return [archive.read(name) for name in members]
+
+
+def expand_archives(sources):
+    """Заменяет zip-архивы отчётов их файлами; остальные источники — как есть.
+
+    Архив на диске даёт ArchiveMember на каждый отчёт, архив в байтах или
+    файловом объекте — байты отчётов, распакованные в памяти.
+    """
+    expanded = []
+    for source in sources:
+        members = archive_members(source)
+        if members is None:
+            expanded.append(source)
+        elif isinstance(source, (str, os.PathLike)):
+            expanded.extend(ArchiveMember(source, name) for name in members)
+        else:
+            expanded.extend(_unzip(source, members))
+    return expanded
+
+
+def source_size(source):
+    """Размер отчёта в байтах: путь, байты, файловый объект или ArchiveMember."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    if isinstance(source, ArchiveMember):
+        with zipfile.ZipFile(source.archive) as archive:
+            return archive.getinfo(source.name).file_size
+    if hasattr(source, "seek"):
+        position = source.tell()
+        size = source.seek(0, 2)
+        source.seek(position)
+        return size
+    return os.path.getsize(source)
+
+
+class _MappedFile(mmap.mmap):
+    # zipfile (а через него openpyxl) вызывает seekable(), которого у mmap
+    # до Python 3.13 нет
+    def seekable(self):
+        return True
+
+
+@contextmanager
+def map_file(path):
+    """Открывает файл только для чтения через mmap (пустой — обычным файлом)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # Пустой файл отобразить нельзя
+            yield f
+            return
+        mapped = _MappedFile(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+
+
+@contextmanager
+def open_report(source):
+    """Открывает отчёт (путь, байты или файл) как файловый объект."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield BytesIO(source)
+    elif hasattr(source, "read"):
+        # Чужой файловый объект не закрываем
+        yield source
+    else:
+        with map_file(source) as f:
+            yield f
+
+
+def spool_upload(data, threshold_mb=SPOOL_MB, directory=SPOOL_DIR):
+    """Большую загрузку (байты или memoryview) — во временный файл.
+
+    Возвращает путь к файлу, если данных не меньше threshold_mb мегабайт
+    (файл удаляет вызывающий), иначе — байты. Дальше файл читается через mmap,
+    а в процессы пула уходит только путь.
+    """
+    if len(data) < threshold_mb * 1024 * 1024:
+        return data if isinstance(data, bytes) else bytes(data)
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=directory, suffix=".upload")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def iter_report_chunks(source, schema=REPORT_SCHEMA, chunk_rows=BATCH_SIZE):
+    """Отдаёт отчёт типизированными пачками по chunk_rows строк.
+
+    xlsx читается потоково, и в памяти одновременно лежит только одна пачка.
+    Старый .xls openpyxl не читает: он загружается целиком (в .xls всё равно
+    не больше 65 536 строк) и отдаётся теми же пачками.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = BytesIO(source)
+    if _is_xlsx(source):
+        chunks = iter_report_batches(source, schema, chunk_rows)
+    else:
+        df = read_report(source, schema)
+        chunks = (df.iloc[i : i + chunk_rows] for i in range(0, len(df), chunk_rows))
+    empty = True
+    for chunk in chunks:
+        empty = False
+        yield chunk
+    if empty:
+        # Отчёт без строк — одна пустая пачка, чтобы агрегаты всё равно были
+        yield _batch_to_frame([], list(schema), schema)
+
+
+def _mapped_bytes(handle):
+    # Содержимое открытого отчёта (open_report) без копии: mmap или буфер
+    # BytesIO; None — у обычного файла (пустой файл на диске)
+    if isinstance(handle, mmap.mmap):
+        return handle
+    if isinstance(handle, BytesIO):
+        return handle.getbuffer()
+    return None
+
+
+def iter_report_chunks_cached(
+    handle, schema=REPORT_SCHEMA, chunk_rows=BATCH_SIZE, cache=PARSED_CACHE
+):
+    """Как iter_report_chunks, но пачки кэшируются на диске по хэшу файла.
+
+    handle — отчёт, открытый open_report. Каждая пачка пишется в cache
+    отдельной записью Parquet сразу после разбора, так что память по-прежнему
+    ограничена пачкой; повторное чтение того же файла (например, второй проход
+    без повторов строк) читает Parquet, а не разбирает xlsx заново. Если часть
+    пачек уже вытеснили, файл разбирается, а прочитанные из кэша пачки
+    пропускаются.
+    """
+    data = _mapped_bytes(handle)
+    if data is None or not cache.enabled:
+        yield from iter_report_chunks(handle, schema, chunk_rows)
+        return
+    # Схема и размер пачки входят в ключ: пачки с другими границами не подойдут
+    key = content_hash(repr(sorted(schema.items())), str(chunk_rows), data)
+    if isinstance(data, memoryview):
+        data.release()
+    manifest = cache.get(key)
+    done = 0
+    if manifest is not None:
+        for number in range(int(manifest["chunks"].iloc[0])):
+            chunk = cache.get(f"{key}-{number}")
+            if chunk is None:
+                break
+            yield chunk
+            done += 1
+        else:
+            return
+    chunks = 0
+    for number, chunk in enumerate(iter_report_chunks(handle, schema, chunk_rows)):
+        chunks += 1
+        if number >= done:
+            yield cache.put(f"{key}-{number}", chunk)
+    # Число пачек — последним: без него неполный набор пачек не читается
+    cache.put(key, pd.DataFrame({"chunks": [chunks]}))
+
+
+@contextmanager
+def _report_buffer(source):
+    # Содержимое отчёта для хэша и чтения: у файла на диске — mmap, без копии
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield BytesIO(source), source
+    elif hasattr(source, "read"):
+        source.seek(0)
+        data = source.read()
+        yield BytesIO(data), data
+    else:
+        with map_file(source) as f:
+            yield f, f if isinstance(f, mmap.mmap) else b""
+
+
+def read_report_cached(source, schema=REPORT_SCHEMA, cache=PARSED_CACHE):
+    """Как read_report, но разобранная таблица кэшируется на диске по хэшу файла."""
+    with _report_buffer(source) as (handle, data):
+        # Схема входит в ключ: при её изменении старые записи не подойдут
+        key = content_hash(repr(sorted(schema.items())), data)
+        df = cache.get(key)
+        if df is None:
+            df = cache.put(key, read_report(handle, schema))
+    return df
+
+
+def read_article_costs(source):
+    """Себестоимость единицы по артикулам из таблицы xlsx/xls.
+
+    Колонки — «Артикул поставщика» и «Себестоимость». Строки без артикула или
+    себестоимости пропускаются; если артикул повторяется, действует последняя.
+    """
+    df = read_report(source, COSTS_SCHEMA).dropna()
+    costs = pd.Series(
+        df[COST].to_numpy(), index=df["Артикул поставщика"].astype(str), name=COST
+    )
+    return costs[~costs.index.duplicated(keep="last")]
@@ -0,0 +1,330 @@
+"""Фоновые задания обработки: общая очередь и ограниченный пул на весь сервер.
+
+Streamlit выполняет скрипт каждой сессии в своём потоке: обработка прямо в
+нём подвешивает страницу, а несколько одновременных загрузок запускают по
+пулу процессов каждая. JobQueue принимает задания всех сессий и выполняет не
+больше JOB_SLOTS из них одновременно, а файлы всех заданий разбираются в
+одном общем пуле из MAX_WORKERS процессов — число процессов и таблиц в
+памяти не растёт с числом сессий.
+
+Прогресс задания считается по замерам этапов (wb_trace) и прочитанным
+байтам файлов, в том числе в процессах пула. Отмена срабатывает на
+ближайшем этапе или пачке строк; задание, ещё стоящее в очереди, снимается
+сразу.
+"""
+
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from multiprocessing import get_context
+
+from wb_aggregate import COST_PRICE, TAX_RATE, Costs
+from wb_cache import DERIVED_CACHE, RESULT_CACHE, content_hash
+from wb_cube import build_cube
+from wb_ingest import expand_archives, read_article_costs, source_size, spool_upload
+from wb_pipeline import MAX_WORKERS, aggregate_unique, build_base, price_tables
+from wb_trace import stage, trace_run
+
+# Сколько заданий выполняется одновременно; остальные ждут в очереди
+JOB_SLOTS = int(os.environ.get("WB_JOB_SLOTS", "2"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Доля прогресса на чтение файлов; остальное — этапы итоговых таблиц
+READ_SHARE = 0.9
+FINAL_STAGES = ("means", "summary", "groups", "cube")
+
+
+class JobCancelled(Exception):
+    """Задание отменено пользователем."""
+
+
+class JobListener:
+    """Слушатель замеров задания (см. wb_trace.Trace.listener).
+
+    Передаётся в процессы пула: сообщения уходят в общую очередь менеджера,
+    а отмена проверяется при каждом сообщении, то есть на каждом этапе.
+    """
+
+    def __init__(self, job_id, events, cancelled):
+        self.job_id = job_id
+        self.events = events
+        self.cancelled = cancelled
+
+    def __call__(self, event):
+        if self.job_id in self.cancelled:
+            raise JobCancelled(f"Задание {self.job_id} отменено")
+        self.events.put((self.job_id, event))
+
+
+class Job:
+    """Одно задание: состояние, прогресс и результат."""
+
+    def __init__(self, job_id, key, total_bytes, listener):
+        self.id = job_id
+        self.key = key
+        self.total_bytes = total_bytes
+        self.listener = listener
+        self.state = QUEUED
+        self.stage = None
+        self.rows = 0
+        self.bytes_read = 0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished_at = None
+        self._final_stages = set()
+        self._future = None
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    def wait(self, timeout=None):
+        """Ждёт завершения задания; False — если не дождались за timeout секунд."""
+        return self._done.wait(timeout)
+
+    def on_finish(self, callback):
+        """Вызывает callback() после завершения (сразу, если задание уже завершено)."""
+        self._future.add_done_callback(lambda _: callback())
+
+    @property
+    def progress(self):
+        """Доля выполненной работы от 0 до 1."""
+        if self.state == DONE:
+            return 1.0
+        read = 0.0
+        if self.total_bytes:
+            read = min(1.0, self.bytes_read / self.total_bytes)
+        final = len(self._final_stages) / len(FINAL_STAGES)
+        return READ_SHARE * read + (1 - READ_SHARE) * final
+
+    def update(self, event):
+        if self.finished:
+            return
+        if event["event"] == "progress":
+            self.bytes_read += event["bytes"]
+            return
+        self.stage = event["stage"]
+        if self.stage == "read" and event["rows_out"]:
+            self.rows += event["rows_out"]
+        if self.stage in FINAL_STAGES:
+            self._final_stages.add(self.stage)
+
+
+class JobQueue:
+    """Очередь заданий с JOB_SLOTS потоками и общим пулом процессов.
+
+    Задание — функция function(job), которая получает задание (для
+    job.listener) и возвращает результат. Одинаковые задания (по key),
+    отправленные до завершения первого, не запускаются повторно.
+    """
+
+    def __init__(self, slots=JOB_SLOTS, workers=MAX_WORKERS):
+        self.slots = slots
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._jobs = {}
+        self._active = {}
+        self._waiting = []
+        self._threads = None
+        self._pool = None
+        self._manager = None
+        self._events = None
+        self._cancelled = None
+
+    def _start(self):
+        # Пул, менеджер и потоки создаются при первом задании
+        if self._threads is not None:
+            return
+        context = get_context("spawn")
+        self._manager = context.Manager()
+        self._events = self._manager.Queue()
+        self._cancelled = self._manager.dict()
+        self._pool = ProcessPoolExecutor(self.workers, mp_context=context)
+        self._threads = ThreadPoolExecutor(self.slots, thread_name_prefix="wb-job")
+        threading.Thread(
+            target=self._dispatch, name="wb-job-events", daemon=True
+        ).start()
+
+    @property
+    def pool(self):
+        """Общий пул процессов для разбора файлов (см. wb_pipeline.aggregate_files)."""
+        with self._lock:
+            self._start()
+        return self._pool
+
+    def _dispatch(self):
+        while True:
+            try:
+                job_id, event = self._events.get()
+            except (EOFError, OSError):
+                # Менеджер остановлен вместе с сервером
+                return
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(event)
+
+    def submit(self, key, function, total_bytes=0):
+        """Ставит function(job) в очередь или возвращает такое же задание."""
+        with self._lock:
+            self._start()
+            job = self._active.get(key)
+            if job is not None:
+                return job
+            job_id = next(self._ids)
+            job = Job(
+                job_id,
+                key,
+                total_bytes,
+                JobListener(job_id, self._events, self._cancelled),
+            )
+            self._jobs[job_id] = job
+            self._active[key] = job
+            self._waiting.append(job)
+            job._future = self._threads.submit(self._run, job, function)
+        return job
+
+    def position(self, job):
+        """Место задания в очереди (1 — следующее), 0 — если оно не ждёт."""
+        with self._lock:
+            try:
+                return self._waiting.index(job) + 1
+            except ValueError:
+                return 0
+
+    @property
+    def running(self):
+        return sum(job.state == RUNNING for job in self._active.values())
+
+    @property
+    def waiting(self):
+        return len(self._waiting)
+
+    def cancel(self, job):
+        """Отменяет задание: из очереди — сразу, выполняемое — на ближайшем этапе."""
+        with self._lock:
+            if job.finished:
+                return
+            self._cancelled[job.id] = True
+            if job._future.cancel():
+                self._finish(job, CANCELLED)
+
+    def _run(self, job, function):
+        with self._lock:
+            self._waiting.remove(job)
+            if job.id in self._cancelled:
+                self._finish(job, CANCELLED)
+                return
+            job.state = RUNNING
+            job.started = time.time()
+        try:
+            result = function(job)
+        except JobCancelled:
+            state, result = CANCELLED, None
+        except Exception as e:
+            job.error = e
+            state, result = FAILED, None
+        else:
+            state = DONE
+        with self._lock:
+            job.result = result
+            self._finish(job, state)
+
+    def _finish(self, job, state):
+        # Вызывается под self._lock
+        if job in self._waiting:
+            self._waiting.remove(job)
+        job.state = state
+        job.finished_at = time.time()
+        job._done.set()
+        # Отметка об отмене остаётся: её увидят ещё не остановившиеся процессы
+        self._jobs.pop(job.id, None)
+        if self._active.get(job.key) is job:
+            del self._active[job.key]
+
+
+# Общая очередь процесса сервера: модуль импортируется один раз на все сессии
+JOBS = JobQueue()
+
+
+def process_sources(key, sources, pool=None, listener=None):
+    """Обрабатывает файлы отчётов (байты) и сохраняет результат в RESULT_CACHE.
+
+    Результат — таблицы без себестоимости и налога (wb_pipeline.BaseTables; их
+    добавляет priced_tables), замеры, куб по периодам (wb_cube; None, если в
+    отчётах нет даты продажи) и число отброшенных повторов строк по файлам
+    (wb_pipeline.aggregate_unique).
+    """
+    with trace_run(key[:12], listener=listener) as trace:
+        partials, duplicates = aggregate_unique(sources, pool=pool)
+        base = build_base(partials)
+        cube = stage("cube", build_cube, partials.cube)
+    return RESULT_CACHE.put(key, (base, trace, cube, duplicates))
+
+
+def priced_tables(key, base, price=COST_PRICE, tax_rate=TAX_RATE, cost_table=None):
+    """Итоговые таблицы результата process_sources с себестоимостью и налогом.
+
+    price — себестоимость единицы, tax_rate — ставка налога, cost_table —
+    файл себестоимости по артикулам (байты, см. wb_ingest.read_article_costs).
+    Файл разбирается, только если таблиц с такими параметрами ещё нет в
+    кэше (wb_cache.DERIVED_CACHE). Возвращает ключ кэша, таблицы и замеры пересчёта.
+    """
+    priced_key = content_hash(
+        key, repr(float(price)), repr(float(tax_rate)), cost_table or b""
+    )
+
+    def compute():
+        with trace_run(priced_key[:12]) as trace:
+            by_article = None
+            if cost_table:
+                by_article = stage(
+                    "cost_table", read_article_costs, BytesIO(cost_table)
+                )
+            tables = price_tables(base, Costs(price, tax_rate, by_article))
+        return tables, trace
+
+    return (priced_key, *DERIVED_CACHE.get_or_compute(priced_key, compute))
+
+
+def submit_reports(key, sources, queue=JOBS):
+    """Ставит обработку файлов отчётов (байты, memoryview или пути) в очередь queue.
+
+    Результат задания — как у process_sources; он же сохраняется в
+    RESULT_CACHE под key, так что после завершения задание не нужно.
+    """
+    sources = list(sources)
+
+    def compute(job):
+        # Большие загрузки — во временные файлы: процессы пула читают их
+        # через mmap, а не получают копию байтов
+        uploads, spooled = [], []
+        try:
+            for source in sources:
+                if isinstance(source, (bytes, bytearray, memoryview)):
+                    source = spool_upload(source)
+                    if isinstance(source, str):
+                        spooled.append(source)
+                uploads.append(source)
+            # Архивы раскрываются уже в задании: ошибка в архиве — ошибка
+            # задания, а прогресс считается по размеру распакованных отчётов
+            reports = expand_archives(uploads)
+            job.total_bytes = sum(source_size(s) for s in reports)
+            # Файлы разбираются в общем пуле процессов, прогресс — через замеры
+            return process_sources(key, reports, queue.pool, job.listener)
+        finally:
+            for path in spooled:
+                os.remove(path)
+
+    return queue.submit(key, compute, sum(source_size(s) for s in sources))
@@ -0,0 +1,167 @@
+"""Нагрузочный тест HTTP-сервиса wb_server.py.
+
+Отправляет одни и те же отчёты из нескольких потоков и печатает пропускную
+способность и задержки (p50/p90/p99). С --unique каждый запрос получает
+отчёт с другим комментарием zip-архива: содержимое то же, но хэш другой,
+поэтому кэш результатов не срабатывает и меряется полная обработка.
+
+Примеры:
+    python wb_load.py report.xlsx -n 50 -c 4
+    python wb_load.py russia.xlsx cis.xlsx --format json --unique -n 8
+"""
+
+import argparse
+import json
+import sys
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from io import BytesIO
+from threading import local
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from wb_export import EXPORT_FORMATS
+
+
+def salted(data, salt):
+    """Тот же xlsx с другим комментарием архива — другой хэш содержимого."""
+    buffer = BytesIO(data)
+    with zipfile.ZipFile(buffer, "a") as archive:
+        archive.comment = f"wb_load {salt}".encode("ascii")
+    return buffer.getvalue()
+
+
+def encode_request(files):
+    """Тело и Content-Type запроса: один файл как есть, несколько — multipart."""
+    if len(files) == 1:
+        return files[0], "application/octet-stream"
+    boundary = uuid.uuid4().hex
+    body = BytesIO()
+    for i, data in enumerate(files):
+        body.write(
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="files"; filename="report{i}.xlsx"'
+            "\r\nContent-Type: application/octet-stream\r\n\r\n".encode("ascii")
+        )
+        body.write(data)
+        body.write(b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode("ascii"))
+    return body.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+
+class Client:
+    """По одному keep-alive соединению на поток."""
+
+    def __init__(self, url, timeout):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._local = local()
+
+    def request(self, method, path, body=None, headers=None):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.connection = connection
+        try:
+            connection.request(method, path, body=body, headers=headers or {})
+            response = connection.getresponse()
+            return response.status, response.getheader("X-Cache"), response.read()
+        except Exception:
+            connection.close()
+            self._local.connection = None
+            raise
+
+
+def run_load(client, files, requests, concurrency, fmt, unique):
+    """Отправляет requests запросов в concurrency потоков; возвращает итоги."""
+
+    def one(i):
+        payload = files
+        if unique:
+            payload = [salted(f, f"{i}-{j}") for j, f in enumerate(files)]
+        body, content_type = encode_request(payload)
+        started = time.perf_counter()
+        try:
+            status, cache, data = client.request(
+                "POST",
+                f"/process?format={fmt}",
+                body,
+                {"Content-Type": content_type},
+            )
+        except OSError as e:
+            return time.perf_counter() - started, None, None, 0, len(body), str(e)
+        return time.perf_counter() - started, status, cache, len(data), len(body), None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    seconds = time.perf_counter() - started
+
+    latencies = np.array([r[0] for r in results])
+    ok = [r for r in results if r[1] == 200]
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "format": fmt,
+        "unique": unique,
+        "ok": len(ok),
+        "errors": requests - len(ok),
+        "cache_hits": sum(r[2] == "hit" for r in ok),
+        "seconds": round(seconds, 3),
+        "throughput_rps": round(requests / seconds, 3),
+        "upload_mb_per_s": round(sum(r[4] for r in results) / seconds / 1024**2, 2),
+        "latency_p50": round(float(np.percentile(latencies, 50)), 4),
+        "latency_p90": round(float(np.percentile(latencies, 90)), 4),
+        "latency_p99": round(float(np.percentile(latencies, 99)), 4),
+        "latency_max": round(float(latencies.max()), 4),
+        "failures": sorted({str(r[5] or r[1]) for r in results if r[1] != 200}),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Нагрузочный тест HTTP-сервиса обработки отчётов (wb_server.py)."
+    )
+    parser.add_argument("reports", nargs="+", help="файлы отчётов для одного запроса")
+    parser.add_argument("--url", default="http://127.0.0.1:8050")
+    parser.add_argument("-n", "--requests", type=int, default=20)
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="xlsx")
+    parser.add_argument(
+        "--unique",
+        action="store_true",
+        help="делать каждый запрос уникальным (мимо кэша результатов)",
+    )
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("-o", "--output", help="дописать итоги строкой JSON в файл")
+    args = parser.parse_args(argv)
+
+    files = []
+    for path in args.reports:
+        with open(path, "rb") as f:
+            files.append(f.read())
+
+    client = Client(args.url, args.timeout)
+    summary = run_load(
+        client, files, args.requests, args.concurrency, args.format, args.unique
+    )
+    status, _, metrics = client.request("GET", "/metrics")
+    if status == 200:
+        summary["server"] = json.loads(metrics)
+
+    line = json.dumps(summary, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 0 if summary["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,453 @@
+"""Обработка детализированного отчёта Wildberries: разбивка по артикулам.
+
+Модуль не зависит от Streamlit и при импорте загружает только pandas и numpy
+(openpyxl — при первом чтении xlsx). Таблицы отчётов на входе, итоговые
+таблицы на выходе — по артикулам, общие суммы и по листу на группу артикулов
+(wb_groups; встроенная группа — «Софт»):
+    process_report(df)          — одна таблица отчёта
+    process_frames(frames)      — несколько таблиц (например, Россия и СНГ)
+    process_reports(sources)    — файлы, байты или zip-архивы, разбор в пуле
+    export_report(tables, fmt)  — байты xlsx, csv или parquet
+    export_report_file(...)     — то же, но сразу в файл на диске
+Себестоимость и налог (wb_aggregate.Costs) передаются параметром costs. Чтобы
+менять их без повторной обработки, итоговые таблицы строятся в два шага:
+build_base(partials) — всё, что от них не зависит, и price_tables(base, costs).
+Строки, которые уже были в предыдущих файлах (пересекающиеся отчёты),
+при сложении нескольких файлов отбрасываются (wb_dedup, aggregate_unique).
+Агрегацию строк считает один из BACKENDS: pandas (по умолчанию) или DuckDB;
+выбирается параметром backend или переменной окружения WB_BACKEND.
+"""
+
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from wb_aggregate import (
+    Costs,
+    PartialsAccumulator,
+    aggregate_report,
+    apply_costs,
+    article_means,
+    base_summary,
+    merge_partials,
+    total_summary,
+)
+from wb_dedup import DEDUP, DUPLICATES, find_duplicates, row_keys
+from wb_duckdb import aggregate_report_duckdb
+from wb_export import export_file, export_tables
+from wb_groups import default_rules, group_tables
+from wb_ingest import (
+    BATCH_SIZE,
+    REPORT_SCHEMA,
+    ArchiveMember,
+    apply_schema,
+    compact_report,
+    expand_archives,
+    has_schema,
+    iter_report_chunks_cached,
+    open_report,
+    read_member,
+    read_report_cached,
+    source_size,
+    validate_report,
+)
+from wb_trace import Trace, current_trace, report_progress, stage
+
+# Листы итогового Excel-файла; за ними — листы групп артикулов (wb_groups)
+SHEET_NAMES = ("Summary_Table_by_Art", "Totall_Summary")
+
+# Итоговые таблицы без себестоимости и налога: таблица по артикулам
+# (wb_aggregate.base_summary), оплаты и таблицы групп {имя листа: таблица}
+BaseTables = namedtuple("BaseTables", ["summary", "payments", "groups"])
+
+# Сколько процессов разбирают файлы параллельно (по умолчанию — по числу ядер)
+MAX_WORKERS = int(os.environ.get("WB_WORKERS", "0")) or os.cpu_count() or 1
+
+
+# Отчёты от WB_STREAM_MB мегабайт (размер файла) агрегируются потоково, пачками
+# по WB_CHUNK_ROWS строк; WB_STREAM_MB=0 — потоково всегда
+STREAM_MB = float(os.environ.get("WB_STREAM_MB", "100"))
+CHUNK_ROWS = int(os.environ.get("WB_CHUNK_ROWS", str(BATCH_SIZE)))
+
+# Реализации агрегации: таблица отчёта -> ReportPartials (результаты одинаковы)
+BACKENDS = {
+    "pandas": aggregate_report,
+    "duckdb": aggregate_report_duckdb,
+}
+BACKEND = os.environ.get("WB_BACKEND", "pandas")
+
+
+def get_backend(name):
+    """Функция агрегации по имени из BACKENDS."""
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Неизвестный способ агрегации «{name}»: доступны {', '.join(BACKENDS)}"
+        ) from None
+
+
+def _aggregate_rows(df, aggregate, drop=None, keys=False):
+    # Ключи строк (wb_dedup.row_keys) считаются по всем строкам: маска drop
+    # задана по ним же
+    row_key = stage("keys", row_keys, df, rows_in=len(df)) if keys else None
+    if drop is not None:
+        df = df[~drop]
+    df = stage("compact", compact_report, df, rows_in=len(df))
+    return stage("aggregate", aggregate, df, rows_in=len(df)), row_key
+
+
+def aggregate_frame(df, backend=BACKEND, drop=None):
+    """Агрегаты одной таблицы отчёта: схема, сжатие типов и свёртка по артикулам.
+
+    Подходит и таблица прямо из pd.read_excel: из неё берутся колонки схемы.
+    drop — маска строк, которые не учитываются (повторы, см. wb_dedup).
+    """
+    return _aggregate_frame(df, backend, drop)[0]
+
+
+def _aggregate_frame(df, backend=BACKEND, drop=None, keys=False):
+    aggregate = get_backend(backend)
+    if not has_schema(df):
+        df = stage("schema", apply_schema, df, rows_in=len(df))
+    return _aggregate_rows(df, aggregate, drop, keys)
+
+
+def aggregate_stream(source, backend=BACKEND, chunk_rows=CHUNK_ROWS, drop=None):
+    """Агрегирует отчёт пачками по chunk_rows строк, не собирая всю таблицу.
+
+    Агрегаты каждой пачки сразу складываются с накопленными, поэтому память
+    ограничена размером пачки и числом артикулов, а не числом строк. drop —
+    как у aggregate_frame, по строкам всего отчёта.
+    """
+    return _aggregate_stream(source, backend, chunk_rows, drop)[0]
+
+
+def _aggregate_stream(
+    source, backend=BACKEND, chunk_rows=CHUNK_ROWS, drop=None, keys=False
+):
+    aggregate = get_backend(backend)
+    size = source_size(source)
+    total = PartialsAccumulator()
+    chunk_keys = []
+    done = rows = 0
+    with open_report(source) as handle:
+        # Пачки кэшируются (wb_cache.PARSED_CACHE), как таблица при полном
+        # чтении: второй проход без повторов строк читает Parquet
+        chunks = iter_report_chunks_cached(handle, REPORT_SCHEMA, chunk_rows)
+        while True:
+            chunk = stage("read", next, chunks, None)
+            if chunk is None:
+                break
+            skip = None if drop is None else drop[rows : rows + len(chunk)]
+            rows += len(chunk)
+            partials, row_key = _aggregate_rows(chunk, aggregate, skip, keys)
+            chunk_keys.append(row_key)
+            stage("merge", total.add, partials)
+            # Лист xlsx распаковывается из файла по мере чтения, так что
+            # позиция в файле — оценка прочитанной доли отчёта
+            position = min(handle.tell(), size)
+            report_progress(position - done)
+            done = max(done, position)
+    report_progress(size - done)
+    if not keys or any(k is None for k in chunk_keys):
+        return total.result(), None
+    return total.result(), np.concatenate(chunk_keys)
+
+
+def aggregate_file(source, backend=BACKEND, stream=None, drop=None):
+    """Читает один отчёт (путь, файл, байты или ArchiveMember) и возвращает агрегаты.
+
+    stream=None — читать потоково, если файл не меньше STREAM_MB мегабайт.
+    drop — маска строк отчёта, которые не учитываются (см. aggregate_unique).
+    """
+    return _aggregate_file(source, backend, stream, drop)[0]
+
+
+def aggregate_keyed(source, backend=BACKEND):
+    """Как aggregate_file, но возвращает ещё ключи строк (wb_dedup.row_keys)."""
+    return _aggregate_file(source, backend, keys=True)
+
+
+def _aggregate_file(source, backend=BACKEND, stream=None, drop=None, keys=False):
+    member = None
+    if isinstance(source, ArchiveMember):
+        member, source = source, stage("unzip", read_member, source)
+    # Заголовок проверяется до полного разбора: не тот файл — ошибка сразу
+    try:
+        stage("validate", validate_report, source)
+    except ValueError as e:
+        if member is None:
+            raise
+        # Отчёты архива не проверяются заранее (validate_sources): подпись здесь
+        raise ValueError(f"{member}: {e}") from None
+    size = source_size(source)
+    if stream is None:
+        stream = size >= STREAM_MB * 1024 * 1024
+    if stream:
+        return _aggregate_stream(source, backend, drop=drop, keys=keys)
+    df = stage("read", read_report_cached, source)
+    result = _aggregate_frame(df, backend, drop, keys)
+    report_progress(size)
+    return result
+
+
+def _traced(function, label, listener, enabled, *args):
+    # В процессе пула замеры копятся отдельно и возвращаются вместе с результатом
+    with Trace(label, listener, enabled) as trace:
+        result = function(*args)
+    return result, trace.records
+
+
+def _map(pool, function, *iterables):
+    # pool=None — по очереди в этом процессе
+    if pool is None:
+        return list(map(function, *iterables))
+    trace = current_trace()
+    if trace is None:
+        return list(pool.map(function, *iterables))
+    results = list(
+        pool.map(
+            _traced,
+            repeat(function),
+            repeat(trace.label),
+            repeat(trace.listener),
+            repeat(trace.enabled),
+            *iterables,
+        )
+    )
+    for _, records in results:
+        trace.add(records)
+    return [result for result, _ in results]
+
+
+def source_label(source, number):
+    """Подпись отчёта в сообщениях: путь, «архив:файл» или «Файл number»."""
+    if isinstance(source, (str, os.PathLike, ArchiveMember)):
+        return str(source)
+    return f"Файл {number}"
+
+
+def validate_sources(sources):
+    """Проверяет заголовки всех отчётов (wb_ingest.validate_report) до разбора.
+
+    Ошибка в любом файле останавливает обработку до того, как пул начнёт
+    разбирать остальные; при нескольких файлах в ней есть подпись файла.
+    Отчёты из архивов здесь не проверяются: их проверяет процесс пула перед
+    разбором (_aggregate_file), и распаковывать их дважды незачем.
+    """
+    for number, source in enumerate(sources, start=1):
+        if isinstance(source, ArchiveMember):
+            continue
+        try:
+            validate_report(source)
+        except ValueError as e:
+            if len(sources) == 1:
+                raise
+            raise ValueError(f"{source_label(source, number)}: {e}") from None
+
+
+def count_duplicates(sources, masks=None):
+    """Series «файл → сколько строк отброшено» по маскам повторов masks."""
+    masks = masks or [None] * len(sources)
+    return pd.Series(
+        [0 if mask is None else int(mask.sum()) for mask in masks],
+        index=[source_label(s, i) for i, s in enumerate(sources, start=1)],
+        name=DUPLICATES,
+        dtype="int64",
+    )
+
+
+def drop_duplicates(sources, results, backend=BACKEND, pool=None):
+    """Убирает из агрегатов файлов строки, которые уже были в предыдущих файлах.
+
+    results — результаты aggregate_keyed для sources в том же порядке. Файлы
+    с повторами агрегируются заново без них (в pool, если он задан), прочие
+    остаются как есть. Возвращает агрегаты файлов и count_duplicates.
+    """
+    parts = [partials for partials, _ in results]
+    keys = [k for _, k in results]
+    masks = stage(
+        "dedup",
+        find_duplicates,
+        keys,
+        rows_in=sum(len(k) for k in keys if k is not None),
+    )
+    again = [i for i, mask in enumerate(masks) if mask is not None]
+    if again:
+        redone = _map(
+            pool,
+            aggregate_file,
+            [sources[i] for i in again],
+            repeat(backend),
+            repeat(None),
+            [masks[i] for i in again],
+        )
+        for i, partials in zip(again, redone):
+            parts[i] = partials
+    return parts, count_duplicates(sources, masks)
+
+
+def aggregate_unique(
+    sources, max_workers=MAX_WORKERS, backend=BACKEND, pool=None, dedup=DEDUP
+):
+    """Как aggregate_files, но возвращает ещё число отброшенных повторов по файлам.
+
+    Строки, которые уже были в предыдущих файлах (wb_dedup), не учитываются:
+    пересекающиеся отчёты не удваивают суммы. Файлы без повторов читаются
+    один раз; файлы с повторами — второй раз, уже без них. dedup=False —
+    складывать файлы как есть.
+    """
+    sources = expand_archives(sources)
+    # Неизвестное имя или не тот файл — ошибка сразу, а не в процессах пула
+    get_backend(backend)
+    if len(sources) > 1:
+        stage("validate", validate_sources, sources, rows_in=len(sources))
+    keyed = dedup and len(sources) > 1
+    function = aggregate_keyed if keyed else aggregate_file
+    workers = min(max_workers, len(sources))
+    own_pool = None
+    if pool is None and workers > 1:
+        # spawn: процесс сервера Streamlit многопоточный, fork для него небезопасен
+        pool = own_pool = ProcessPoolExecutor(workers, mp_context=get_context("spawn"))
+    try:
+        results = _map(pool, function, sources, repeat(backend))
+        if keyed:
+            parts, dropped = drop_duplicates(sources, results, backend, pool)
+        else:
+            parts, dropped = results, count_duplicates(sources)
+    finally:
+        if own_pool is not None:
+            own_pool.shutdown()
+    return _merge(parts), dropped
+
+
+def aggregate_files(sources, max_workers=MAX_WORKERS, backend=BACKEND, pool=None):
+    """Агрегирует несколько отчётов в пуле процессов и складывает агрегаты.
+
+    Каждый файл разбирается и сворачивается в агрегаты по артикулам в своём
+    процессе, так что общая таблица строк всех файлов не создаётся. pool —
+    готовый общий пул (см. wb_jobs): в нём разбираются все файлы, даже один,
+    а max_workers не используется. zip-архивы отчётов раскрываются в свои
+    файлы (wb_ingest.expand_archives), и те разбираются параллельно, как
+    отдельные отчёты. Повторы строк между файлами отбрасываются (см.
+    aggregate_unique).
+    """
+    return aggregate_unique(sources, max_workers, backend, pool)[0]
+
+
+def _merge(parts):
+    return stage(
+        "merge", merge_partials, parts, rows_in=sum(len(p.articles) for p in parts)
+    )
+
+
+def build_base(partials, rules=None):
+    """Строит из агрегатов всё, что не зависит от себестоимости и налога.
+
+    rules — правила групп артикулов (по умолчанию wb_groups.default_rules()).
+    """
+    articles = partials.articles
+    # Средние по артикулам нужны и таблице по артикулам, и таблицам групп
+    means = stage("means", article_means, articles, rows_in=len(articles))
+    summary = stage("summary", base_summary, articles, means, rows_in=len(articles))
+
+    # Группы ("Софт" и правила из файла) — по уникальным артикулам
+    groups = stage(
+        "groups",
+        group_tables,
+        articles,
+        default_rules() if rules is None else rules,
+        SHEET_NAMES,
+        means,
+        rows_in=len(articles),
+    )
+
+    return BaseTables(summary, partials.payments, groups)
+
+
+def price_tables(base, costs=Costs()):
+    """Итоговые таблицы из build_base с себестоимостью и налогом costs.
+
+    Возвращает таблицу по артикулам, общие суммы и таблицы групп (словарь
+    {имя листа: таблица}; см. named_tables).
+
+    Пересчитываются только колонки себестоимости, маржи, налогов и прибыли
+    и общие суммы — миллисекунды даже на десятках тысяч артикулов.
+    """
+    third_merged = stage(
+        "costs", apply_costs, base.summary, costs, rows_in=len(base.summary)
+    )
+    totall_summary = stage(
+        "totals",
+        total_summary,
+        third_merged,
+        base.payments,
+        costs,
+        rows_in=len(third_merged),
+    )
+    return third_merged, totall_summary, base.groups
+
+
+def build_tables(partials, costs=Costs(), rules=None):
+    """Строит итоговые таблицы из агрегатов отчёта (или нескольких)."""
+    return price_tables(build_base(partials, rules), costs)
+
+
+def process_report(df, backend=BACKEND, costs=Costs()):
+    """Считает итоговые таблицы: по артикулам, общие суммы и группы артикулов."""
+    # Агрегаты по артикулам и по «Обоснованию для оплаты» — за один проход
+    return build_tables(aggregate_frame(df, backend), costs)
+
+
+def process_frames(frames, backend=BACKEND, costs=Costs()):
+    """Считает итоговые таблицы по нескольким таблицам отчётов (Россия + СНГ)."""
+    return build_tables(_merge([aggregate_frame(df, backend) for df in frames]), costs)
+
+
+def process_reports(
+    sources, max_workers=MAX_WORKERS, backend=BACKEND, pool=None, costs=Costs()
+):
+    """Считает итоговые таблицы по одному или нескольким файлам отчётов."""
+    return build_tables(aggregate_files(sources, max_workers, backend, pool), costs)
+
+
+def named_tables(tables):
+    """Пары (имя листа, таблица) итоговых таблиц price_tables в порядке листов."""
+    summary, totals, groups = tables
+    return [*zip(SHEET_NAMES, (summary, totals)), *groups.items()]
+
+
+def export_report(tables, fmt="xlsx"):
+    """Выгружает итоговые таблицы в формате fmt (xlsx, csv, parquet)."""
+    named = named_tables(tables)
+    return stage(
+        "write",
+        export_tables,
+        named,
+        fmt,
+        rows_in=sum(len(t) for _, t in named),
+    )
+
+
+def export_report_file(tables, fmt, path):
+    """Как export_report, но пишет выгрузку в файл path (см. wb_cache.FileCache)."""
+    named = named_tables(tables)
+    stage(
+        "write",
+        export_file,
+        named,
+        fmt,
+        path,
+        rows_in=sum(len(t) for _, t in named),
+    )
+
+
+def build_workbook(tables):
+    """Собирает Excel-файл из итоговых таблиц и возвращает его байты."""
+    return export_report(tables, "xlsx")
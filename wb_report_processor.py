@@ -1,746 +1,369 @@
-import pandas as pd
-import numpy as np
-import streamlit as st
-from io import BytesIO
+"""Streamlit-интерфейс обработки отчётов Wildberries.
+
+Запуск: streamlit run wb_report_processor.py. Вся обработка — в wb_pipeline;
+Streamlit импортируется только при запуске интерфейса, так что модуль можно
+импортировать и без него. Загрузки из интерфейса обрабатываются фоновыми
+заданиями в общей очереди сервера (wb_jobs).
+"""
 
-# Заголовок приложения
-st.title("📊 Обработка ДЕТАЛИЗИРОВАННЫХ финансовых отчётов Wildberries (Разбивка по артикулам)")
+import pandas as pd
 
-# Выбор режима работы
-mode = st.radio(
-    "Выберите режим работы:", ["Один файл", "Два файла (Россия + СНГ)"], horizontal=True
+from wb_aggregate import COST_PRICE, TAX_RATE
+from wb_cache import DERIVED_CACHE, EXPORT_CACHE, RESULT_CACHE, content_hash
+from wb_cube import MEASURES, PERIODS
+from wb_export import EXPORT_FORMATS
+from wb_ingest import COST
+from wb_jobs import (
+    CANCELLED,
+    DONE,
+    FAILED,
+    JOBS,
+    priced_tables,
+    submit_reports,
 )
+from wb_pipeline import export_report_file
+from wb_trace import summarize_stages, trace_run
+
+# Подписи колонок таблицы замеров по этапам
+STAGE_COLUMNS = {
+    "stage": "Этап",
+    "seconds": "Время, с",
+    "rows_in": "Строк на входе",
+    "rows_out": "Строк на выходе",
+    "mb_in": "Таблицы на входе, МБ",
+    "mb_out": "Таблицы на выходе, МБ",
+    "rss_delta_mb": "Рост пика памяти, МБ",
+    "pid": "Процесс",
+    "calls": "Вызовов",
+}
+
+# Названия этапов в строке прогресса
+STAGE_LABELS = {
+    "unzip": "распаковка архива",
+    "validate": "проверка заголовка",
+    "read": "чтение",
+    "schema": "проверка колонок",
+    "compact": "сжатие",
+    "aggregate": "агрегация",
+    "keys": "ключи строк",
+    "dedup": "поиск повторов",
+    "merge": "сложение агрегатов",
+    "means": "средние по артикулам",
+    "summary": "таблица по артикулам",
+    "totals": "общие суммы",
+    "groups": "группы артикулов",
+    "cube": "разбивка по периодам",
+    "cost_table": "таблица себестоимости",
+    "costs": "себестоимость и налоги",
+}
+
+# Отчёты загружаются файлами Excel или zip-архивами с ними (см. wb_ingest)
+UPLOAD_TYPES = ["xlsx", "xls", "zip"]
+
+# Сколько артикулов показывать в детализации по периоду
+TOP_ARTICLES = 20
+
+# Как часто обновляется прогресс задания, с
+PROGRESS_SECONDS = 0.5
+
+
+def upload_key(uploaded_files, mode):
+    """Ключ кэша загрузок: хэш содержимого файлов и режима."""
+    return content_hash(mode, *(f.getbuffer() for f in uploaded_files))
+
+
+def cost_inputs():
+    """Себестоимость единицы, ставка налога и файл себестоимости по артикулам."""
+    import streamlit as st
 
-if mode == "Один файл":
-    # Загрузка одного файла
-    uploaded_file = st.file_uploader(
-        "Загрузите Excel-файл отчёта Wildberries", type=["xlsx", "xls"]
+    col1, col2 = st.columns(2)
+    with col1:
+        price = st.number_input(
+            "Себестоимость единицы, ₽:",
+            min_value=0.0,
+            value=float(COST_PRICE),
+            step=10.0,
+        )
+    with col2:
+        tax_percent = st.number_input(
+            "Налог, % от реализации ВБ:",
+            min_value=0.0,
+            max_value=100.0,
+            value=TAX_RATE * 100,
+            step=0.5,
+        )
+    cost_file = st.file_uploader(
+        "Себестоимость по артикулам (необязательно): колонки «Артикул поставщика» "
+        f"и «{COST}»; остальные артикулы считаются по цене выше",
+        type=["xlsx", "xls"],
+        key="cost_table",
     )
+    return price, tax_percent / 100, cost_file.getvalue() if cost_file else None
 
-    if uploaded_file is not None:
-        try:
-            # Чтение файла
-            df = pd.read_excel(uploaded_file, dtype={"Баркод": str, "Размер": str})
-
-            # Начало блока ОБРАБОТКА ДАННЫХ =================================
-            # Суммирование и агрегация данных
-            sums1_per_category = (
-                df.groupby("Артикул поставщика")
-                .agg(
-                    {
-                        "Цена розничная": "sum",
-                        "Вайлдберриз реализовал Товар (Пр)": "sum",
-                        "К перечислению Продавцу за реализованный Товар": "sum",
-                        "Услуги по доставке товара покупателю": "sum",
-                    }
-                )
-                .astype(int)
-                .reset_index()
-            )
-
-            sums1_per_category["К Перечислению без Логистики"] = (
-                sums1_per_category["К перечислению Продавцу за реализованный Товар"]
-                - sums1_per_category["Услуги по доставке товара покупателю"]
-            ).astype(int)
-            sums1_per_category["Сумма СПП"] = (
-                sums1_per_category["Цена розничная"]
-                - sums1_per_category["Вайлдберриз реализовал Товар (Пр)"]
-            ).astype(int)
-            sums1_per_category["% Лог/рс"] = (
-                (
-                    (
-                        sums1_per_category["Услуги по доставке товара покупателю"]
-                        / sums1_per_category[
-                            "К перечислению Продавцу за реализованный Товар"
-                        ]
-                    )
-                    * 100
-                )
-                .replace(np.inf, 100.0)
-                .round(1)
-            )
-            sums1_per_category["% Лог/Наша Цена"] = (
-                (
-                    (
-                        sums1_per_category["Услуги по доставке товара покупателю"]
-                        / sums1_per_category["Цена розничная"]
-                    )
-                    * 100
-                )
-                .replace(np.inf, 100.0)
-                .round(1)
-            )
-
-            # Фильтруем только возвраты
-            returns_by_article = (
-                df[df["Тип документа"] == "Возврат"]
-                .groupby("Артикул поставщика")[
-                    [
-                        "Цена розничная",
-                        "Вайлдберриз реализовал Товар (Пр)",
-                        "К перечислению Продавцу за реализованный Товар",
-                    ]
-                ]
-                .sum()
-                .fillna(0)
-                .reset_index()
-            )
-            returns_by_article = returns_by_article.rename(
-                columns={
-                    "Цена розничная": "Возвраты Наша цена",
-                    "Вайлдберриз реализовал Товар (Пр)": "Возвраты реализация ВБ",
-                    "К перечислению Продавцу за реализованный Товар": "Возврты к перечислению",
-                }
-            )
 
-            # Объединяем таблицы
-            first_merged = sums1_per_category.merge(
-                returns_by_article, on="Артикул поставщика", how="left"
-            ).fillna(0)
+def show_results(key, base, trace, file_stem, message="Обработка завершена!"):
+    import streamlit as st
 
-            # Добавляем колонки Чистые продажи
-            first_merged["Чистые продажи Наши"] = (
-                first_merged["Цена розничная"] - first_merged["Возвраты Наша цена"]
-            )
-            first_merged["Чистая реализацич ВБ"] = (
-                first_merged["Вайлдберриз реализовал Товар (Пр)"]
-                - first_merged["Возвраты реализация ВБ"]
-            )
-            first_merged["Чистое Перечисление"] = (
-                first_merged["К перечислению Продавцу за реализованный Товар"]
-                - first_merged["Возврты к перечислению"]
-            )
-            first_merged["Чистое Перечисление без Логистики"] = (
-                first_merged["Чистое Перечисление"]
-                - first_merged["Услуги по доставке товара покупателю"]
-            )
+    # Отображение результатов
+    st.success(message)
+    # Замеры этапов заполняются ниже, когда будет готова и выгрузка
+    details = st.expander("⏱ Время и память по этапам") if trace else None
 
-            # Средние значения
-            cost_per_category = (
-                df.groupby("Артикул поставщика")
-                .agg(
-                    {
-                        "Цена розничная": lambda x: (
-                            x[x != 0].mean() if any(x != 0) else 0
-                        ),
-                        "Вайлдберриз реализовал Товар (Пр)": lambda x: (
-                            x[x != 0].mean() if any(x != 0) else 0
-                        ),
-                        "К перечислению Продавцу за реализованный Товар": lambda x: (
-                            x[x != 0].mean() if any(x != 0) else 0
-                        ),
-                        "Услуги по доставке товара покупателю": lambda x: x.mean() * 2,
-                    }
-                )
-                .astype(int)
-                .reset_index()
-            )
-
-            cost_per_category["СПП Средняя"] = (
-                cost_per_category["Цена розничная"]
-                - cost_per_category["Вайлдберриз реализовал Товар (Пр)"]
-            ).round(1)
-            cost_per_category["К Перечислению без Логистики Средняя"] = (
-                cost_per_category["К перечислению Продавцу за реализованный Товар"]
-                - cost_per_category["Услуги по доставке товара покупателю"]
-            ).round(1)
-            cost_per_category["% Лог/Перечисление с Лог Средний"] = (
-                (
-                    (
-                        cost_per_category["Услуги по доставке товара покупателю"]
-                        / cost_per_category[
-                            "К перечислению Продавцу за реализованный Товар"
-                        ]
-                    )
-                    * 100
-                )
-                .replace(np.inf, 100.0)
-                .round(1)
-            )
-            cost_per_category["% Лог/Наша цена Средний"] = (
-                (
-                    (
-                        cost_per_category["Услуги по доставке товара покупателю"]
-                        / cost_per_category["Цена розничная"]
-                    )
-                    * 100
-                )
-                .replace(np.inf, 100.0)
-                .round(1)
-            )
-
-            # Объединяем таблицы
-            second_merged = first_merged.merge(
-                cost_per_category, on="Артикул поставщика", how="left"
-            ).fillna(0)
-            second_merged = second_merged.rename(
-                columns={
-                    "Цена розничная_y": "Наша цена Средняя",
-                    "Вайлдберриз реализовал Товар (Пр)_y": "Реализация ВБ Средняя",
-                    "К перечислению Продавцу за реализованный Товар_y": "К перечислению Среднее",
-                    "Услуги по доставке товара покупателю_y": "Логистика Одной Юбки Средняя",
-                }
-            )
-
-            # Обработка логистики
-            df_exploded = df.explode("Виды логистики, штрафов и доплат")
-            df_exploded["Виды логистики, штрафов и доплат"] = df_exploded[
-                "Виды логистики, штрафов и доплат"
-            ].fillna("Не указано")
-
-            status_log = (
-                df_exploded.groupby("Артикул поставщика")[
-                    "Виды логистики, штрафов и доплат"
-                ]
-                .value_counts()
-                .unstack(fill_value=0)
-                .reset_index()
-            )
-
-            for col in [
-                "К клиенту при продаже",
-                "От клиента при возврате",
-                "От клиента при отмене",
-            ]:
-                status_log[col] = status_log.get(col, pd.Series(0)).fillna(0)
-
-            numerator = status_log["К клиенту при продаже"]
-            denominator = (
-                status_log["К клиенту при отмене"]
-                + status_log["К клиенту при продаже"]
-                + status_log["От клиента при возврате"]
-            )
-
-            status_log["%Выкупа"] = np.where(
-                (numerator == 0) & (denominator == 0),
-                0,
-                np.where(
-                    numerator == 0 & (denominator > 0),
-                    -100,
-                    np.where(
-                        denominator == 0, 0, (numerator / denominator) * 100
-                    ).astype(int),
-                ),
-            )
-            status_log["Себес Продаж (600р)"] = (
-                status_log["К клиенту при продаже"] * 600
-            ).round(0)
-
-            # Финальное объединение
-            third_merged = second_merged.merge(
-                status_log[
-                    [
-                        "Артикул поставщика",
-                        "К клиенту при продаже",
-                        "%Выкупа",
-                        "Себес Продаж (600р)",
-                    ]
-                ],
-                on="Артикул поставщика",
-                how="left",
-            ).fillna(0)
-
-            # Переименование столбцов
-            third_merged = third_merged.rename(
-                columns={
-                    "К клиенту при продаже": "Кол-во Продаж",
-                    "Цена розничная_x": "Сумма Продаж Наша Цена",
-                    "Вайлдберриз реализовал Товар (Пр)_x": "Сумма Продаж по цене ВБ",
-                    "К перечислению Продавцу за реализованный Товар_x": "Сумма Продаж Перечислени С Лог",
-                    "Услуги по доставке товара покупателю_x": "Логистика",
-                }
-            )
-
-            # Расчеты
-            third_merged["Маржа"] = (
-                third_merged["Чистое Перечисление без Логистики"]
-                - third_merged["Себес Продаж (600р)"]
-            ).round(1)
-            third_merged["Налоги"] = (
-                third_merged["Чистая реализацич ВБ"] * 0.07
-            ).round(1)
-            third_merged["Прибыль"] = (
-                third_merged["Маржа"] - third_merged["Налоги"]
-            ).round(1)
-            third_merged.sort_values(
-                by="Сумма Продаж Наша Цена", ascending=False, inplace=True
-            )
-            third_merged["Прибыль на 1 Юбку"] = (
-                third_merged["Маржа"] / third_merged["Кол-во Продаж"]
-            ).replace(np.inf, 0).round(1)
-
-            # Формирование итоговой таблицы
-            all_add_log = (
-                df.groupby("Обоснование для оплаты")
-                .agg(
-                    {
-                        "Услуги по доставке товара покупателю": "sum",
-                        "Общая сумма штрафов": "sum",
-                        "Хранение": "sum",
-                        "Удержания": "sum",
-                        "Платная приемка": "sum",
-                    }
-                )
-                .reset_index()
-            )
+    # Себестоимость и налог меняют только производные колонки: таблицы
+    # пересчитываются из базовых, без повторной обработки отчёта
+    price, tax_rate, cost_table = cost_inputs()
+    priced_key, tables, costs_trace = priced_tables(
+        key, base, price, tax_rate, cost_table
+    )
+    st.dataframe(tables[1], hide_index=True)
 
-            totall_summary = pd.DataFrame(
-                {
-                    "Колонка": [
-                        "Логистика",
-                        "Сумма СПП",
-                        "Сумма Чистых продаж без Возвратов и Логистики",
-                        "Кол-во Продаж, Шт",
-                        "Себестоимость продаж",
-                        "Прибыль без налога",
-                        "Штрафы",
-                        "Хранение",
-                        "Удержания",
-                        "Платная приемка",
-                        "Итого: прибыль минус доп. удержания",
-                    ],
-                    "Общая сумма": [
-                        third_merged["Логистика"].sum(),
-                        third_merged["Сумма СПП"].sum(),
-                        third_merged["Чистое Перечисление без Логистики"].sum(),
-                        third_merged["Кол-во Продаж"].sum(),
-                        third_merged["Себес Продаж (600р)"].sum(),
-                        third_merged["Прибыль"].sum(),
-                        all_add_log["Общая сумма штрафов"].sum(),
-                        all_add_log["Хранение"].sum(),
-                        all_add_log["Удержания"].sum(),
-                        all_add_log["Платная приемка"].sum(),
-                        third_merged["Прибыль"].sum()
-                        - (
-                            all_add_log["Общая сумма штрафов"].sum()
-                            + all_add_log["Хранение"].sum()
-                            + all_add_log["Удержания"].sum()
-                            + all_add_log["Платная приемка"].sum()
-                        ),
-                    ],
-                }
-            )
+    fmt = st.radio(
+        "Формат выгрузки:",
+        list(EXPORT_FORMATS),
+        format_func=lambda name: EXPORT_FORMATS[name].label,
+        horizontal=True,
+    )
+    export = EXPORT_FORMATS[fmt]
+    export_key = content_hash(priced_key, fmt)
+
+    def write(path):
+        export_report_file(tables, fmt, path)
+
+    def cached_export():
+        with trace_run(f"{priced_key[:12]}-{fmt}") as export_trace:
+            path = EXPORT_CACHE.get_or_write(export_key, write)
+        return path, export_trace
+
+    # Выгрузка в каждом формате пишется на диск (wb_cache.EXPORT_CACHE); в
+    # кэше производных результатов — только путь и замеры
+    _, export_trace = DERIVED_CACHE.get_or_compute(export_key, cached_export)
+
+    def download():
+        # Файл читается с диска только по нажатию кнопки (функция в data —
+        # с Streamlit 1.52); если его уже вытеснили из кэша, он записывается заново
+        with open(EXPORT_CACHE.get_or_write(export_key, write), "rb") as f:
+            return f.read()
+
+    st.download_button(
+        label="⬇️ Скачать отчёт",
+        data=download,
+        file_name=f"{file_stem}.{export.extension}",
+        mime=export.mime,
+    )
 
-            # Обработка "Софт" товаров
-            summary_soft = (
-                df[df["Артикул поставщика"].str.contains("Софт", case=False, na=False)]
-                .groupby("Артикул поставщика", as_index=False)
-                .agg(
-                    {
-                        "Цена розничная": [
-                            ("Сумма продаж наша цена (Софт)", "sum"),
-                            ("Средняя Наша цена (Софт)", lambda x: x[x != 0].mean()),
-                        ]
-                    }
+    if details is not None:
+        with details:
+            stages = summarize_stages(
+                pd.concat(
+                    [t.to_frame() for t in (trace, costs_trace, export_trace) if t],
+                    ignore_index=True,
                 )
-                .round(0)
-                .astype(int, errors="ignore")
             )
-            summary_soft.columns = [
-                "Артикул поставщика",
-                "Сумма продаж (Софт)",
-                "Цена средняя (Софт)",
-            ]
-            summary_soft.sort_values(
-                by="Сумма продаж (Софт)", ascending=False, inplace=True
+            st.dataframe(stages.rename(columns=STAGE_COLUMNS), hide_index=True)
+            st.caption(
+                f"Всего: {stages['seconds'].sum():.2f} с. Для уже обработанных "
+                "файлов показаны замеры первой обработки."
             )
 
-            # Создание Excel файла
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine="openpyxl") as writer:
-                third_merged.to_excel(
-                    writer, sheet_name="Summary_Table_by_Art", index=False
-                )
-                totall_summary.to_excel(
-                    writer, sheet_name="Totall_Summary", index=False
-                )
-                summary_soft.to_excel(writer, sheet_name="Soft_Summary", index=False)
-            output.seek(0)
-
-            # Отображение результатов
-            st.success("Обработка завершена!")
-            st.download_button(
-                label="⬇️ Скачать отчёт",
-                data=output,
-                file_name="wildberries_report.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            )
 
-        except Exception as e:
-            st.error(f"Ошибка: {str(e)}")
-            st.stop()
-    else:
-        st.warning("Пожалуйста, загрузите файл отчёта")
+def show_cube(cube):
+    import streamlit as st
 
-else:
-    # Режим "Два файла"
+    # Срезы считаются по готовому кубу: фильтры не запускают обработку заново
+    st.subheader("📅 Разбивка по периодам")
+    if cube is None:
+        st.info("В отчёте нет колонки «Дата продажи» — разбивка по периодам недоступна")
+        return
     col1, col2 = st.columns(2)
     with col1:
-        uploaded_file_russia = st.file_uploader(
-            "Загрузите файл по России", type=["xlsx", "xls"]
+        period = st.radio(
+            "Период:",
+            list(PERIODS),
+            format_func=PERIODS.get,
+            horizontal=True,
         )
     with col2:
-        uploaded_file_cis = st.file_uploader(
-            "Загрузите файл по СНГ", type=["xlsx", "xls"]
+        measure = st.selectbox("Показатель:", MEASURES)
+    document_types = st.multiselect(
+        "Типы документов (пусто — все):", list(cube.document_types)
+    )
+    articles = st.multiselect("Артикулы (пусто — все):", list(cube.articles))
+    groups = st.multiselect("Группы артикулов (пусто — все):", cube.groups)
+
+    table = cube.by_period(measure, period, articles, document_types, groups)
+    if table.empty:
+        st.warning("Нет строк по выбранным фильтрам")
+        return
+    st.line_chart(table)
+    st.dataframe(table)
+
+    if len(cube.days) > 1:
+        start, end = st.slider(
+            "Дни для артикулов:",
+            min_value=cube.days[0].date(),
+            max_value=cube.days[-1].date(),
+            value=(cube.days[0].date(), cube.days[-1].date()),
         )
+    else:
+        start = end = None
+    top = cube.by_article(measure, articles, document_types, start, end, groups)
+    st.caption(f"Артикулы с наибольшим показателем «{measure}»")
+    st.dataframe(top.head(TOP_ARTICLES))
+
+
+def submit_job(uploaded_files, mode):
+    """Ставит обработку загрузок в общую очередь (см. wb_jobs) и возвращает задание."""
+    key = upload_key(uploaded_files, mode)
+    # memoryview без копии: большие файлы задание сразу сбрасывает на диск
+    return submit_reports(key, [f.getbuffer() for f in uploaded_files])
+
+
+def show_duplicates(duplicates, uploaded_files):
+    """Предупреждение о строках, которые уже были в предыдущих файлах."""
+    import streamlit as st
+
+    if not duplicates.sum():
+        return
+    if len(duplicates) == len(uploaded_files):
+        # Архивов среди загрузок нет: подписываем файлы их именами
+        duplicates = duplicates.set_axis([f.name for f in uploaded_files])
+    total = f"{duplicates.sum():,}".replace(",", " ")
+    st.warning(
+        f"Строк, которые уже были в предыдущих файлах: {total}. Они не учтены, "
+        "чтобы пересекающиеся отчёты не удвоили суммы."
+    )
+    st.dataframe(
+        duplicates[duplicates > 0].rename_axis("Файл").reset_index(), hide_index=True
+    )
 
-    if uploaded_file_russia is not None and uploaded_file_cis is not None:
-        try:
-            # Чтение файлов
-            df_Russia = pd.read_excel(
-                uploaded_file_russia, dtype={"Баркод": str, "Размер": str}
-            )
-            df_CIS = pd.read_excel(
-                uploaded_file_cis, dtype={"Баркод": str, "Размер": str}
-            )
-            df = pd.concat([df_Russia, df_CIS], ignore_index=True)
-
-            # ============== Начало блока ОБРАБОТКА ДАННЫХ =================================
-            # Суммирование и агрегация данных
-            sums1_per_category = (
-                df.groupby("Артикул поставщика")
-                .agg(
-                    {
-                        "Цена розничная": "sum",
-                        "Вайлдберриз реализовал Товар (Пр)": "sum",
-                        "К перечислению Продавцу за реализованный Товар": "sum",
-                        "Услуги по доставке товара покупателю": "sum",
-                    }
-                )
-                .astype(int)
-                .reset_index()
-            )
 
-            sums1_per_category["К Перечислению без Логистики"] = (
-                sums1_per_category["К перечислению Продавцу за реализованный Товар"]
-                - sums1_per_category["Услуги по доставке товара покупателю"]
-            ).astype(int)
-            sums1_per_category["Сумма СПП"] = (
-                sums1_per_category["Цена розничная"]
-                - sums1_per_category["Вайлдберриз реализовал Товар (Пр)"]
-            ).astype(int)
-            sums1_per_category["% Лог/рс"] = (
-                (
-                    (
-                        sums1_per_category["Услуги по доставке товара покупателю"]
-                        / sums1_per_category[
-                            "К перечислению Продавцу за реализованный Товар"
-                        ]
-                    )
-                    * 100
-                )
-                .replace(np.inf, 100.0)
-                .round(1)
-            )
-            sums1_per_category["% Лог/Наша Цена"] = (
-                (
-                    (
-                        sums1_per_category["Услуги по доставке товара покупателю"]
-                        / sums1_per_category["Цена розничная"]
-                    )
-                    * 100
-                )
-                .replace(np.inf, 100.0)
-                .round(1)
-            )
+def show_job(job):
+    import streamlit as st
+
+    # Обновляется только этот фрагмент страницы, а не весь скрипт
+    @st.fragment(run_every=PROGRESS_SECONDS)
+    def progress():
+        if job.finished:
+            st.rerun()
+        position = JOBS.position(job)
+        if position:
+            text = (
+                f"В очереди: {position}-е место "
+                f"(сейчас обрабатывается заданий: {JOBS.running})"
+            )
+        else:
+            stage = STAGE_LABELS.get(job.stage, job.stage or "запуск")
+            rows = f"{job.rows:,}".replace(",", " ")
+            text = f"Обработка: прочитано строк {rows}, последний этап — {stage}"
+        st.progress(job.progress, text=text)
+        if st.button("Отменить"):
+            JOBS.cancel(job)
+            st.rerun()
+
+    progress()
+
+
+def process_uploads(uploaded_files, mode, file_stem, message="Обработка завершена!"):
+    import streamlit as st
+
+    key = upload_key(uploaded_files, mode)
+    cached = RESULT_CACHE.get(key)
+    if cached is None:
+        # Задание хранится в сессии: отменённое или упавшее не перезапускается
+        # само при каждом перезапуске скрипта
+        job = st.session_state.get("job")
+        if job is None or job.key != key:
+            job = st.session_state["job"] = submit_job(uploaded_files, mode)
+        if job.state in (CANCELLED, FAILED):
+            if job.state == CANCELLED:
+                st.warning("Обработка отменена")
+            else:
+                st.error(f"Ошибка: {str(job.error)}")
+            if st.button("Обработать заново"):
+                st.session_state["job"] = submit_job(uploaded_files, mode)
+                st.rerun()
+            st.stop()
+        if job.state != DONE:
+            show_job(job)
+            st.stop()
+        cached = job.result
 
-            # Фильтруем только возвраты
-            returns_by_article = (
-                df[df["Тип документа"] == "Возврат"]
-                .groupby("Артикул поставщика")[
-                    [
-                        "Цена розничная",
-                        "Вайлдберриз реализовал Товар (Пр)",
-                        "К перечислению Продавцу за реализованный Товар",
-                    ]
-                ]
-                .sum()
-                .fillna(0)
-                .reset_index()
-            )
-            returns_by_article = returns_by_article.rename(
-                columns={
-                    "Цена розничная": "Возвраты Наша цена",
-                    "Вайлдберриз реализовал Товар (Пр)": "Возвраты реализация ВБ",
-                    "К перечислению Продавцу за реализованный Товар": "Возврты к перечислению",
-                }
-            )
+    try:
+        base, trace, cube, duplicates = cached
+        show_duplicates(duplicates, uploaded_files)
+        show_results(key, base, trace, file_stem, message)
+        show_cube(cube)
 
-            # Объединяем таблицы
-            first_merged = sums1_per_category.merge(
-                returns_by_article, on="Артикул поставщика", how="left"
-            ).fillna(0)
+    except Exception as e:
+        st.error(f"Ошибка: {str(e)}")
+        st.stop()
 
-            # Добавляем колонки Чистые продажи
-            first_merged["Чистые продажи Наши"] = (
-                first_merged["Цена розничная"] - first_merged["Возвраты Наша цена"]
-            )
-            first_merged["Чистая реализацич ВБ"] = (
-                first_merged["Вайлдберриз реализовал Товар (Пр)"]
-                - first_merged["Возвраты реализация ВБ"]
-            )
-            first_merged["Чистое Перечисление"] = (
-                first_merged["К перечислению Продавцу за реализованный Товар"]
-                - first_merged["Возврты к перечислению"]
-            )
-            first_merged["Чистое Перечисление без Логистики"] = (
-                first_merged["Чистое Перечисление"]
-                - first_merged["Услуги по доставке товара покупателю"]
-            )
 
-            # Средние значения
-            cost_per_category = (
-                df.groupby("Артикул поставщика")
-                .agg(
-                    {
-                        "Цена розничная": lambda x: (
-                            x[x != 0].mean() if any(x != 0) else 0
-                        ),
-                        "Вайлдберриз реализовал Товар (Пр)": lambda x: (
-                            x[x != 0].mean() if any(x != 0) else 0
-                        ),
-                        "К перечислению Продавцу за реализованный Товар": lambda x: (
-                            x[x != 0].mean() if any(x != 0) else 0
-                        ),
-                        "Услуги по доставке товара покупателю": lambda x: x.mean() * 2,
-                    }
-                )
-                .astype(int)
-                .reset_index()
-            )
+def main():
+    import streamlit as st
 
-            cost_per_category["СПП Средняя"] = (
-                cost_per_category["Цена розничная"]
-                - cost_per_category["Вайлдберриз реализовал Товар (Пр)"]
-            ).round(1)
-            cost_per_category["К Перечислению без Логистики Средняя"] = (
-                cost_per_category["К перечислению Продавцу за реализованный Товар"]
-                - cost_per_category["Услуги по доставке товара покупателю"]
-            ).round(1)
-            cost_per_category["% Лог/Перечисление с Лог Средний"] = (
-                (
-                    (
-                        cost_per_category["Услуги по доставке товара покупателю"]
-                        / cost_per_category[
-                            "К перечислению Продавцу за реализованный Товар"
-                        ]
-                    )
-                    * 100
-                )
-                .replace(np.inf, 100.0)
-                .round(1)
-            )
-            cost_per_category["% Лог/Наша цена Средний"] = (
-                (
-                    (
-                        cost_per_category["Услуги по доставке товара покупателю"]
-                        / cost_per_category["Цена розничная"]
-                    )
-                    * 100
-                )
-                .replace(np.inf, 100.0)
-                .round(1)
-            )
+    # Заголовок приложения
+    st.title("📊 Обработка ДЕТАЛИЗИРОВАННЫХ финансовых отчётов Wildberries (Разбивка по артикулам)")
 
-            # Объединяем таблицы
-            second_merged = first_merged.merge(
-                cost_per_category, on="Артикул поставщика", how="left"
-            ).fillna(0)
-            second_merged = second_merged.rename(
-                columns={
-                    "Цена розничная_y": "Наша цена Средняя",
-                    "Вайлдберриз реализовал Товар (Пр)_y": "Реализация ВБ Средняя",
-                    "К перечислению Продавцу за реализованный Товар_y": "К перечислению Среднее",
-                    "Услуги по доставке товара покупателю_y": "Логистика Одной Юбки Средняя",
-                }
-            )
+    # Выбор режима работы
+    mode = st.radio(
+        "Выберите режим работы:",
+        ["Один файл", "Два файла (Россия + СНГ)", "Несколько файлов"],
+        horizontal=True,
+    )
 
-            # Обработка логистики
-            df_exploded = df.explode("Виды логистики, штрафов и доплат")
-            df_exploded["Виды логистики, штрафов и доплат"] = df_exploded[
-                "Виды логистики, штрафов и доплат"
-            ].fillna("Не указано")
-
-            status_log = (
-                df_exploded.groupby("Артикул поставщика")[
-                    "Виды логистики, штрафов и доплат"
-                ]
-                .value_counts()
-                .unstack(fill_value=0)
-                .reset_index()
-            )
+    if mode == "Один файл":
+        # Загрузка одного файла
+        uploaded_file = st.file_uploader(
+            "Загрузите Excel-файл отчёта Wildberries или zip-архив с отчётами",
+            type=UPLOAD_TYPES,
+        )
 
-            for col in [
-                "К клиенту при продаже",
-                "От клиента при возврате",
-                "От клиента при отмене",
-            ]:
-                status_log[col] = status_log.get(col, pd.Series(0)).fillna(0)
-
-            numerator = status_log["К клиенту при продаже"]
-            denominator = (
-                status_log["К клиенту при отмене"]
-                + status_log["К клиенту при продаже"]
-                + status_log["От клиента при возврате"]
-            )
+        if uploaded_file is not None:
+            process_uploads([uploaded_file], mode, "wildberries_report")
+        else:
+            st.warning("Пожалуйста, загрузите файл отчёта")
 
-            status_log["%Выкупа"] = np.where(
-                (numerator == 0) & (denominator == 0),
-                0,
-                np.where(
-                    numerator == 0 & (denominator > 0),
-                    -100,
-                    np.where(
-                        denominator == 0, 0, (numerator / denominator) * 100
-                    ).astype(int),
-                ),
+    elif mode == "Два файла (Россия + СНГ)":
+        # Режим "Два файла"
+        col1, col2 = st.columns(2)
+        with col1:
+            uploaded_file_russia = st.file_uploader(
+                "Загрузите файл по России", type=UPLOAD_TYPES
             )
-            status_log["Себес Продаж (600р)"] = (
-                status_log["К клиенту при продаже"] * 600
-            ).round(0)
-
-            # Финальное объединение
-            third_merged = second_merged.merge(
-                status_log[
-                    [
-                        "Артикул поставщика",
-                        "К клиенту при продаже",
-                        "%Выкупа",
-                        "Себес Продаж (600р)",
-                    ]
-                ],
-                on="Артикул поставщика",
-                how="left",
-            ).fillna(0)
-
-            # Переименование столбцов
-            third_merged = third_merged.rename(
-                columns={
-                    "К клиенту при продаже": "Кол-во Продаж",
-                    "Цена розничная_x": "Сумма Продаж Наша Цена",
-                    "Вайлдберриз реализовал Товар (Пр)_x": "Сумма Продаж по цене ВБ",
-                    "К перечислению Продавцу за реализованный Товар_x": "Сумма Продаж Перечислени С Лог",
-                    "Услуги по доставке товара покупателю_x": "Логистика",
-                }
+        with col2:
+            uploaded_file_cis = st.file_uploader(
+                "Загрузите файл по СНГ", type=UPLOAD_TYPES
             )
 
-            # Расчеты
-            third_merged["Маржа"] = (
-                third_merged["Чистое Перечисление без Логистики"]
-                - third_merged["Себес Продаж (600р)"]
-            ).round(1)
-            third_merged["Налоги"] = (
-                third_merged["Чистая реализацич ВБ"] * 0.07
-            ).round(1)
-            third_merged["Прибыль"] = (
-                third_merged["Маржа"] - third_merged["Налоги"]
-            ).round(1)
-            third_merged.sort_values(
-                by="Сумма Продаж Наша Цена", ascending=False, inplace=True
-            )
-            third_merged["Прибыль на 1 Юбку"] = (
-                third_merged["Маржа"] / third_merged["Кол-во Продаж"]
-            ).replace(np.inf, 0).round(1)
-
-            # Формирование итоговой таблицы
-            all_add_log = (
-                df.groupby("Обоснование для оплаты")
-                .agg(
-                    {
-                        "Услуги по доставке товара покупателю": "sum",
-                        "Общая сумма штрафов": "sum",
-                        "Хранение": "sum",
-                        "Удержания": "sum",
-                        "Платная приемка": "sum",
-                    }
-                )
-                .reset_index()
+        if uploaded_file_russia is not None and uploaded_file_cis is not None:
+            process_uploads(
+                [uploaded_file_russia, uploaded_file_cis],
+                mode,
+                "wildberries_report_combined",
             )
+        else:
+            st.warning("Пожалуйста, загрузите оба файла")
 
-            totall_summary = pd.DataFrame(
-                {
-                    "Колонка": [
-                        "Логистика",
-                        "Сумма СПП",
-                        "Сумма Чистых продаж без Возвратов и Логистики",
-                        "Кол-во Продаж, Шт",
-                        "Себестоимость продаж",
-                        "Прибыль без налога",
-                        "Штрафы",
-                        "Хранение",
-                        "Удержания",
-                        "Платная приемка",
-                        "Итого: прибыль минус доп. удержания",
-                    ],
-                    "Общая сумма": [
-                        third_merged["Логистика"].sum(),
-                        third_merged["Сумма СПП"].sum(),
-                        third_merged["Чистое Перечисление без Логистики"].sum(),
-                        third_merged["Кол-во Продаж"].sum(),
-                        third_merged["Себес Продаж (600р)"].sum(),
-                        third_merged["Прибыль"].sum(),
-                        all_add_log["Общая сумма штрафов"].sum(),
-                        all_add_log["Хранение"].sum(),
-                        all_add_log["Удержания"].sum(),
-                        all_add_log["Платная приемка"].sum(),
-                        third_merged["Прибыль"].sum()
-                        - (
-                            all_add_log["Общая сумма штрафов"].sum()
-                            + all_add_log["Хранение"].sum()
-                            + all_add_log["Удержания"].sum()
-                            + all_add_log["Платная приемка"].sum()
-                        ),
-                    ],
-                }
-            )
+    else:
+        # Режим "Несколько файлов": недели, Россия и СНГ — в одном отчёте
+        uploaded_files = st.file_uploader(
+            "Загрузите файлы отчётов Wildberries или zip-архивы с ними",
+            type=UPLOAD_TYPES,
+            accept_multiple_files=True,
+        )
 
-            # Обработка "Софт" товаров
-            summary_soft = (
-                df[df["Артикул поставщика"].str.contains("Софт", case=False, na=False)]
-                .groupby("Артикул поставщика", as_index=False)
-                .agg(
-                    {
-                        "Цена розничная": [
-                            ("Сумма продаж наша цена (Софт)", "sum"),
-                            ("Средняя Наша цена (Софт)", lambda x: x[x != 0].mean()),
-                        ]
-                    }
-                )
-                .round(0)
-                .astype(int, errors="ignore")
-            )
-            summary_soft.columns = [
-                "Артикул поставщика",
-                "Сумма продаж (Софт)",
-                "Цена средняя (Софт)",
-            ]
-            summary_soft.sort_values(
-                by="Сумма продаж (Софт)", ascending=False, inplace=True
+        if uploaded_files:
+            process_uploads(
+                uploaded_files,
+                mode,
+                "wildberries_report_combined",
+                f"Обработка завершена! Файлов: {len(uploaded_files)}",
             )
+        else:
+            st.warning("Пожалуйста, загрузите файлы отчётов")
 
-            # Создание Excel файла
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine="openpyxl") as writer:
-                third_merged.to_excel(
-                    writer, sheet_name="Summary_Table_by_Art", index=False
-                )
-                totall_summary.to_excel(
-                    writer, sheet_name="Totall_Summary", index=False
-                )
-                summary_soft.to_excel(writer, sheet_name="Soft_Summary", index=False)
-            output.seek(0)
-
-            # Отображение результатов
-            st.success("Обработка завершена!")
-            st.download_button(
-                label="⬇️ Скачать отчёт",
-                data=output,
-                file_name="wildberries_report_combined.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            )
 
-        except Exception as e:
-            st.error(f"Ошибка: {str(e)}")
-            st.stop()
-    else:
-        st.warning("Пожалуйста, загрузите оба файла")
+# Streamlit выполняет скрипт как __main__; при импорте интерфейс не запускается
+if __name__ == "__main__":
+    main()
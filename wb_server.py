@@ -0,0 +1,407 @@
+"""HTTP-сервис обработки отчётов Wildberries для учётных систем (без Streamlit).
+
+Запуск:
+    python wb_server.py --port 8050
+
+Адреса:
+    POST /process?format=xlsx   тело — один файл отчёта (.xlsx/.xls), zip-архив
+                                с отчётами или multipart/form-data с файлами
+                                (как режим «Несколько файлов»); ответ —
+                                итоговый файл: xlsx, csv, parquet или json;
+                                необязательные cost_price и tax_rate —
+                                себестоимость единицы и ставка налога (доля)
+    GET  /metrics               запросы, пропускная способность, задержки, кэш
+    GET  /health                состояние очереди заданий
+
+Файлы обрабатываются в общей очереди заданий (wb_jobs) тем же конвейером,
+что и в интерфейсе; строки, которые повторяются в нескольких файлах, не
+учитываются, а их число приходит в заголовке X-Duplicate-Rows. Результаты
+кэшируются по хэшу содержимого (wb_cache): повторная отправка тех же файлов
+отвечает без разбора. Большое тело запроса с одним файлом пишется на диск по
+мере приёма (wb_ingest.spool_upload), а выгрузка отдаётся из файла на диске.
+Нагрузочный тест — wb_load.py.
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections import Counter, deque
+from contextlib import ExitStack
+from email.message import Message
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from wb_aggregate import COST_PRICE, TAX_RATE
+from wb_cache import EXPORT_CACHE, RESULT_CACHE, content_hash
+from wb_export import EXPORT_FORMATS
+from wb_ingest import SPOOL_DIR, SPOOL_MB, map_file
+from wb_jobs import CANCELLED, FAILED, JOBS, priced_tables, submit_reports
+from wb_pipeline import export_report_file
+from wb_trace import trace_run
+
+# Ограничения можно задать через переменные окружения
+MAX_UPLOAD_MB = float(os.environ.get("WB_API_MAX_MB", "512"))
+REQUEST_TIMEOUT = float(os.environ.get("WB_API_TIMEOUT", "600"))
+# По скольким последним запросам считаются задержки
+LATENCY_WINDOW = 1000
+# Тело запроса читается и отдаётся кусками такого размера
+COPY_CHUNK = 1024 * 1024
+
+# Ключи кэша API не пересекаются с ключами режимов интерфейса
+API_MODE = "api"
+FILE_STEM = "wildberries_report"
+
+
+class ApiError(Exception):
+    """Ошибка запроса: HTTP-статус и сообщение для клиента."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Metrics:
+    """Счётчики запросов обработки и задержки последних window запросов."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.started = time.time()
+        self.requests = 0
+        self.in_flight = 0
+        self.cached = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.statuses = Counter()
+        # (время окончания, длительность) последних запросов
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def begin(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def end(self, status, seconds, bytes_in, bytes_out, cached=False):
+        with self._lock:
+            self.in_flight -= 1
+            self.requests += 1
+            self.cached += cached
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.statuses[status] += 1
+            self._latencies.append((time.time(), seconds))
+
+    def snapshot(self):
+        """Метрики для /metrics: всё в секундах, байтах и запросах в секунду."""
+        now = time.time()
+        with self._lock:
+            finished = [t for t, _ in self._latencies]
+            latencies = np.array([s for _, s in self._latencies])
+            snapshot = {
+                "uptime_seconds": round(now - self.started, 3),
+                "requests": self.requests,
+                "in_flight": self.in_flight,
+                "cached_responses": self.cached,
+                "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+            }
+        uptime = max(now - self.started, 1e-9)
+        # Пропускная способность: за всё время и за последнюю минуту
+        window = min(60.0, uptime)
+        snapshot["throughput_rps"] = round(self.requests / uptime, 3)
+        snapshot["recent_rps"] = round(
+            sum(now - t <= window for t in finished) / window, 3
+        )
+        if len(latencies):
+            snapshot["latency_seconds"] = {
+                "window": len(latencies),
+                "mean": round(float(latencies.mean()), 6),
+                "p50": round(float(np.percentile(latencies, 50)), 6),
+                "p90": round(float(np.percentile(latencies, 90)), 6),
+                "p99": round(float(np.percentile(latencies, 99)), 6),
+                "max": round(float(latencies.max()), 6),
+            }
+        snapshot["jobs"] = {"running": JOBS.running, "waiting": JOBS.waiting}
+        snapshot["cache"] = {
+            "entries": len(RESULT_CACHE),
+            "mb": round(RESULT_CACHE.size_bytes / 1024 / 1024, 1),
+            "hits": RESULT_CACHE.hits,
+            "misses": RESULT_CACHE.misses,
+        }
+        return snapshot
+
+
+METRICS = Metrics()
+
+
+def _multipart_files(body, content_type):
+    # Разбираем multipart сами: модуль cgi устарел, а email медленен на
+    # больших двоичных телах
+    header = Message()
+    header["Content-Type"] = content_type
+    boundary = header.get_param("boundary")
+    if not boundary:
+        raise ApiError(400, "В multipart/form-data не указан boundary")
+    files = []
+    for part in body.split(b"--" + boundary.encode("latin-1"))[1:]:
+        if part.startswith(b"--"):
+            # Завершающий разделитель
+            break
+        head, _, content = part.partition(b"\r\n\r\n")
+        if b"filename=" in head:
+            files.append(content[:-2] if content.endswith(b"\r\n") else content)
+    return files
+
+
+def read_uploads(body, content_type):
+    """Файлы отчётов из тела запроса: один файл или multipart/form-data.
+
+    body — байты или путь к телу, сброшенному на диск (тогда это один файл).
+    """
+    if isinstance(body, str):
+        return [body]
+    if content_type.startswith("multipart/form-data"):
+        files = _multipart_files(body, content_type)
+    else:
+        files = [body] if body else []
+    files = [f for f in files if f]
+    if not files:
+        raise ApiError(400, "В запросе нет файлов отчёта")
+    return files
+
+
+def query_number(query, name, default):
+    """Неотрицательное число из параметра запроса name (или default)."""
+    values = query.get(name)
+    if not values:
+        return default
+    try:
+        value = float(values[0])
+    except ValueError:
+        raise ApiError(400, f"Параметр {name} должен быть числом") from None
+    if not math.isfinite(value):
+        raise ApiError(400, f"Параметр {name} должен быть конечным числом")
+    if value < 0:
+        raise ApiError(400, f"Параметр {name} не может быть отрицательным")
+    return value
+
+
+def process_uploads(
+    files,
+    fmt="xlsx",
+    timeout=REQUEST_TIMEOUT,
+    price=COST_PRICE,
+    tax_rate=TAX_RATE,
+    cleanup=None,
+):
+    """Обрабатывает файлы (байты или пути) и возвращает открытый файл выгрузки,
+    признак ответа из кэша и число отброшенных повторов строк (wb_dedup).
+
+    cleanup — ExitStack с удалением временных файлов запроса: если файлы
+    уходят в задание, удаление переносится на его завершение.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ApiError(
+            400,
+            f"Неизвестный формат «{fmt}»: доступны {', '.join(EXPORT_FORMATS)}",
+        )
+    with ExitStack() as stack:
+        # Файлы на диске хэшируются через mmap — хэш тот же, что у их байтов
+        key = content_hash(
+            API_MODE,
+            *(
+                stack.enter_context(map_file(f)) if isinstance(f, str) else f
+                for f in files
+            ),
+        )
+    result = RESULT_CACHE.get(key)
+    cached = result is not None
+    if result is None:
+        job = submit_reports(key, files)
+        if cleanup is not None:
+            # Задание может пережить запрос (504): файлы удалятся после него
+            job.on_finish(cleanup.pop_all().close)
+        if not job.wait(timeout):
+            # Задание продолжается: повторный запрос получит результат из кэша
+            raise ApiError(504, f"Обработка не уложилась в {timeout:g} с")
+        if job.state == FAILED:
+            if isinstance(job.error, (ValueError, zipfile.BadZipFile)):
+                raise ApiError(422, f"Не удалось обработать отчёт: {job.error}")
+            raise job.error
+        if job.state == CANCELLED:
+            raise ApiError(503, "Обработка отменена")
+        result = job.result
+    # Себестоимость и налог пересчитываются по базовым таблицам из кэша
+    priced_key, tables, _ = priced_tables(key, result[0], price, tax_rate)
+
+    def write(path):
+        with trace_run(f"{priced_key[:12]}-{fmt}"):
+            export_report_file(tables, fmt, path)
+
+    # Выгрузка в каждом формате лежит на диске, как и в интерфейсе
+    output = open_export(content_hash(priced_key, fmt), write)
+    return output, cached, int(result[3].sum())
+
+
+def open_export(key, write):
+    """Открывает выгрузку key из EXPORT_CACHE (write(path) — запись файла).
+
+    Открытый файл отдаётся целиком, даже если его тут же вытеснят из кэша;
+    если его вытеснили между записью и открытием, он записывается заново.
+    """
+    try:
+        return open(EXPORT_CACHE.get_or_write(key, write), "rb")
+    except FileNotFoundError:
+        return open(EXPORT_CACHE.get_or_write(key, write), "rb")
+
+
+class ReportHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов; каждый запрос — в своём потоке сервера."""
+
+    server_version = "wb-report/1"
+    # Keep-alive: нагрузочный тест не открывает соединение на каждый запрос
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def _send_file(self, status, f, content_type, headers=()):
+        # Файл отдаётся кусками: выгрузка целиком в память не читается
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(size))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            shutil.copyfileobj(f, self.wfile, COPY_CHUNK)
+        return size
+
+    def _send_json(self, status, value):
+        body = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        return self._send(status, body, "application/json; charset=utf-8")
+
+    def _read_body(self, cleanup):
+        # Большое тело с одним файлом пишется на диск по мере приёма и
+        # удаляется вместе с cleanup (ExitStack); multipart разбирается в памяти
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_UPLOAD_MB * 1024 * 1024:
+            raise ApiError(413, f"Запрос больше {MAX_UPLOAD_MB:g} МБ")
+        content_type = self.headers.get("Content-Type", "")
+        if length < SPOOL_MB * 1024 * 1024 or content_type.startswith("multipart/"):
+            return self.rfile.read(length), length
+        os.makedirs(SPOOL_DIR, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=SPOOL_DIR, suffix=".upload")
+        cleanup.callback(os.remove, path)
+        with os.fdopen(fd, "wb") as f:
+            remaining = length
+            while remaining:
+                chunk = self.rfile.read(min(COPY_CHUNK, remaining))
+                if not chunk:
+                    raise ApiError(400, "Тело запроса оборвалось")
+                f.write(chunk)
+                remaining -= len(chunk)
+        return path, length
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/metrics":
+            self._send_json(200, METRICS.snapshot())
+        elif path == "/health":
+            self._send_json(
+                200, {"status": "ok", "running": JOBS.running, "waiting": JOBS.waiting}
+            )
+        else:
+            self._send_json(404, {"error": f"Нет адреса {path}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/process":
+            # Тело не читали — соединение дальше не используем
+            self.close_connection = True
+            self._send_json(404, {"error": f"Нет адреса {url.path}"})
+            return
+
+        started = time.perf_counter()
+        METRICS.begin()
+        status, received, sent, cached = 500, 0, 0, False
+        try:
+            with ExitStack() as cleanup:
+                body, received = self._read_body(cleanup)
+                query = parse_qs(url.query)
+                fmt = query.get("format", ["xlsx"])[0]
+                price = query_number(query, "cost_price", COST_PRICE)
+                tax_rate = query_number(query, "tax_rate", TAX_RATE)
+                files = read_uploads(body, self.headers.get("Content-Type", ""))
+                output, cached, duplicates = process_uploads(
+                    files, fmt, price=price, tax_rate=tax_rate, cleanup=cleanup
+                )
+            export = EXPORT_FORMATS[fmt]
+            status = 200
+            sent = self._send_file(
+                status,
+                output,
+                export.mime,
+                [
+                    (
+                        "Content-Disposition",
+                        f'attachment; filename="{FILE_STEM}.{export.extension}"',
+                    ),
+                    ("X-Cache", "hit" if cached else "miss"),
+                    ("X-Duplicate-Rows", str(duplicates)),
+                    ("X-Processing-Seconds", f"{time.perf_counter() - started:.3f}"),
+                ],
+            )
+        except ApiError as e:
+            status = e.status
+            if status == 413:
+                self.close_connection = True
+            sent = self._send_json(status, {"error": str(e)})
+        except Exception as e:
+            self.log_error("Ошибка обработки: %r", e)
+            sent = self._send_json(500, {"error": f"Ошибка: {e}"})
+        finally:
+            METRICS.end(status, time.perf_counter() - started, received, sent, cached)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="HTTP-сервис обработки отчётов Wildberries по артикулам."
+    )
+    parser.add_argument(
+        "--host", default="127.0.0.1", help="адрес (по умолчанию только локальный)"
+    )
+    parser.add_argument("--port", type=int, default=8050)
+    args = parser.parse_args(argv)
+
+    server = ThreadingHTTPServer((args.host, args.port), ReportHandler)
+    # Потоки запросов не держат процесс при остановке сервера
+    server.daemon_threads = True
+    print(f"Сервис слушает http://{args.host}:{server.server_port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
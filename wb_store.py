@@ -0,0 +1,200 @@
+"""Хранилище агрегатов отчётов в Parquet для сводок за произвольный период.
+
+Каждый обработанный отчёт сохраняется как частичные агрегаты по артикулам и
+по «Обоснованию для оплаты» с ключом «период + регион». Сводка за квартал
+складывается из сохранённых агрегатов, без повторного разбора Excel.
+
+Примеры:
+    python wb_store.py ingest week1.xlsx --start 2024-01-01 --end 2024-01-07 --region Россия
+    python wb_store.py list
+    python wb_store.py rollup --start 2024-01-01 --end 2024-03-31 -o q1.xlsx
+    python wb_store.py rollup --start 2024-01-01 --end 2024-03-31 -o q1.xlsx \
+        --cost-price 550 --tax-rate 0.06
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from datetime import date
+
+import pandas as pd
+
+from wb_aggregate import COST_PRICE, TAX_RATE, Costs, ReportPartials, merge_partials
+from wb_ingest import COST, read_article_costs
+from wb_pipeline import aggregate_file, build_tables, build_workbook
+
+# Каталог хранилища можно задать через переменную окружения
+STORE_DIR = os.environ.get("WB_STORE_DIR", "wb_store")
+
+# Разделитель уровней в именах колонок (Parquet хранит плоские имена)
+_LEVEL_SEPARATOR = "|"
+_TABLES = ReportPartials._fields
+# Куба нет у отчётов без даты продажи и у сохранённых до его появления
+_OPTIONAL_TABLES = ("cube",)
+_REQUIRED_TABLES = tuple(t for t in _TABLES if t not in _OPTIONAL_TABLES)
+
+
+def _period_name(start, end):
+    return f"{start.isoformat()}_{end.isoformat()}"
+
+
+def _report_dir(root, start, end, region):
+    return os.path.join(root, region, _period_name(start, end))
+
+
+def _flatten(frame):
+    if isinstance(frame.columns, pd.MultiIndex):
+        frame = frame.copy()
+        frame.columns = [_LEVEL_SEPARATOR.join(c) for c in frame.columns]
+    return frame
+
+
+def _unflatten(frame):
+    if all(_LEVEL_SEPARATOR in c for c in frame.columns):
+        frame.columns = pd.MultiIndex.from_tuples(
+            [tuple(c.split(_LEVEL_SEPARATOR, 1)) for c in frame.columns]
+        )
+    return frame
+
+
+def _write_parquet(frame, path):
+    # Пишем во временный файл и переименовываем: прерванная запись не портит отчёт
+    directory = os.path.dirname(path)
+    fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        _flatten(frame).to_parquet(temporary)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def save_partials(partials, start, end, region, root=STORE_DIR):
+    """Сохраняет агрегаты отчёта за период [start, end] по региону (перезаписывает)."""
+    if end < start:
+        raise ValueError(f"Конец периода {end} раньше начала {start}")
+    directory = _report_dir(root, start, end, region)
+    os.makedirs(directory, exist_ok=True)
+    for name, frame in zip(_TABLES, partials):
+        path = os.path.join(directory, f"{name}.parquet")
+        if frame is not None:
+            _write_parquet(frame, path)
+        elif os.path.exists(path):
+            # Перезапись отчётом без куба: прежний куб уже не соответствует
+            os.remove(path)
+    return directory
+
+
+def load_report(directory):
+    """Читает агрегаты одного сохранённого отчёта."""
+    tables = []
+    for name in _TABLES:
+        path = os.path.join(directory, f"{name}.parquet")
+        if name in _OPTIONAL_TABLES and not os.path.exists(path):
+            tables.append(None)
+        else:
+            tables.append(_unflatten(pd.read_parquet(path)))
+    return ReportPartials(*tables)
+
+
+def list_reports(root=STORE_DIR):
+    """Список сохранённых отчётов: регион, начало и конец периода, каталог."""
+    rows = []
+    if os.path.isdir(root):
+        for region in sorted(os.listdir(root)):
+            region_dir = os.path.join(root, region)
+            if not os.path.isdir(region_dir):
+                continue
+            for period in sorted(os.listdir(region_dir)):
+                directory = os.path.join(region_dir, period)
+                try:
+                    start, end = (date.fromisoformat(d) for d in period.split("_"))
+                except ValueError:
+                    continue
+                if all(
+                    os.path.exists(os.path.join(directory, f"{name}.parquet"))
+                    for name in _REQUIRED_TABLES
+                ):
+                    rows.append((region, start, end, directory))
+    return pd.DataFrame(rows, columns=["Регион", "Начало", "Конец", "Каталог"])
+
+
+def rollup(start, end, regions=None, root=STORE_DIR):
+    """Складывает агрегаты всех отчётов, периоды которых лежат внутри [start, end].
+
+    Возвращает агрегаты и список использованных отчётов. Отчёты, период которых
+    лишь пересекается с [start, end], не делятся и в сводку не попадают.
+    """
+    reports = list_reports(root)
+    inside = (reports["Начало"] >= start) & (reports["Конец"] <= end)
+    if regions:
+        inside &= reports["Регион"].isin(regions)
+    selected = reports[inside]
+    if selected.empty:
+        raise LookupError(f"В хранилище нет отчётов за период {start} — {end}")
+    partials = merge_partials(load_report(d) for d in selected["Каталог"])
+    return partials, selected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Хранилище агрегатов отчётов Wildberries и сводки за период."
+    )
+    parser.add_argument("--root", default=STORE_DIR, help="каталог хранилища")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="разобрать отчёт и сохранить агрегаты")
+    ingest.add_argument("report", help="файл отчёта .xlsx/.xls")
+    ingest.add_argument("--start", type=date.fromisoformat, required=True)
+    ingest.add_argument("--end", type=date.fromisoformat, required=True)
+    ingest.add_argument("--region", default="Россия")
+
+    commands.add_parser("list", help="показать сохранённые отчёты")
+
+    roll = commands.add_parser("rollup", help="сводка за период из хранилища")
+    roll.add_argument("--start", type=date.fromisoformat, required=True)
+    roll.add_argument("--end", type=date.fromisoformat, required=True)
+    roll.add_argument("--region", action="append", help="можно указать несколько раз")
+    roll.add_argument("-o", "--output", required=True, help="итоговый Excel-файл")
+    roll.add_argument(
+        "--cost-price",
+        type=float,
+        default=COST_PRICE,
+        help=f"себестоимость единицы товара, ₽ (по умолчанию {COST_PRICE})",
+    )
+    roll.add_argument(
+        "--tax-rate",
+        type=float,
+        default=TAX_RATE,
+        help=f"ставка налога с реализации ВБ, доля (по умолчанию {TAX_RATE})",
+    )
+    roll.add_argument(
+        "--costs",
+        metavar="FILE",
+        help="себестоимость по артикулам: xlsx с колонками «Артикул поставщика» "
+        f"и «{COST}»",
+    )
+
+    args = parser.parse_args(argv)
+
+    if args.command == "ingest":
+        directory = save_partials(
+            aggregate_file(args.report), args.start, args.end, args.region, args.root
+        )
+        print(f"Сохранено: {directory}")
+    elif args.command == "list":
+        print(list_reports(args.root).drop(columns="Каталог").to_string(index=False))
+    else:
+        partials, used = rollup(args.start, args.end, args.region, args.root)
+        by_article = read_article_costs(args.costs) if args.costs else None
+        costs = Costs(args.cost_price, args.tax_rate, by_article)
+        with open(args.output, "wb") as f:
+            f.write(build_workbook(build_tables(partials, costs)))
+        print(f"Отчётов в сводке: {len(used)} -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""Генератор синтетических детализированных отчётов Wildberries.
+
+Отчёт содержит колонки, которые читает обработка (см. wb_ingest.REPORT_SCHEMA),
+и несколько «лишних» колонок настоящего отчёта. Распределения подобраны похожими
+на реальные: популярность артикулов убывает по Ципфу, возвратов — несколько
+процентов продаж, около трети строк — логистика, часть артикулов — «Софт».
+При одинаковых параметрах и seed отчёт получается одинаковым.
+
+Пример:
+    python wb_synthetic.py --rows 1000000 -o report_1m.xlsx
+"""
+
+import argparse
+import sys
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from wb_aggregate import (
+    ARTICLE,
+    DELIVERY,
+    DOCUMENT_TYPE,
+    LOGISTICS_TYPE,
+    PAYMENT_REASON,
+    PRICE,
+    RETURN_DOCUMENT,
+    SALE_DATE,
+    TRANSFER,
+    WB_PRICE,
+)
+from wb_export import write_xlsx
+
+# Версия генератора: меняется вместе с распределениями, чтобы сохранённые
+# бенчмарком отчёты прежней версии не использовались
+VERSION = 3
+
+# Больше строк на одном листе Excel не поместится (без строки заголовка)
+EXCEL_MAX_ROWS = 1_048_575
+
+SALE_DOCUMENT = "Продажа"
+
+# Виды строк отчёта и их доли: (Тип документа, Обоснование для оплаты, доля)
+ROW_KINDS = (
+    (SALE_DOCUMENT, "Продажа", 0.58),
+    (RETURN_DOCUMENT, "Возврат", 0.05),
+    (SALE_DOCUMENT, "Логистика", 0.32),
+    (SALE_DOCUMENT, "Штраф", 0.01),
+    (SALE_DOCUMENT, "Хранение", 0.025),
+    (SALE_DOCUMENT, "Удержание", 0.01),
+    (SALE_DOCUMENT, "Платная приемка", 0.005),
+)
+SALE, RETURN, LOGISTICS, PENALTY, STORAGE, DEDUCTION, ACCEPTANCE = range(len(ROW_KINDS))
+
+# Виды логистики у строк «Логистика» и их доли
+LOGISTICS_KINDS = (
+    ("К клиенту при продаже", 0.62),
+    ("К клиенту при отмене", 0.14),
+    ("От клиента при отмене", 0.12),
+    ("От клиента при возврате", 0.09),
+    ("Возврат брака (К продавцу)", 0.03),
+)
+
+PRODUCTS = ("Юбка", "Платье", "Брюки", "Юбка Софт", "Платье Софт")
+# Каждый пятый артикул — «Софт» (группа по умолчанию, см. wb_groups.DEFAULT_RULES)
+SOFT_EVERY = 5
+
+
+def article_catalogue(articles):
+    """Артикулы, предметы и баркоды; зависят только от числа артикулов."""
+    index = np.arange(articles)
+    product = np.where(index % SOFT_EVERY == 0, 3 + index % 2, index % 3)
+    names = [f"{PRODUCTS[p]} {i:05d}" for p, i in zip(product, index)]
+    barcodes = (2_040_000_000_000 + index * 7919).astype(str)
+    return pd.Index(names), product, barcodes
+
+
+def default_articles(rows):
+    """Число артикулов для отчёта из rows строк: по ~50 строк на артикул."""
+    return int(np.clip(rows // 50, 20, 20_000))
+
+
+def generate_report(
+    rows, articles=None, seed=0, start=date(2024, 1, 1), days=7, extra_columns=True
+):
+    """Строит синтетический отчёт из rows строк за days дней с даты start.
+
+    Без extra_columns в отчёте только колонки схемы — так крупные отчёты
+    занимают заметно меньше памяти.
+    """
+    articles = articles or default_articles(rows)
+    rng = np.random.default_rng(seed)
+    names, product, barcodes = article_catalogue(articles)
+
+    # Популярность по Ципфу; порядок артикулов перемешан, но зависит от seed
+    weights = 1.0 / np.arange(1, articles + 1) ** 1.1
+    popularity = rng.permutation(weights / weights.sum())
+    article = rng.choice(articles, size=rows, p=popularity)
+
+    kind = rng.choice(len(ROW_KINDS), size=rows, p=[k[2] for k in ROW_KINDS])
+    documents = pd.Index(sorted({k[0] for k in ROW_KINDS}))
+    reasons = pd.Index([k[1] for k in ROW_KINDS])
+    document_codes = documents.get_indexer([k[0] for k in ROW_KINDS])[kind]
+
+    logistics = kind == LOGISTICS
+    logistics_codes = np.full(rows, -1)
+    logistics_codes[logistics] = rng.choice(
+        len(LOGISTICS_KINDS),
+        size=int(logistics.sum()),
+        p=[k[1] for k in LOGISTICS_KINDS],
+    )
+
+    # Цены: у артикула своя базовая цена, у строки — скидка к ней (в целых рублях)
+    base_price = np.round(rng.lognormal(np.log(2500), 0.4, articles), -1)
+    priced = (kind == SALE) | (kind == RETURN)
+    price = np.where(
+        priced, np.round(base_price[article] * rng.uniform(0.7, 1.0, rows)), 0.0
+    )
+    wb_price = np.round(price * rng.uniform(0.55, 0.75, rows), 2)
+    transfer = np.round(wb_price * rng.uniform(0.7, 0.85, rows), 2)
+
+    def amount(mask, low, high, decimals=2):
+        return np.where(mask, np.round(rng.uniform(low, high, rows), decimals), 0.0)
+
+    day = rng.integers(0, days, rows)
+    sale_date = pd.Series(np.datetime64(start, "D") + day)
+
+    report = pd.DataFrame(
+        {
+            ARTICLE: pd.Categorical.from_codes(article, names),
+            DOCUMENT_TYPE: pd.Categorical.from_codes(document_codes, documents),
+            PAYMENT_REASON: pd.Categorical.from_codes(kind, reasons),
+            PRICE: price,
+            WB_PRICE: wb_price,
+            TRANSFER: transfer,
+            DELIVERY: amount(logistics, 30, 120),
+            "Общая сумма штрафов": amount(kind == PENALTY, 100, 1000, 0),
+            "Хранение": amount(kind == STORAGE, 1, 50),
+            "Удержания": amount(kind == DEDUCTION, 10, 500, 0),
+            "Платная приемка": amount(kind == ACCEPTANCE, 5, 100),
+            LOGISTICS_TYPE: pd.Categorical.from_codes(
+                logistics_codes, [k[0] for k in LOGISTICS_KINDS]
+            ),
+            SALE_DATE: sale_date.dt.strftime("%Y-%m-%d"),
+        }
+    )
+    if extra_columns:
+        # Колонки настоящего отчёта, которые обработка не читает
+        report.insert(0, "№", np.arange(1, rows + 1))
+        report.insert(
+            1,
+            "Предмет",
+            pd.Categorical.from_codes(
+                (product % 3)[article], ["Юбки", "Платья", "Брюки"]
+            ),
+        )
+        report.insert(3, "Баркод", pd.Categorical.from_codes(article, barcodes))
+        srid = rng.integers(10**15, 10**16, rows)
+        report["Srid"] = pd.Series(srid).map("{:x}".format)
+    return report
+
+
+def write_report(report, output):
+    """Записывает отчёт на первый лист xlsx (путь или поток)."""
+    if len(report) > EXCEL_MAX_ROWS:
+        raise ValueError(
+            f"В лист Excel помещается не больше {EXCEL_MAX_ROWS} строк, "
+            f"а в отчёте {len(report)}"
+        )
+    write_xlsx([("Sheet1", report)], output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Синтетический детализированный отчёт Wildberries."
+    )
+    parser.add_argument("--rows", type=int, required=True, help="число строк")
+    parser.add_argument("--articles", type=int, help="число артикулов")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", required=True, help="файл .xlsx")
+    args = parser.parse_args(argv)
+
+    write_report(generate_report(args.rows, args.articles, args.seed), args.output)
+    print(f"{args.output}: {args.rows} строк")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
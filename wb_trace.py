@@ -0,0 +1,236 @@
+"""Замеры этапов обработки: время, строки на входе и выходе, прирост пика RSS.
+
+Этапы оборачиваются в stage(); замер идёт, только если вокруг открыт
+trace_run(). Без него (или при WB_TRACE=0) stage() просто вызывает функцию,
+так что накладные расходы — одно чтение contextvars на этап. Каждый замер
+пишется строкой JSON в журнал «wb_trace» (по умолчанию — в stderr). Слушатель
+прогресса (listener) получает этапы и при WB_TRACE=0, но тогда замеры не
+пишутся в журнал и не сохраняются.
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Замеры включены по умолчанию; WB_TRACE=0 отключает их
+TRACE_ENABLED = os.environ.get("WB_TRACE", "1") != "0"
+
+log = logging.getLogger("wb_trace")
+if not log.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+_current = ContextVar("wb_trace", default=None)
+MB = 1024 * 1024
+
+
+def count_rows(value):
+    """Сколько строк вернул этап; для агрегатов — число артикулов."""
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if hasattr(value, "articles"):
+        return len(value.articles)
+    if isinstance(value, tuple) and all(isinstance(v, pd.DataFrame) for v in value):
+        return sum(len(v) for v in value)
+    if isinstance(value, dict) and all(
+        isinstance(v, pd.DataFrame) for v in value.values()
+    ):
+        return sum(len(v) for v in value.values())
+    if isinstance(value, np.ndarray):
+        return value.shape[0]
+    return None
+
+
+def frame_mb(value):
+    """Память таблиц pandas в значении (таблица, агрегаты, список), МБ."""
+    if isinstance(value, pd.DataFrame):
+        return value.memory_usage(index=True, deep=True).sum() / MB
+    if isinstance(value, (tuple, list)):
+        # Необязательные части (например, куб агрегатов) бывают None
+        sizes = [frame_mb(v) for v in value if v is not None]
+        if sizes and None not in sizes:
+            return sum(sizes)
+    return None
+
+
+def peak_rss():
+    """Пиковый RSS процесса в байтах (None, если узнать его нельзя)."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux отдаёт килобайты, macOS — байты
+        return peak if sys.platform == "darwin" else peak * 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, "peak_wset", info.rss)
+
+
+class Trace:
+    """Замеры этапов одного запуска обработки.
+
+    enabled=False — замеры не пишутся в журнал и не сохраняются, а этапы
+    только передаются слушателю (например, ради прогресса задания).
+    """
+
+    def __init__(self, label=None, listener=None, enabled=True):
+        self.label = label or uuid.uuid4().hex[:12]
+        self.records = []
+        # listener(event) получает каждый замер и сообщения о прогрессе
+        # (см. report_progress) сразу, а не в конце запуска; он должен
+        # передаваться между процессами (pickle), как и сами замеры
+        self.listener = listener
+        self.enabled = enabled
+        self._token = None
+
+    def __len__(self):
+        return len(self.records)
+
+    def __enter__(self):
+        # Этапы внутри with записываются в этот замер
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _current.reset(self._token)
+
+    def add(self, records):
+        """Добавляет замеры, сделанные в другом процессе (уже записанные в журнал)."""
+        self.records.extend(records)
+
+    @property
+    def seconds(self):
+        return sum(r["seconds"] for r in self.records)
+
+    def to_frame(self):
+        return pd.DataFrame(
+            self.records,
+            columns=[
+                "stage",
+                "seconds",
+                "rows_in",
+                "rows_out",
+                "mb_in",
+                "mb_out",
+                "rss_delta_mb",
+                "pid",
+            ],
+        )
+
+
+def summarize_stages(frame):
+    """Сворачивает замеры (см. Trace.to_frame) по этапу и процессу.
+
+    При потоковом чтении каждый этап повторяется на каждой пачке строк; в
+    сводке время, строки, память и прирост пика складываются, а в колонке
+    calls — сколько раз этап вызывался.
+    """
+    grouped = frame.groupby(["stage", "pid"], sort=False)
+    summary = grouped.sum(min_count=1)
+    summary.insert(0, "calls", grouped.size())
+    return summary.reset_index()[[*frame.columns, "calls"]]
+
+
+@contextmanager
+def trace_run(label=None, enabled=TRACE_ENABLED, listener=None):
+    """Открывает замер запуска; внутри него stage() записывает этапы.
+
+    Возвращает Trace или None, если замеры отключены. С listener этапы
+    передаются ему и при отключённых замерах (по ним, например, показывается
+    прогресс фонового задания), но в журнал и в Trace не попадают.
+    """
+    if not enabled and listener is None:
+        yield None
+        return
+    started = time.perf_counter()
+    trace = Trace(label, listener, enabled)
+    try:
+        with trace:
+            yield trace
+    finally:
+        if enabled:
+            # Итог пишется и при ошибке: по числу этапов видно, где она случилась
+            log.info(
+                json.dumps(
+                    {
+                        "event": "run",
+                        "run": trace.label,
+                        "seconds": round(time.perf_counter() - started, 6),
+                        "stages": len(trace.records),
+                    },
+                    ensure_ascii=False,
+                )
+            )
+
+
+def current_trace():
+    return _current.get()
+
+
+def stage(name, function, *args, rows_in=None):
+    """Вызывает function(*args) как этап name и, если идёт замер, записывает его.
+
+    rows_in=None — число строк на входе неизвестно (например, при чтении файла)
+    и считается равным числу строк на выходе.
+    """
+    trace = _current.get()
+    if trace is None:
+        return function(*args)
+
+    mb_in = frame_mb(args[0]) if args else None
+    rss_before = peak_rss()
+    started = time.perf_counter()
+    value = function(*args)
+    seconds = time.perf_counter() - started
+    rss_after = peak_rss()
+
+    rows_out = count_rows(value)
+    mb_out = frame_mb(value)
+    record = {
+        "stage": name,
+        "seconds": round(seconds, 6),
+        "rows_in": rows_out if rows_in is None else rows_in,
+        "rows_out": rows_out,
+        # Память таблиц на входе и выходе этапа (например, до и после сжатия)
+        "mb_in": None if mb_in is None else round(mb_in, 1),
+        "mb_out": None if mb_out is None else round(mb_out, 1),
+        # Насколько этап поднял пик RSS процесса (0 — уложился в прежний пик)
+        "rss_delta_mb": (
+            None if rss_before is None else round((rss_after - rss_before) / MB, 1)
+        ),
+        "pid": os.getpid(),
+    }
+    if trace.enabled:
+        trace.records.append(record)
+        log.info(
+            json.dumps(
+                dict(event="stage", run=trace.label, **record), ensure_ascii=False
+            )
+        )
+    if trace.listener is not None:
+        trace.listener(dict(event="stage", **record))
+    return value
+
+
+def report_progress(nbytes):
+    """Сообщает слушателю текущего замера, что прочитано ещё nbytes байт отчёта."""
+    trace = _current.get()
+    if trace is not None and trace.listener is not None and nbytes > 0:
+        trace.listener({"event": "progress", "bytes": nbytes})